@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import Counter as Tally
+
+from observability import Counter, get_logger, observe, register
+
+log = get_logger("admission")
+
+# Generations (outline/expand runs) streaming at once across the process
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "16"))
+# ...and at once for any single repo, so one hot repo can't take every slot
+ADMISSION_MAX_PER_REPO = int(os.getenv("ADMISSION_MAX_PER_REPO", "4"))
+# Requests allowed to wait for a slot; beyond this they are turned away with a 429 straight away
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+# Longest a queued request waits before giving up
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+# Retry-After sent with a 429
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+REJECTED = register(Counter(
+    "silo_admission_rejected_total",
+    "Generations turned away by admission control, by reason (queue_full, timeout).",
+))
+
+
+class Ticket:
+    """One request's place in the admission queue, and then its slot."""
+
+    __slots__ = ("key", "admitted", "cancelled", "enqueued_at")
+
+    def __init__(self, key):
+        self.key = key
+        self.admitted = False
+        self.cancelled = False
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    Bounds concurrent generations globally and per repo.
+
+    Requests that can't start immediately wait in one FIFO queue of at most
+    `queue_size` tickets; when the queue is full `enqueue` returns None so the
+    endpoint can answer 429 at once instead of piling more work on. Freed
+    slots go to the oldest waiting ticket whose repo is under its own limit,
+    so a busy repo does not hold up requests for other repos behind it.
+    """
+
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, max_per_key: int = ADMISSION_MAX_PER_REPO,
+                 queue_size: int = ADMISSION_QUEUE_SIZE):
+        self.max_active = max(1, max_active)
+        self.max_per_key = max(1, max_per_key)
+        self.queue_size = max(0, queue_size)
+        self._waiting = []
+        self._active = 0
+        self._active_by_key = Tally()
+        self._cond = threading.Condition()
+
+    def _has_room(self, key) -> bool:
+        return self._active < self.max_active and self._active_by_key[key] < self.max_per_key
+
+    def _admit(self, ticket) -> None:
+        ticket.admitted = True
+        self._active += 1
+        self._active_by_key[ticket.key] += 1
+
+    def _admit_waiting(self) -> None:
+        """Hand free slots to waiting tickets in FIFO order; caller holds the lock."""
+        for ticket in list(self._waiting):
+            if self._active >= self.max_active:
+                break
+            if self._active_by_key[ticket.key] < self.max_per_key:
+                self._waiting.remove(ticket)
+                self._admit(ticket)
+        self._cond.notify_all()
+
+    def enqueue(self, key):
+        """Admit or queue a request for `key`; None when the queue is full."""
+        ticket = Ticket(key)
+        with self._cond:
+            if not self._waiting and self._has_room(key):
+                self._admit(ticket)
+            elif len(self._waiting) >= self.queue_size:
+                REJECTED.inc(reason="queue_full")
+                log.warning("Admission queue full (%d waiting); rejecting %s", len(self._waiting), key)
+                return None
+            else:
+                self._waiting.append(ticket)
+                self._admit_waiting()
+        return ticket
+
+    def wait(self, ticket, timeout: float = ADMISSION_QUEUE_TIMEOUT, on_position=None) -> bool:
+        """
+        Block until the ticket is admitted. `on_position(n)` is called whenever
+        the ticket's 1-based queue position changes. Returns False if the ticket
+        was cancelled or timed out.
+        """
+        deadline = time.monotonic() + timeout
+        reported = None
+        while True:
+            with self._cond:
+                if ticket.admitted:
+                    break
+                if ticket.cancelled:
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    ticket.cancelled = True
+                    REJECTED.inc(reason="timeout")
+                    return False
+                position = self._waiting.index(ticket) + 1
+                if position == reported:
+                    self._cond.wait(min(remaining, 1.0))
+                    continue
+            reported = position
+            if on_position is not None:
+                on_position(position)
+        observe("admission_wait", time.perf_counter() - ticket.enqueued_at)
+        if reported is not None and on_position is not None:
+            on_position(0)
+        return True
+
+    def release(self, ticket) -> None:
+        """Give back the ticket's slot, or its place in the queue if it never got one."""
+        with self._cond:
+            if ticket.admitted:
+                ticket.admitted = False
+                self._active -= 1
+                self._active_by_key[ticket.key] -= 1
+                if not self._active_by_key[ticket.key]:
+                    del self._active_by_key[ticket.key]
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            ticket.cancelled = True
+            self._admit_waiting()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"active": self._active, "waiting": len(self._waiting),
+                    "max_active": self.max_active, "max_per_repo": self.max_per_key,
+                    "queue_size": self.queue_size}
+
+
+ADMISSION = AdmissionController()
+
+# Slots are per process: a forked worker starts with none taken.
+os.register_at_fork(after_in_child=lambda: ADMISSION.__init__(ADMISSION.max_active, ADMISSION.max_per_key,
+                                                              ADMISSION.queue_size))
@@ -2,8 +2,10 @@ from flask import Flask
 from flask_cors import CORS
 from routes import register_routes
 from dotenv import load_dotenv
+from observability import configure_logging
 
 load_dotenv()
+configure_logging()
 
 app = Flask(__name__)
 CORS(app)  # This enables CORS for all routes
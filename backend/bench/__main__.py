@@ -0,0 +1,119 @@
+"""
+Run the offline benchmark suite from the backend directory:
+
+    python -m bench --files 500 --latency-ms 20 --concurrency 8
+    python -m bench --json results.json --baseline previous.json --tolerance 0.2
+    python -m bench --scenarios coldstart --cold-start-budget-ms 500
+    python -m bench --scenarios load --repetitions 300 --stall-every 20 --stall-ms 500 --fail-ratio 0.1
+    python -m bench --scenarios storage,upload --storage mongomock
+
+Exits non-zero when --baseline is given and a scenario's p50/p99 regressed by
+more than --tolerance, or when the coldstart scenario exceeds
+--cold-start-budget-ms to its first served request or imports a heavy client
+library (openai, requests, ...) just to serve /api/keys, or when a load stream
+ends cleanly with part of its text missing, or when an aborted stream leaves
+a generation thread running, a run uncancelled or upstream calls going on
+after its cleanup, or when the storage scenario's
+outline purge leaves an outline behind, or when a rebuild leaves superseded
+or deleted files in the vector store, or when a build whose uploads fail
+leaves pipeline threads running or budgeted bytes held.
+"""
+import argparse
+import json
+import os
+import sys
+
+from bench.fakes import FAIL_DROP, FAIL_ERROR, FakeConfig, RepoShape, StreamConfig
+from bench.harness import SCENARIOS, compare, load_report, run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="upload,outline,expand",
+                        help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--files", type=int, default=200, help="uploadable files in the fake repo")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--file-size", type=int, default=2_000)
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="per-request latency for both fakes")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--stall-every", type=int, default=0, help="stall the fake run stream every N tokens")
+    parser.add_argument("--stall-ms", type=float, default=0.0)
+    parser.add_argument("--fail-ratio", type=float, default=0.0, help="share of runs that fail part way through")
+    parser.add_argument("--fail-mode", choices=(FAIL_ERROR, FAIL_DROP), default=FAIL_ERROR,
+                        help="error: thread.run.failed event; drop: connection cut mid-body")
+    parser.add_argument("--repetitions", type=int, default=10, help="streams per streaming scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="previous --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--cold-start-budget-ms", type=float,
+                        help="fail if p50 import-to-first-response exceeds this")
+    parser.add_argument("--storage", choices=("sqlite", "mongo", "mongomock"), default="sqlite",
+                        help="build state backend; mongo uses MONGO_URI, mongomock an in-process fake (needs mongomock)")
+    args = parser.parse_args(argv)
+
+    if args.storage != "sqlite":
+        os.environ["STORAGE_BACKEND"] = "mongo"
+    if args.storage == "mongomock":
+        import mongomock
+        from mongomock.collection import BulkOperationBuilder
+
+        # pymongo 4.10+ passes UpdateOne's sort to bulk builders; mongomock 4.3 predates it
+        add_update = BulkOperationBuilder.add_update
+        BulkOperationBuilder.add_update = lambda self, *a, sort=None, **kw: add_update(self, *a, **kw)
+        os.environ["MONGO_URI"] = "mongodb://localhost:27017"
+        mongomock.patch(servers=(("localhost", 27017),)).start()
+
+    shape = RepoShape(files=args.files, depth=args.depth, fanout=args.fanout, file_size=args.file_size)
+    github = FakeConfig(args.latency_ms, args.jitter_ms, args.error_rate, seed=1)
+    openai = FakeConfig(args.latency_ms, args.jitter_ms, args.error_rate, seed=2)
+    stream = StreamConfig(args.ttft_ms, args.tokens_per_second, stall_every=args.stall_every,
+                          stall_ms=args.stall_ms, fail_ratio=args.fail_ratio, fail_mode=args.fail_mode, seed=3)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    report = run(scenarios, shape, github, openai, stream, args.repetitions, args.concurrency)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    regressions = []
+    if args.baseline:
+        regressions += compare(report, load_report(args.baseline), args.tolerance)
+    for result in report["results"]:
+        if result["scenario"] != "coldstart":
+            continue
+        if result["heavy_modules"]:
+            regressions.append(f"coldstart imports {', '.join(result['heavy_modules'])} before first request")
+        first_ms = result["first_response"]["p50_s"] * 1000
+        if args.cold_start_budget_ms is not None and first_ms > args.cold_start_budget_ms:
+            regressions.append(f"coldstart first response {first_ms:.0f}ms > budget {args.cold_start_budget_ms:.0f}ms")
+    for result in report["results"]:
+        if result["scenario"] == "abort" and result["leaked_generation_threads"]:
+            regressions.append(f"abort: {result['leaked_generation_threads']} generation threads still running")
+        if result["scenario"] == "abort" and result["runs_cancelled"] < result["runs_started"]:
+            regressions.append(f"abort: only {result['runs_cancelled']} of {result['runs_started']} runs cancelled")
+        if result["scenario"] == "abort" and result["upstream_calls_after_cleanup"]:
+            calls = ", ".join(f"{name} x{count}" for name, count in result["upstream_calls_after_cleanup"].items())
+            regressions.append(f"abort: upstream calls after cleanup: {calls}")
+        if result["scenario"] == "upload_failure" and (result["leaked_pipeline_threads"] or result["bytes_held"]):
+            regressions.append(f"upload_failure: {result['leaked_pipeline_threads']} pipeline threads still running, "
+                               f"{result['bytes_held']} budgeted bytes never released")
+        if result["scenario"] == "rebuild" and result["stale_in_store"]:
+            regressions.append(f"rebuild: {result['stale_in_store']} superseded or deleted files still in the store")
+        if result["scenario"] == "storage" and result["outlines_left"]:
+            regressions.append(f"storage: a served or expired outline survived the {result['backend']} purge")
+        if result["scenario"] == "load" and result["outcomes"].get("lost"):
+            regressions.append(f"load: {result['outcomes']['lost']} streams ended cleanly with text missing")
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
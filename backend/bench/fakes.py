@@ -0,0 +1,644 @@
+"""
+Local stand-ins for the GitHub and OpenAI HTTP APIs used by the backend.
+
+Both servers run on an ephemeral localhost port in a background thread, inject
+configurable latency and error rates, and count every call per route so the
+harness can report how many upstream requests a scenario cost.
+"""
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+###############################################################################
+# Shared server plumbing
+###############################################################################
+
+
+class FakeConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def delay(self) -> None:
+        ms = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        for route_method, pattern, name, fn in fake.routes:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(parsed.path)
+            if not match:
+                continue
+            fake.count(name)
+            fake.config.delay()
+            if name not in fake.never_fail and fake.config.should_fail():
+                fake.count("injected_error")
+                return self.send_json({"error": {"message": "injected failure"}}, status=500)
+            return fn(self, match, parse_qs(parsed.query), body)
+        fake.count("not_found")
+        self.send_json({"error": {"message": f"no route for {method} {parsed.path}"}}, status=404)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_bytes(self, data: bytes, content_type="application/octet-stream", status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeServer:
+    """Base class: subclasses fill `routes` with (method, regex, name, fn)."""
+
+    never_fail = ()
+
+    def __init__(self, config: FakeConfig = None):
+        self.config = config or FakeConfig()
+        self.routes = []
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def route(self, method, pattern, name, fn):
+        self.routes.append((method, re.compile(pattern), name, fn))
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+###############################################################################
+# GitHub
+###############################################################################
+
+
+class RepoShape:
+    """
+    Deterministic synthetic repository: `files` source files spread over a tree
+    `depth` directories deep with `fanout` subdirectories per level, plus a share
+    of files the crawler is expected to filter out. Optionally also vendored
+    exact copies, lightly patched copies and generated files, as fractions of
+    `files`.
+    """
+
+    def __init__(self, name="bench-repo", files=200, depth=3, fanout=4, file_size=2_000,
+                 skipped_ratio=0.2, owner="Bykho", duplicate_ratio=0.0, near_duplicate_ratio=0.0,
+                 generated_ratio=0.0):
+        self.name = name
+        self.owner = owner
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.file_size = file_size
+        self.skipped_ratio = skipped_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.near_duplicate_ratio = near_duplicate_ratio
+        self.generated_ratio = generated_ratio
+
+    def build(self) -> dict:
+        """Return {path: bytes} for every file in the repo."""
+        dirs = [""]
+        frontier = [""]
+        for level in range(self.depth):
+            frontier = [f"{d}{'/' if d else ''}pkg{level}_{i}" for d in frontier for i in range(self.fanout)]
+            dirs.extend(frontier)
+        extensions = itertools.cycle([".py", ".js", ".md", ".ts", ".java"])
+        skipped = itertools.cycle([".png", ".json", ".lock"])
+        tree = {}
+        n_skipped = int(self.files * self.skipped_ratio)
+        for i in range(self.files + n_skipped):
+            d = dirs[i % len(dirs)]
+            ext = next(skipped) if i >= self.files else next(extensions)
+            path = f"{d}{'/' if d else ''}module_{i}{ext}"
+            line = f"# {path}: synthetic benchmark content line\n"
+            body = (line * (self.file_size // len(line) + 1))[: self.file_size]
+            tree[path] = body.encode()
+        originals = [p for p in tree if p.endswith((".py", ".js", ".ts", ".java"))]
+        for i in range(int(self.files * self.duplicate_ratio)):
+            source = originals[i % len(originals)]
+            tree[f"third_party/copy_{i}/{source.rsplit('/', 1)[-1]}"] = tree[source]
+        for i in range(int(self.files * self.near_duplicate_ratio)):
+            source = originals[-1 - i % len(originals)]
+            tree[f"third_party/fork_{i}/{source.rsplit('/', 1)[-1]}"] = b"// patched\n" + tree[source]
+        for i in range(int(self.files * self.generated_ratio)):
+            header = f"# Code generated by protoc-gen-py. DO NOT EDIT.\n# source: api_{i}.proto\n"
+            tree[f"proto/api_{i}.py"] = (header + f"MESSAGE_{i} = {i}\n" * (self.file_size // 16)).encode()
+        tree["README.md"] = f"# {self.name}\nSynthetic repository for benchmarks.\n".encode()
+        return tree
+
+
+class FakeGitHub(FakeServer):
+    """Contents API, Trees API, raw downloads and the user repo listing."""
+
+    def __init__(self, shapes=(), config: FakeConfig = None):
+        super().__init__(config)
+        self.repos = {}
+        for shape in shapes:
+            self.add_repo(shape)
+        self.route("GET", r"/users/([^/]+)/repos", "list_repos", self._list_repos)
+        self.route("GET", r"/orgs/([^/]+)/repos", "list_repos", self._list_repos)
+        self.route("GET", r"/repos/([^/]+)/([^/]+)/contents/?(.*)", "contents", self._contents)
+        self.route("GET", r"/repos/([^/]+)/([^/]+)/git/trees/([^/]+)", "trees", self._trees)
+        self.route("GET", r"/raw/([^/]+)/([^/]+)/(.+)", "raw", self._raw)
+
+    def add_repo(self, shape: RepoShape, pushed_at: str = "2026-01-01T00:00:00Z"):
+        files = shape.build()
+        self.repos[(shape.owner, shape.name)] = {
+            "shape": shape, "files": files, "dirs": self._dirs(files), "pushed_at": pushed_at,
+        }
+
+    def push(self, shape: RepoShape, changes: dict, pushed_at: str):
+        """Commit to a repo added earlier: `changes` maps paths to new content, or to None to delete them."""
+        entry = self.repos[(shape.owner, shape.name)]
+        files = dict(entry["files"])
+        for path, body in changes.items():
+            if body is None:
+                files.pop(path, None)
+            else:
+                files[path] = body
+        entry.update(files=files, dirs=self._dirs(files), pushed_at=pushed_at)
+
+    @staticmethod
+    def _dirs(files: dict) -> dict:
+        dirs = {}
+        for path in files:
+            parts = path.split("/")
+            for i in range(len(parts)):
+                parent = "/".join(parts[:i])
+                child = "/".join(parts[: i + 1])
+                kind = "file" if i == len(parts) - 1 else "dir"
+                dirs.setdefault(parent, {})[child] = kind
+        return dirs
+
+    @staticmethod
+    def _sha(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    def _item(self, owner, repo, path, kind, files):
+        name = path.rsplit("/", 1)[-1]
+        api = f"{self.url}/repos/{owner}/{repo}/contents/{path}"
+        item = {
+            "name": name, "path": path, "type": kind,
+            "sha": self._sha(files[path]) if kind == "file" else self._sha(path.encode()),
+            "size": len(files[path]) if kind == "file" else 0,
+            "url": api,
+            "html_url": f"https://github.com/{owner}/{repo}/blob/main/{path}",
+            "git_url": f"{self.url}/repos/{owner}/{repo}/git/blobs/{name}",
+            "download_url": f"{self.url}/raw/{owner}/{repo}/{path}" if kind == "file" else None,
+            "_links": {"self": api, "git": api, "html": api},
+        }
+        return item
+
+    def _list_repos(self, h, match, query, body):
+        owner = match.group(1)
+        repos = [
+            {
+                "id": i, "name": name, "full_name": f"{o}/{name}", "owner": {"login": o},
+                "html_url": f"https://github.com/{o}/{name}", "pushed_at": entry["pushed_at"],
+                "default_branch": "main",
+            }
+            for i, ((o, name), entry) in enumerate(sorted(self.repos.items()))
+            if o == owner
+        ]
+        h.send_json(repos)
+
+    def _contents(self, h, match, query, body):
+        owner, repo, path = match.group(1), match.group(2), match.group(3).strip("/")
+        entry = self.repos.get((owner, repo))
+        if entry is None or path not in entry["dirs"]:
+            return h.send_json({"message": "Not Found"}, status=404)
+        items = [
+            self._item(owner, repo, child, kind, entry["files"])
+            for child, kind in sorted(entry["dirs"][path].items())
+        ]
+        h.send_json(items)
+
+    def _trees(self, h, match, query, body):
+        owner, repo = match.group(1), match.group(2)
+        entry = self.repos.get((owner, repo))
+        if entry is None:
+            return h.send_json({"message": "Not Found"}, status=404)
+        tree = []
+        for parent, children in entry["dirs"].items():
+            for child, kind in children.items():
+                if kind == "dir":
+                    tree.append({"path": child, "type": "tree", "sha": self._sha(child.encode()), "mode": "040000"})
+                else:
+                    data = entry["files"][child]
+                    tree.append({"path": child, "type": "blob", "sha": self._sha(data), "size": len(data), "mode": "100644"})
+        h.send_json({"sha": match.group(3), "tree": sorted(tree, key=lambda t: t["path"]), "truncated": False})
+
+    def _raw(self, h, match, query, body):
+        owner, repo, path = match.groups()
+        entry = self.repos.get((owner, repo))
+        if entry is None or path not in entry["files"]:
+            return h.send_bytes(b"Not Found", status=404)
+        h.send_bytes(entry["files"][path], content_type="text/plain; charset=utf-8")
+
+###############################################################################
+# OpenAI
+###############################################################################
+
+DEFAULT_OUTLINE = "\n".join(
+    f"---SECTION_TITLE: Section {i}\n- Point about component {i}\n- Another detail on the design of part {i}"
+    for i in range(1, 6)
+)
+
+
+FAIL_ERROR = "error"   # the run ends with thread.run.failed, as OpenAI reports a server error mid-run
+FAIL_DROP = "drop"     # the connection is cut mid-body, without the terminating chunk
+
+
+class StreamConfig:
+    """
+    Shape of a streamed assistant run: time to first token, token rate and
+    length, plus injected faults: a stall of `stall_ms` after every
+    `stall_every` tokens, and a `fail_ratio` share of runs that fail
+    (`fail_mode`) at a random point part way through.
+    """
+
+    def __init__(self, ttft_ms: float = 200.0, tokens_per_second: float = 200.0, text: str = DEFAULT_OUTLINE,
+                 stall_every: int = 0, stall_ms: float = 0.0, fail_ratio: float = 0.0,
+                 fail_mode: str = FAIL_ERROR, seed: int = 0):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.text = text
+        self.stall_every = stall_every
+        self.stall_ms = stall_ms
+        self.fail_ratio = fail_ratio
+        self.fail_mode = fail_mode
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def failure_point(self, tokens: int):
+        """Token index at which this run fails, or None for a healthy run."""
+        with self._lock:
+            if self.fail_ratio <= 0 or self.random.random() >= self.fail_ratio:
+                return None
+            return self.random.randrange(1, max(2, tokens))
+
+    def faults(self) -> dict:
+        return {"stall_every": self.stall_every, "stall_ms": self.stall_ms,
+                "fail_ratio": self.fail_ratio, "fail_mode": self.fail_mode}
+
+    def text_for(self, instructions: str = "") -> str:
+        """
+        What a run answers. Sectioned outline runs (see routes.start_sectioned_outline)
+        get the matching part of `text`: its titles, or one section's body.
+        """
+        sections = [block.partition("\n") for block in self.text.split("---SECTION_TITLE:")[1:]]
+        if not sections or not instructions:
+            return self.text
+        if "Only list the section titles" in instructions:
+            return "\n".join(f"---SECTION_TITLE: {title.strip()}" for title, _, _ in sections)
+        wanted = re.search(r'the section titled "([^"]*)"', instructions)
+        if wanted:
+            for title, _, body in sections:
+                if title.strip() == wanted.group(1):
+                    return body.strip()
+        return self.text
+
+    def tokens(self, text: str = None):
+        return re.findall(r"\S+\s*|\s+", self.text if text is None else text)
+
+
+class FakeOpenAI(FakeServer):
+    """Files, vector stores, assistants, threads, messages and streamed runs."""
+
+    # Keep the run stream itself healthy; failures there are the fault-injection harness's job.
+    never_fail = ("create_run",)
+
+    def __init__(self, config: FakeConfig = None, stream: StreamConfig = None):
+        super().__init__(config)
+        self.stream = stream or StreamConfig()
+        self.files = {}
+        self.vector_stores = {}
+        self.assistants = {}
+        self.threads = {}
+        self.runs = {}
+        self.vector_store_files = {}
+        self._ids = itertools.count(1)
+        p = r"/v1"
+        self.route("POST", p + r"/files", "create_file", self._create_file)
+        self.route("GET", p + r"/files", "list_files", self._list("files"))
+        self.route("DELETE", p + r"/files/([^/]+)", "delete_file", self._delete_file)
+        self.route("POST", p + r"/vector_stores", "create_vector_store", self._create_vector_store)
+        self.route("GET", p + r"/vector_stores", "list_vector_stores", self._list("vector_stores"))
+        self.route("GET", p + r"/vector_stores/([^/]+)", "get_vector_store", self._get("vector_stores"))
+        self.route("DELETE", p + r"/vector_stores/([^/]+)", "delete_vector_store", self._delete("vector_stores", "vector_store"))
+        self.route("POST", p + r"/vector_stores/([^/]+)/files", "attach_file", self._attach_file)
+        self.route("GET", p + r"/vector_stores/([^/]+)/files", "list_vector_store_files", self._list_vector_store_files)
+        self.route("DELETE", p + r"/vector_stores/([^/]+)/files/([^/]+)", "detach_file", self._detach_file)
+        self.route("POST", p + r"/assistants", "create_assistant", self._create_assistant)
+        self.route("GET", p + r"/assistants", "list_assistants", self._list("assistants"))
+        self.route("GET", p + r"/assistants/([^/]+)", "get_assistant", self._get("assistants"))
+        self.route("POST", p + r"/assistants/([^/]+)", "update_assistant", self._update_assistant)
+        self.route("DELETE", p + r"/assistants/([^/]+)", "delete_assistant", self._delete("assistants", "assistant"))
+        self.route("POST", p + r"/threads", "create_thread", self._create_thread)
+        self.route("POST", p + r"/threads/([^/]+)/messages", "create_message", self._create_message)
+        self.route("POST", p + r"/threads/([^/]+)/runs", "create_run", self._create_run)
+        self.route("POST", p + r"/threads/([^/]+)/runs/([^/]+)/cancel", "cancel_run", self._cancel_run)
+
+    def _new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    # -- generic helpers -----------------------------------------------------
+
+    @staticmethod
+    def _page(h, objects, query):
+        """Send one cursor page; the SDK keeps requesting `after` the last id until a page is empty."""
+        limit = int(query.get("limit", ["20"])[0])
+        after = query.get("after", [None])[0]
+        if after:
+            ids = [o["id"] for o in objects]
+            objects = objects[ids.index(after) + 1:] if after in ids else []
+        page = objects[:limit]
+        h.send_json({
+            "object": "list", "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(objects) > limit,
+        })
+
+    def _list(self, attr):
+        def handler(h, match, query, body):
+            objects = sorted(getattr(self, attr).values(), key=lambda o: o["created_at"], reverse=True)
+            self._page(h, objects, query)
+        return handler
+
+    def _get(self, attr):
+        def handler(h, match, query, body):
+            obj = getattr(self, attr).get(match.group(1))
+            if obj is None:
+                return h.send_json({"error": {"message": "not found"}}, status=404)
+            h.send_json(obj)
+        return handler
+
+    def _delete(self, attr, kind):
+        def handler(h, match, query, body):
+            removed = getattr(self, attr).pop(match.group(1), None)
+            h.send_json({"id": match.group(1), "object": f"{kind}.deleted", "deleted": removed is not None})
+        return handler
+
+    # -- resources -----------------------------------------------------------
+
+    def uploaded_bytes(self) -> int:
+        """Total size of the multipart bodies received by the files endpoint."""
+        return sum(f["bytes"] for f in self.files.values())
+
+    def _create_file(self, h, match, query, body):
+        filename = re.search(rb'filename="([^"]*)"', body)
+        file_id = self._new_id("file")
+        obj = {
+            "id": file_id, "object": "file", "bytes": len(body), "created_at": int(time.time()),
+            "filename": filename.group(1).decode() if filename else "upload", "purpose": "assistants",
+            "status": "processed",
+        }
+        self.files[file_id] = obj
+        h.send_json(obj)
+
+    def _create_vector_store(self, h, match, query, body):
+        params = json.loads(body or b"{}")
+        vs_id = self._new_id("vs")
+        obj = {
+            "id": vs_id, "object": "vector_store", "created_at": int(time.time()),
+            "name": params.get("name"), "usage_bytes": 0, "status": "completed",
+            "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+            "expires_after": params.get("expires_after"), "last_active_at": int(time.time()),
+            "metadata": params.get("metadata") or {},
+        }
+        self.vector_stores[vs_id] = obj
+        h.send_json(obj)
+
+    def _attach_file(self, h, match, query, body):
+        vs = self.vector_stores.get(match.group(1))
+        if vs is None:
+            return h.send_json({"error": {"message": "vector store not found"}}, status=404)
+        params = json.loads(body or b"{}")
+        self.vector_store_files.setdefault(vs["id"], []).append(params.get("file_id"))
+        vs["file_counts"]["completed"] += 1
+        vs["file_counts"]["total"] += 1
+        h.send_json({
+            "id": params.get("file_id"), "object": "vector_store.file", "usage_bytes": 0,
+            "created_at": int(time.time()), "vector_store_id": vs["id"], "status": "completed",
+            "last_error": None,
+        })
+
+    def _list_vector_store_files(self, h, match, query, body):
+        vs_id = match.group(1)
+        data = [
+            {"id": file_id, "object": "vector_store.file", "usage_bytes": 0, "created_at": 0,
+             "vector_store_id": vs_id, "status": "completed", "last_error": None}
+            for file_id in self.vector_store_files.get(vs_id, [])
+        ]
+        self._page(h, data, query)
+
+    def _detach_file(self, h, match, query, body):
+        attached = self.vector_store_files.get(match.group(1), [])
+        file_id = match.group(2)
+        removed = file_id in attached
+        while file_id in attached:
+            attached.remove(file_id)
+        h.send_json({"id": file_id, "object": "vector_store.file.deleted", "deleted": removed})
+
+    def _delete_file(self, h, match, query, body):
+        file_id = match.group(1)
+        removed = self.files.pop(file_id, None)
+        for attached in self.vector_store_files.values():
+            if file_id in attached:
+                attached.remove(file_id)
+        h.send_json({"id": file_id, "object": "file", "deleted": removed is not None})
+
+    def _create_assistant(self, h, match, query, body):
+        params = json.loads(body or b"{}")
+        asst_id = self._new_id("asst")
+        obj = {
+            "id": asst_id, "object": "assistant", "created_at": int(time.time()),
+            "name": params.get("name"), "description": None, "model": params.get("model"),
+            "instructions": params.get("instructions"), "tools": params.get("tools") or [],
+            "tool_resources": params.get("tool_resources") or {}, "metadata": params.get("metadata") or {},
+            "top_p": 1.0, "temperature": 1.0, "response_format": "auto",
+        }
+        self.assistants[asst_id] = obj
+        h.send_json(obj)
+
+    def _update_assistant(self, h, match, query, body):
+        obj = self.assistants.get(match.group(1))
+        if obj is None:
+            return h.send_json({"error": {"message": "not found"}}, status=404)
+        obj.update(json.loads(body or b"{}"))
+        h.send_json(obj)
+
+    def _create_thread(self, h, match, query, body):
+        thread_id = self._new_id("thread")
+        obj = {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}, "tool_resources": {}}
+        self.threads[thread_id] = obj
+        h.send_json(obj)
+
+    def _create_message(self, h, match, query, body):
+        params = json.loads(body or b"{}")
+        h.send_json(self._message(match.group(1), None, "user", params.get("content", ""), "completed"))
+
+    def _message(self, thread_id, run_id, role, text, status):
+        return {
+            "id": self._new_id("msg"), "object": "thread.message", "created_at": int(time.time()),
+            "thread_id": thread_id, "role": role, "assistant_id": None, "run_id": run_id,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}] if text else [],
+            "attachments": [], "metadata": {}, "status": status,
+            "incomplete_details": None, "completed_at": None, "incomplete_at": None,
+        }
+
+    def _run(self, thread_id, run_id, assistant_id, status):
+        return {
+            "id": run_id, "object": "thread.run", "created_at": int(time.time()),
+            "thread_id": thread_id, "assistant_id": assistant_id, "status": status,
+            "model": "gpt-4-turbo", "instructions": "", "tools": [], "metadata": {},
+            "parallel_tool_calls": True, "response_format": "auto", "tool_choice": "auto",
+            "truncation_strategy": {"type": "auto", "last_messages": None},
+        }
+
+    def _cancel_run(self, h, match, query, body):
+        thread_id, run_id = match.groups()
+        state = self.runs.get(run_id)
+        if state is not None:
+            state["cancelled"] = True
+        h.send_json(self._run(thread_id, run_id, state["assistant_id"] if state else None, "cancelling"))
+
+    def _create_run(self, h, match, query, body):
+        thread_id = match.group(1)
+        params = json.loads(body or b"{}")
+        run_id = self._new_id("run")
+        state = self.runs[run_id] = {"assistant_id": params.get("assistant_id"), "cancelled": False, "tokens_sent": 0}
+
+        def send(event, data):
+            h.write_chunk(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+
+        h.start_chunked("text/event-stream")
+        try:
+            send("thread.run.created", self._run(thread_id, run_id, state["assistant_id"], "queued"))
+            send("thread.run.in_progress", self._run(thread_id, run_id, state["assistant_id"], "in_progress"))
+            message = self._message(thread_id, run_id, "assistant", "", "in_progress")
+            send("thread.message.created", message)
+            time.sleep(self.stream.ttft_ms / 1000.0)
+            interval = 1.0 / self.stream.tokens_per_second if self.stream.tokens_per_second else 0
+            text = self.stream.text_for(params.get("instructions") or "")
+            tokens = self.stream.tokens(text)
+            fail_at = self.stream.failure_point(len(tokens))
+            for index, token in enumerate(tokens):
+                if state["cancelled"]:
+                    send("thread.run.cancelled", self._run(thread_id, run_id, state["assistant_id"], "cancelled"))
+                    break
+                if index == fail_at:
+                    self.count("injected_stream_failure")
+                    if self.stream.fail_mode == FAIL_DROP:
+                        h.close_connection = True
+                        return
+                    failed = self._run(thread_id, run_id, state["assistant_id"], "failed")
+                    failed["last_error"] = {"code": "server_error", "message": "injected failure mid-run"}
+                    send("thread.run.failed", failed)
+                    break
+                if self.stream.stall_every and index and index % self.stream.stall_every == 0:
+                    self.count("injected_stall")
+                    time.sleep(self.stream.stall_ms / 1000.0)
+                send("thread.message.delta", {
+                    "id": message["id"], "object": "thread.message.delta",
+                    "delta": {"content": [{"index": 0, "type": "text", "text": {"value": token, "annotations": []}}]},
+                })
+                state["tokens_sent"] += 1
+                self.count("stream_token")
+                if interval:
+                    time.sleep(interval)
+            else:
+                done = dict(message, status="completed",
+                            content=[{"type": "text", "text": {"value": text, "annotations": []}}])
+                send("thread.message.completed", done)
+                send("thread.run.completed", self._run(thread_id, run_id, state["assistant_id"], "completed"))
+            h.write_chunk(b"event: done\ndata: [DONE]\n\n")
+            h.end_chunked()
+        except (BrokenPipeError, ConnectionResetError):
+            self.count("stream_client_gone")
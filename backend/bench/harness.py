@@ -0,0 +1,1159 @@
+"""
+End-to-end benchmark scenarios driven through the Flask app against the fakes.
+
+The app is imported only after the fake servers are up, because routes.py reads
+its API keys and base URLs from the environment at import time.
+"""
+import gc
+import json
+import logging
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fakes import FakeConfig, FakeGitHub, FakeOpenAI, RepoShape, StreamConfig
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies):
+    return {
+        "n": len(latencies),
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p99_s": round(percentile(latencies, 99), 4),
+        "mean_s": round(statistics.fmean(latencies), 4) if latencies else 0.0,
+        "max_s": round(max(latencies), 4) if latencies else 0.0,
+    }
+
+
+class BenchEnvironment:
+    """Starts the fakes, points the backend at them and hands out a test client."""
+
+    def __init__(self, shape: RepoShape, github: FakeConfig = None, openai: FakeConfig = None,
+                 stream: StreamConfig = None):
+        self.shape = shape
+        self.github = FakeGitHub([shape], github)
+        self.openai = FakeOpenAI(openai, stream)
+        self.app = None
+
+    def __enter__(self):
+        self.github.start()
+        self.openai.start()
+        os.environ.update({
+            "GITHUB_API_KEY": "bench-github-token",
+            "OPENAI_API_KEY": "bench-openai-key",
+            "GITHUB_API_URL": self.github.url,
+            "OPENAI_BASE_URL": f"{self.openai.url}/v1",
+        })
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ.setdefault("BUILD_STATE_DIR", tempfile.mkdtemp(prefix="silo-bench-"))
+        os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="silo-cache-"), "shared.sqlite3"))
+        # Short enough that the abort scenario sees runs cancelled well before they finish.
+        os.environ.setdefault("STREAM_RECONNECT_GRACE_SECONDS", "0.5")
+        import app as backend_app
+        self.app = backend_app.app
+        return self
+
+    def __exit__(self, *exc):
+        self.github.stop()
+        self.openai.stop()
+
+    def client(self):
+        return self.app.test_client()
+
+    def api_calls(self):
+        return {"github": dict(self.github.calls), "openai": dict(self.openai.calls)}
+
+    def reset_counts(self):
+        self.github.reset_counts()
+        self.openai.reset_counts()
+
+
+def _consume_stream(client, path, payload):
+    """POST to a streaming endpoint; return (ttft, total, bytes, error)."""
+    start = time.perf_counter()
+    resp = client.post(path, json=payload, buffered=False)
+    ttft = None
+    received = 0
+    error = None
+    try:
+        if resp.status_code != 200:
+            return None, time.perf_counter() - start, 0, f"HTTP {resp.status_code}"
+        for chunk in resp.response:
+            if ttft is None and b'"content"' in chunk:
+                ttft = time.perf_counter() - start
+            if b'"error"' in chunk:
+                error = chunk.decode(errors="replace")
+            received += len(chunk)
+    finally:
+        resp.close()
+    return ttft, time.perf_counter() - start, received, error
+
+
+def _measure(fn, repetitions, concurrency):
+    """Run fn() `repetitions` times across `concurrency` threads, tracking memory."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: fn(), range(repetitions)))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, wall, peak
+
+
+def bench_upload(env: BenchEnvironment, repetitions=1, concurrency=1):
+    client = env.client()
+    repo = {"name": env.shape.name}
+
+    def one():
+        start = time.perf_counter()
+        resp = client.post("/api/dynamic_upload_to_vs", json={"repo": repo})
+        body = resp.get_json() or {}
+        return time.perf_counter() - start, len(body.get("attached_file_ids", [])), len(body.get("errors", []))
+
+    env.reset_counts()
+    results, wall, peak = _measure(one, repetitions, concurrency)
+    files = sum(r[1] for r in results)
+    return {
+        "scenario": "dynamic_upload_to_vs",
+        "latency": summarize([r[0] for r in results]),
+        "files_uploaded": files,
+        "file_errors": sum(r[2] for r in results),
+        "throughput_files_per_s": round(files / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "peak_tracemalloc_bytes": peak,
+        "api_calls": env.api_calls(),
+    }
+
+
+def _bench_stream(env, scenario, path, payload, repetitions, concurrency):
+    client = env.client()
+    env.reset_counts()
+    results, wall, peak = _measure(lambda: _consume_stream(client, path, payload), repetitions, concurrency)
+    ttfts = [r[0] for r in results if r[0] is not None]
+    return {
+        "scenario": scenario,
+        "latency": summarize([r[1] for r in results]),
+        "time_to_first_token": summarize(ttfts),
+        "errors": sum(1 for r in results if r[3]),
+        "bytes_received": sum(r[2] for r in results),
+        "throughput_streams_per_s": round(len(results) / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "peak_tracemalloc_bytes": peak,
+        "api_calls": env.api_calls(),
+    }
+
+
+def bench_outline(env: BenchEnvironment, repetitions=10, concurrency=4):
+    return _bench_stream(env, "dynamic_generate_outline", "/api/dynamic_generate_outline",
+                         {"repo": {"name": env.shape.name}}, repetitions, concurrency)
+
+
+def bench_expand(env: BenchEnvironment, repetitions=10, concurrency=4):
+    return _bench_stream(env, "dynamic_expand_topic", "/api/dynamic_expand_topic",
+                         {"repo": {"name": env.shape.name}, "topic": "Architecture"}, repetitions, concurrency)
+
+
+def _generation_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("generation-")]
+
+
+def bench_abort(env: BenchEnvironment, repetitions=10, concurrency=4, tokens_per_second=20.0):
+    """
+    Start outline streams and drop each client after its first token, as the
+    frontend does when a modal is closed. Reports how long the backend takes
+    to cancel the upstream runs and stop their threads, how much of each run
+    was streamed (and paid for) anyway, and any upstream call made once the
+    cleanup is over (there should be none).
+    """
+    from streams import STREAMS
+
+    client = env.client()
+    payload = {"repo": {"name": env.shape.name}}
+    # Slow the fake run down so an uncancelled run would clearly outlive the grace period.
+    stream_config, env.openai.stream = env.openai.stream, StreamConfig(
+        env.openai.stream.ttft_ms, tokens_per_second, env.openai.stream.text)
+    tokens_per_run = len(env.openai.stream.tokens())
+
+    def one():
+        start = time.perf_counter()
+        resp = client.post("/api/dynamic_generate_outline", json=payload, buffered=False)
+        try:
+            for chunk in resp.response:
+                if b'"content"' in chunk:
+                    break
+        finally:
+            resp.close()
+        return time.perf_counter() - start
+
+    env.reset_counts()
+    threads_before = threading.active_count()
+    try:
+        results, wall, peak = _measure(one, repetitions, concurrency)
+        threads_after_abort = threading.active_count()
+        aborted_at = time.perf_counter()
+        deadline = time.monotonic() + STREAMS.grace + 10
+        while _generation_threads() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        cleanup = time.perf_counter() - aborted_at
+        calls = env.api_calls()
+        # Long enough for a run nobody cancelled to stream a few more tokens
+        time.sleep(5 / tokens_per_second)
+        late = env.api_calls()
+    finally:
+        env.openai.stream = stream_config
+    calls_after_cleanup = {
+        f"{api}.{name}": count - calls[api].get(name, 0)
+        for api in late for name, count in late[api].items() if count != calls[api].get(name, 0)
+    }
+    return {
+        "scenario": "abort",
+        "latency": summarize(results),
+        "reconnect_grace_s": STREAMS.grace,
+        "cleanup_s": round(cleanup, 3),
+        "threads_before": threads_before,
+        "threads_after_abort": threads_after_abort,
+        "threads_after_cleanup": threading.active_count(),
+        "leaked_generation_threads": len(_generation_threads()),
+        "runs_started": calls["openai"].get("create_run", 0),
+        "runs_cancelled": calls["openai"].get("cancel_run", 0),
+        "upstream_calls_after_cleanup": calls_after_cleanup,
+        "tokens_streamed": calls["openai"].get("stream_token", 0),
+        "tokens_if_uncancelled": tokens_per_run * repetitions,
+        "wall_s": round(wall, 3),
+        "peak_tracemalloc_bytes": peak,
+        "api_calls": calls,
+    }
+
+
+def bench_burst(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """
+    Fire `repetitions` outline streams at once (ignoring --concurrency) to
+    exercise admission control: how many are queued or turned away with 429,
+    and how latency is spread across the ones that were admitted.
+    """
+    from admission import ADMISSION
+
+    client = env.client()
+    payload = {"repo": {"name": env.shape.name}}
+    env.reset_counts()
+    results, wall, peak = _measure(
+        lambda: _consume_stream(client, "/api/dynamic_generate_outline", payload), repetitions, repetitions)
+    admitted = [r for r in results if r[3] != "HTTP 429"]
+    rejected = [r for r in results if r[3] == "HTTP 429"]
+    return {
+        "scenario": "burst",
+        "latency": summarize([r[1] for r in admitted]),
+        "time_to_first_token": summarize([r[0] for r in admitted if r[0] is not None]),
+        "rejected_429": len(rejected),
+        "rejected_latency": summarize([r[1] for r in rejected]),
+        "errors": sum(1 for r in admitted if r[3]),
+        "admission": ADMISSION.stats(),
+        "wall_s": round(wall, 3),
+        "peak_tracemalloc_bytes": peak,
+        "api_calls": env.api_calls(),
+    }
+
+
+def _parse_json_framing(body: str) -> str:
+    """What the frontend did before compact framing: JSON.parse every data line."""
+    text = []
+    for line in body.split("\n"):
+        if line.startswith("data: "):
+            data = json.loads(line[6:])
+            if "content" in data:
+                text.append(data["content"])
+    return "".join(text)
+
+
+def _parse_compact_framing(body: str) -> str:
+    """A spec-following SSE parser: raw text for `event: t`, JSON for anything else."""
+    text = []
+    event, data = None, []
+    for line in body.split("\n"):
+        if not line:
+            if data:
+                if event == "t":
+                    text.append("\n".join(data))
+                else:
+                    json.loads("\n".join(data))
+            event, data = None, []
+        elif line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data:"):
+            data.append(line[6:] if line.startswith("data: ") else line[5:])
+    return "".join(text)
+
+
+def _decode_body(raw: bytes, encoding: str) -> str:
+    if encoding == "gzip":
+        raw = zlib.decompress(raw, 31)
+    elif encoding == "br":
+        import brotli
+        raw = brotli.decompress(raw)
+    return raw.decode()
+
+
+def bench_framing(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """
+    Stream one typical outline per framing/encoding combination and compare
+    bytes on the wire, frames written and client-side parse time.
+    """
+    import streams
+
+    client = env.client()
+    payload = {"repo": {"name": env.shape.name}}
+    parse_rounds = max(repetitions, 1) * 50
+    # One frame per delta, as before coalescing, for reference.
+    combos = [("json", "identity", 0)]
+    for framing in ("json", "compact"):
+        for encoding in ("identity", "gzip", "br"):
+            if encoding != "identity" and streams.choose_encoding(encoding) != encoding:
+                continue  # disabled, or brotli not installed
+            combos.append((framing, encoding, streams.STREAM_COALESCE_MS))
+
+    env.reset_counts()
+    variants = []
+    default_coalesce = streams.STREAM_COALESCE_MS
+    for framing, encoding, coalesce_ms in combos:
+        streams.STREAM_COALESCE_MS = coalesce_ms
+        try:
+            resp = client.post("/api/dynamic_generate_outline", json=payload, buffered=False,
+                               headers={"X-Stream-Framing": framing, "Accept-Encoding": encoding})
+            try:
+                chunks = list(resp.response)
+            finally:
+                resp.close()
+        finally:
+            streams.STREAM_COALESCE_MS = default_coalesce
+        raw = b"".join(chunks)
+        body = _decode_body(raw, resp.headers.get("Content-Encoding", "identity"))
+        parse = _parse_compact_framing if framing == "compact" else _parse_json_framing
+        start = time.perf_counter()
+        for _ in range(parse_rounds):
+            text = parse(body)
+        parse_s = (time.perf_counter() - start) / parse_rounds
+        variants.append({
+            "framing": framing,
+            "encoding": resp.headers.get("Content-Encoding", "identity"),
+            "coalesce_ms": coalesce_ms,
+            "wire_bytes": len(raw),
+            "decoded_bytes": len(body),
+            "writes": len(chunks),
+            "frames": body.count("\n\n"),
+            "text_bytes": len(text.encode()),
+            "client_parse_us": round(parse_s * 1e6, 1),
+        })
+    return {"scenario": "framing", "variants": variants, "api_calls": env.api_calls()}
+
+
+# Runs in a fresh interpreter: import the app and serve one /api/keys request.
+_COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get("/api/keys").status_code
+served = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start, "first_response_s": served - start, "status": status,
+    "heavy_modules": sorted(m for m in HEAVY_MODULES if m in sys.modules),
+}))
+"""
+
+# Dependencies that must not be imported just to serve a request that doesn't need them
+HEAVY_MODULES = ("openai", "requests", "tenacity", "httpx", "pydantic")
+
+
+def _importtime_top(stderr: str, top: int = 10) -> list:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def measure_cold_start(runs: int = 5) -> dict:
+    """Start `runs` fresh interpreters with -X importtime and time each to its first served request."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + _COLD_START_SCRIPT
+    samples, first = [], None
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=backend_dir,
+                              capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - start
+        sample = json.loads(proc.stdout.strip().splitlines()[-1])
+        sample["process_s"] = wall
+        samples.append(sample)
+        if first is None:
+            first = proc.stderr
+    return {
+        "latency": summarize([s["process_s"] for s in samples]),
+        "import": summarize([s["import_s"] for s in samples]),
+        "first_response": summarize([s["first_response_s"] for s in samples]),
+        "status": samples[-1]["status"],
+        "heavy_modules": sorted({m for s in samples for m in s["heavy_modules"]}),
+        "slowest_imports": _importtime_top(first),
+    }
+
+
+def bench_coldstart(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """Process start to first /api/keys response, with -X importtime's slowest modules."""
+    return {"scenario": "coldstart", **measure_cold_start(min(repetitions, 5))}
+
+
+# Runs in a fresh interpreter so ru_maxrss covers one build only.
+_BUILD_MEMORY_SCRIPT = """
+import json, resource, sys
+from bench.fakes import FakeConfig, RepoShape
+from bench.harness import BenchEnvironment, bench_upload
+shape = RepoShape(files=FILES, file_size=FILE_SIZE, depth=2, fanout=8)
+with BenchEnvironment(shape, openai=FakeConfig(latency_ms=UPLOAD_LATENCY_MS)) as env:
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = bench_upload(env)
+print(json.dumps({
+    "baseline_rss_kb": baseline_kb,
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "files_uploaded": result["files_uploaded"],
+    "wall_s": result["wall_s"],
+}))
+"""
+
+
+def _record_bytes(count: int) -> dict:
+    """Bytes per discovered file held as a GitHub contents item vs a FileRecord."""
+    from pipeline import FileRecord
+
+    def item(i):
+        path = f"src/module_{i // 100}/file_{i}.py"
+        api = f"https://api.github.com/repos/owner/repo/contents/{path}"
+        return {
+            "name": f"file_{i}.py", "path": path, "sha": f"{i:040x}", "size": 2000, "url": api,
+            "html_url": f"https://github.com/owner/repo/blob/main/{path}",
+            "git_url": f"https://api.github.com/repos/owner/repo/git/blobs/{i:040x}",
+            "download_url": f"https://raw.githubusercontent.com/owner/repo/main/{path}",
+            "type": "file", "_links": {"self": api, "git": api, "html": api},
+        }
+
+    sizes = {}
+    for name, build in (("github_item", item), ("file_record", lambda i: FileRecord.from_item(item(i)))):
+        gc.collect()
+        tracemalloc.start()
+        kept = [build(i) for i in range(count)]
+        sizes[name] = round(tracemalloc.get_traced_memory()[0] / count)
+        tracemalloc.stop()
+        del kept
+    return sizes
+
+
+def bench_memory(env: BenchEnvironment, repetitions=10, concurrency=4, files=400, file_size=500_000):
+    """
+    Peak RSS of one build of a repo of large files while uploads are slow, so
+    downloaded bodies pile up between stages: without a byte budget and with
+    the default BUILD_INFLIGHT_BYTES. Also bytes per discovered file record.
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (f"FILES, FILE_SIZE, UPLOAD_LATENCY_MS = {files}, {file_size}, 50\n"
+              + _BUILD_MEMORY_SCRIPT)
+    variants = []
+    for label, budget in (("unbounded", "0"), ("budget", None)):
+        child_env = {k: v for k, v in os.environ.items()
+                     if k not in ("GITHUB_API_URL", "OPENAI_BASE_URL", "BUILD_STATE_DIR", "SHARED_CACHE_PATH")}
+        if budget is not None:
+            child_env["BUILD_INFLIGHT_BYTES"] = budget
+        proc = subprocess.run([sys.executable, "-c", script], cwd=backend_dir, env=child_env,
+                              capture_output=True, text=True, check=True)
+        sample = json.loads(proc.stdout.strip().splitlines()[-1])
+        sample["build_rss_kb"] = sample["peak_rss_kb"] - sample["baseline_rss_kb"]
+        variants.append({"variant": label, "inflight_bytes": budget or os.getenv("BUILD_INFLIGHT_BYTES", "default"),
+                         **sample})
+    return {"scenario": "memory", "files": files, "file_size": file_size, "variants": variants,
+            "record_bytes_per_file": _record_bytes(50_000)}
+
+
+def bench_upload_failure(env: BenchEnvironment, repetitions=1, concurrency=1, inflight_bytes=1_000):
+    """
+    Build a repo whose upload stage raises on its first file, under a byte
+    budget a few files fill, so download workers are queued on the budget and
+    the stage buffer when the build fails. Reports the pipeline threads still
+    running and the budgeted bytes never given back once the build is over.
+    """
+    import routes
+
+    budgets = []
+
+    class RecordedBudget(routes.ByteBudget):
+        def __init__(self, limit):
+            super().__init__(limit)
+            budgets.append(self)
+
+    def failing_upload(client, file_path, content):
+        raise RuntimeError("upload stage failed")
+
+    shape = RepoShape(name=f"{env.shape.name}-upload-failure", files=200, file_size=100, owner=env.shape.owner)
+    env.github.add_repo(shape)
+    before = set(threading.enumerate())
+    saved = routes.ByteBudget, routes.upload_content, routes.BUILD_INFLIGHT_BYTES
+    routes.ByteBudget, routes.upload_content, routes.BUILD_INFLIGHT_BYTES = RecordedBudget, failing_upload, inflight_bytes
+    try:
+        start = time.perf_counter()
+        resp = env.client().post("/api/dynamic_upload_to_vs", json={"repo": {"name": shape.name}})
+        elapsed = time.perf_counter() - start
+    finally:
+        routes.ByteBudget, routes.upload_content, routes.BUILD_INFLIGHT_BYTES = saved
+    deadline = time.monotonic() + 2.0
+    while True:
+        # stage() workers run `work`; threads are named after their target
+        leaked = [t for t in threading.enumerate() if t not in before and t.name.endswith("(work)")]
+        if not leaked or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    return {
+        "scenario": "upload_failure",
+        "latency": summarize([elapsed]),
+        "status": resp.status_code,
+        "leaked_pipeline_threads": len(leaked),
+        "bytes_held": sum(b.in_flight for b in budgets),
+    }
+
+
+def bench_dedup(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """
+    Build a repo with vendored copies, patched copies and generated files and
+    report what the dedup stage kept out of the vector store.
+    """
+    shape = RepoShape(name="bench-dedup", files=300, file_size=4_000, duplicate_ratio=0.2,
+                      near_duplicate_ratio=0.1, generated_ratio=0.05, owner=env.shape.owner)
+    env.github.add_repo(shape)
+    env.reset_counts()
+    before = env.openai.uploaded_bytes()
+    start = time.perf_counter()
+    resp = env.client().post("/api/dynamic_upload_to_vs", json={"repo": {"name": shape.name}})
+    elapsed = time.perf_counter() - start
+    body = resp.get_json() or {}
+    candidates = shape.files + sum(int(shape.files * r) for r in
+                                   (shape.duplicate_ratio, shape.near_duplicate_ratio, shape.generated_ratio)) + 1
+    return {
+        "scenario": "dedup",
+        "latency": summarize([elapsed]),
+        "candidate_files": candidates,
+        "files_uploaded": len(body.get("attached_file_ids", [])),
+        "deduplicated": body.get("deduplicated", {}),
+        "uploaded_bytes": env.openai.uploaded_bytes() - before,
+        "api_calls": env.api_calls(),
+    }
+
+
+def _git_fixture(shape: RepoShape, root: str) -> str:
+    """Commit `shape`'s files to a new repo under `root` and return the path of a bare copy."""
+    work = os.path.join(root, "work", shape.name)
+    for path, body in shape.build().items():
+        full = os.path.join(work, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as fh:
+            fh.write(body)
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run([*git, "init", "-q", work], check=True)
+    subprocess.run([*git, "-C", work, "add", "-A"], check=True)
+    subprocess.run([*git, "-C", work, "commit", "-q", "-m", "fixture"], check=True)
+    bare = os.path.join(root, "mirrors", shape.owner, f"{shape.name}.git")
+    subprocess.run(["git", "clone", "-q", "--bare", work, bare], check=True)
+    return bare
+
+
+def bench_sources(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """
+    Build the same repo from the GitHub API (the fake, with its latency), from
+    a local bare mirror, from a plain checkout without .git and from a shallow
+    clone of that mirror. Everything is offline; the mirror is a fixture repo
+    committed from the repo shape.
+    """
+    import routes
+    from pipeline import stage
+    from tenants import get_tenant
+
+    def ingest(source):
+        """List and read every file through the source alone, as the download stage does."""
+        start = time.perf_counter()
+        with source:
+            files = sum(1 for _ in stage(source.iter_files(), source.read, routes.DOWNLOAD_WORKERS))
+        return files, time.perf_counter() - start
+
+    root = tempfile.mkdtemp(prefix="silo-sources-")
+    variants = []
+    for label in ("github", "mirror", "worktree", "clone"):
+        shape = RepoShape(name=f"bench-src-{label}", files=env.shape.files, depth=env.shape.depth,
+                          fanout=env.shape.fanout, file_size=env.shape.file_size, owner=env.shape.owner)
+        env.github.add_repo(shape)
+        _git_fixture(shape, root)
+        shutil.copytree(os.path.join(root, "work", shape.name), os.path.join(root, "checkouts", shape.owner, shape.name),
+                        ignore=shutil.ignore_patterns(".git"))
+        saved = routes.INGEST_MIRROR_DIR, routes.INGEST_CLONE, routes.GITHUB_CLONE_URL, routes.INGEST_CLONE_DIR
+        routes.INGEST_MIRROR_DIR = {"mirror": os.path.join(root, "mirrors"),
+                                    "worktree": os.path.join(root, "checkouts")}.get(label, "")
+        routes.INGEST_CLONE = label == "clone"
+        routes.GITHUB_CLONE_URL = os.path.join(root, "mirrors")
+        routes.INGEST_CLONE_DIR = os.path.join(root, "clones")
+        env.reset_counts()
+        before = env.openai.uploaded_bytes()
+        try:
+            ingested, ingest_s = ingest(routes.repo_source(get_tenant(), shape.owner, shape.name))
+            env.reset_counts()
+            start = time.perf_counter()
+            resp = env.client().post("/api/dynamic_upload_to_vs", json={"repo": {"name": shape.name}})
+            elapsed = time.perf_counter() - start
+        finally:
+            routes.INGEST_MIRROR_DIR, routes.INGEST_CLONE, routes.GITHUB_CLONE_URL, routes.INGEST_CLONE_DIR = saved
+        body = resp.get_json() or {}
+        calls = env.api_calls()["github"]
+        variants.append({
+            "source": label,
+            "ingest_files": ingested,
+            "ingest_s": round(ingest_s, 3),
+            "build_s": round(elapsed, 3),
+            "files_uploaded": len(body.get("attached_file_ids", [])),
+            "file_errors": len(body.get("errors", [])),
+            "uploaded_bytes": env.openai.uploaded_bytes() - before,
+            "github_requests": sum(calls.values()),
+        })
+    return {"scenario": "sources", "latency": summarize([v["build_s"] for v in variants[1:]]),
+            "variants": variants}
+
+
+def bench_ranking(env: BenchEnvironment, repetitions=10, concurrency=4, budget_share=0.3):
+    """
+    Build a mirrored repo in full and under a token budget of `budget_share`
+    of its estimated tokens, highest-ranked files first.
+    """
+    import routes
+    from ranking import estimate_tokens
+
+    root = tempfile.mkdtemp(prefix="silo-ranking-")
+    variants = []
+    for label in ("unlimited", "budget"):
+        shape = RepoShape(name=f"bench-rank-{label}", files=env.shape.files, depth=env.shape.depth,
+                          fanout=env.shape.fanout, file_size=env.shape.file_size, owner=env.shape.owner)
+        files = shape.build()
+        total = sum(estimate_tokens(p, len(b)) for p, b in files.items() if p.endswith(routes.allowed_extensions))
+        budget = int(total * budget_share) if label == "budget" else 0
+        _git_fixture(shape, root)
+        saved = routes.INGEST_MIRROR_DIR, routes.INGEST_TOKEN_BUDGET
+        routes.INGEST_MIRROR_DIR, routes.INGEST_TOKEN_BUDGET = os.path.join(root, "mirrors"), budget
+        env.reset_counts()
+        before = env.openai.uploaded_bytes()
+        try:
+            start = time.perf_counter()
+            resp = env.client().post("/api/dynamic_upload_to_vs", json={"repo": {"name": shape.name}})
+            elapsed = time.perf_counter() - start
+        finally:
+            routes.INGEST_MIRROR_DIR, routes.INGEST_TOKEN_BUDGET = saved
+        body = resp.get_json() or {}
+        variants.append({
+            "variant": label,
+            "estimated_repo_tokens": total,
+            "build_s": round(elapsed, 3),
+            "files_uploaded": len(body.get("attached_file_ids", [])),
+            "uploaded_bytes": env.openai.uploaded_bytes() - before,
+            "ranking": body.get("ranking"),
+        })
+    return {"scenario": "ranking", "latency": summarize([v["build_s"] for v in variants]), "variants": variants}
+
+
+
+def bench_storage(env: BenchEnvironment, repetitions=200, concurrency=1, manifest_files=5000):
+    """
+    Hot-path build-state operations against a repo with `manifest_files`
+    recorded files, then the same repo built twice under different names:
+    the second build attaches the first one's uploads instead of re-uploading.
+    Warm outlines are recorded, served and purged on the way. Runs against
+    whichever backend STORAGE_BACKEND selects (see --storage).
+    """
+    import routes
+    from checkpoint import BuildManifest
+
+    manifest = BuildManifest.load("bench", "bench-owner", "bench-storage")
+    for i in range(manifest_files):
+        path = f"src/pkg{i % 50}/module_{i}.py"
+        manifest.discovered(path, f"{i:040x}")
+        manifest.uploaded(path, f"file-{i:024d}")
+        manifest.attached(path)
+    manifest.set_resources("vs_bench", "asst_bench")
+    manifest.finish(0)
+    for i in range(3):
+        manifest.record_outline(f"---SECTION_TITLE: Outline {i}\n- point", pushed_at=f"2024-01-0{i + 1}T00:00:00Z")
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            fn()
+        return round((time.perf_counter() - start) / repetitions * 1000, 4)
+
+    def flush_one():
+        manifest.attached("src/pkg1/module_1.py")
+        manifest.flush(force=True)
+
+    operations = {
+        "assistant_lookup_ms": timed(lambda: BuildManifest.load("bench", "bench-owner", "bench-storage").assistant_id),
+        "flush_one_change_ms": timed(flush_one),
+        "take_outline_ms": timed(lambda: BuildManifest.load("bench", "bench-owner", "bench-storage").take_outline()),
+        "find_by_sha_ms": timed(lambda: routes.STORAGE.find_file_id("bench", f"{manifest_files // 2:040x}")),
+    }
+
+    builds = []
+    for name in ("bench-reuse-a", "bench-reuse-b"):
+        shape = RepoShape(name=name, files=env.shape.files, depth=env.shape.depth, fanout=env.shape.fanout,
+                          file_size=env.shape.file_size, owner=env.shape.owner)
+        env.github.add_repo(shape)
+        env.reset_counts()
+        before = env.openai.uploaded_bytes()
+        start = time.perf_counter()
+        body = env.client().post("/api/dynamic_upload_to_vs", json={"repo": {"name": name}}).get_json() or {}
+        builds.append({
+            "repo": name,
+            "build_s": round(time.perf_counter() - start, 3),
+            "files_attached": len(body.get("attached_file_ids", [])),
+            "files_uploaded": env.openai.calls.get("create_file", 0),
+            "uploaded_bytes": env.openai.uploaded_bytes() - before,
+        })
+    # Everything recorded above is served or older than now
+    outlines_purged = routes.STORAGE.purge_outlines("bench", time.time())
+    return {"scenario": "storage", "backend": routes.STORAGE.name, "latency": summarize([b["build_s"] for b in builds]),
+            "manifest_files": manifest_files, "operations": operations, "builds": builds,
+            "outlines_purged": outlines_purged,
+            "outlines_left": routes.STORAGE.take_outline("bench", "bench-owner", "bench-storage") is not None}
+
+
+def _outline_events(client, payload):
+    """POST an outline request; return [(seconds since start, event dict)] for every data frame."""
+    start = time.perf_counter()
+    resp = client.post("/api/dynamic_generate_outline", json=payload, buffered=False)
+    events = []
+    buffer = b""
+    try:
+        for chunk in resp.response:
+            buffer += chunk
+            *frames, buffer = buffer.split(b"\n\n")
+            for frame in frames:
+                for line in frame.split(b"\n"):
+                    if line.startswith(b"data: "):
+                        events.append((time.perf_counter() - start, json.loads(line[6:])))
+    finally:
+        resp.close()
+    return events
+
+
+def bench_sections(env: BenchEnvironment, repetitions=3, concurrency=1, sections=5, section_tokens=60,
+                   tokens_per_second=40.0):
+    """
+    One outline streamed whole vs planned and written section by section.
+    Reports when the first text arrives, when the first section is complete
+    (expansions can start) and when the last one is, at a realistic token rate,
+    and the SSE frames per outline.
+    """
+    outline = "\n".join(
+        f"---SECTION_TITLE: Section {i}\n" + "\n".join(
+            f"- Point {j} about how component {i} is put together" for j in range(section_tokens // 9 + 1))
+        for i in range(1, sections + 1)
+    )
+    client = env.client()
+    repo = {"name": env.shape.name}
+    client.post("/api/dynamic_upload_to_vs", json={"repo": repo})
+    saved = env.openai.stream
+    env.openai.stream = StreamConfig(ttft_ms=saved.ttft_ms, tokens_per_second=tokens_per_second, text=outline)
+    variants = []
+    try:
+        for mode in ("whole", "sections"):
+            payload = {"repo": repo, "fresh": True}
+            if mode == "sections":
+                payload["mode"] = "sections"
+            outputs, firsts, lasts, titles_at = [], [], [], []
+            frames = 0
+            env.reset_counts()
+            for _ in range(repetitions):
+                events = _outline_events(client, payload)
+                frames += len(events)
+                if mode == "sections":
+                    done = [t for t, e in events if "section_done" in e and "text" in e["section_done"]]
+                    titles_at += [t for t, e in events if "outline_titles" in e][:1]
+                    outputs.append(min(t for t, e in events if "section_delta" in e or "section_deltas" in e))
+                    firsts.append(min(done))
+                    lasts.append(max(done))
+                else:
+                    outputs.append(min(t for t, e in events if "content" in e))
+                    text, first = "", None
+                    for t, e in events:
+                        text += e.get("content", "")
+                        # the first section is complete once the second one's header arrives
+                        if first is None and text.count("---SECTION_TITLE:") >= 2:
+                            first = t
+                    firsts.append(first)
+                    lasts.append(events[-1][0])
+            variants.append({
+                "variant": mode,
+                "first_output_s": summarize(outputs),
+                "first_section_s": summarize(firsts),
+                "all_sections_s": summarize(lasts),
+                "titles_s": summarize(titles_at) if titles_at else None,
+                "frames_per_outline": round(frames / repetitions, 1),
+                "runs": env.api_calls()["openai"].get("create_run", 0),
+            })
+    finally:
+        env.openai.stream = saved
+    return {"scenario": "sections", "latency": variants[-1]["all_sections_s"], "variants": variants}
+
+
+def bench_prebuilt(env: BenchEnvironment, repetitions=10, concurrency=4):
+    """
+    The pre-built endpoints on the shared engine: an upload into a fixed
+    vector store, the same upload again (nothing changed, so nothing is
+    sent), then outline streams from the fixed assistant.
+    """
+    import routes
+    from tenants import get_tenant
+
+    client = env.client()
+    repo = {"name": env.shape.name}
+    openai = get_tenant().openai_client()
+    vector_store = openai.beta.vector_stores.create(name="vs_prebuilt")
+    assistant = openai.beta.assistants.create(
+        name="prebuilt", model="gpt-4-turbo", tools=[{"type": "file_search"}],
+        tool_resources={"file_search": {"vector_store_ids": [vector_store.id]}},
+    )
+    saved = routes.PREBUILT_VECTOR_STORE_ID, routes.PREBUILT_ASSISTANT_ID
+    routes.PREBUILT_VECTOR_STORE_ID, routes.PREBUILT_ASSISTANT_ID = vector_store.id, assistant.id
+    try:
+        uploads = []
+        for attempt in ("first", "repeat"):
+            env.reset_counts()
+            start = time.perf_counter()
+            body = client.post("/api/upload_to_vs", json={"repo": repo}).get_json() or {}
+            uploads.append({
+                "attempt": attempt,
+                "wall_s": round(time.perf_counter() - start, 3),
+                "files_attached": len(body.get("attached_file_ids", [])),
+                "errors": len(body.get("errors", [])),
+                "uploads": env.api_calls()["openai"].get("create_file", 0),
+                "assistants_created": env.api_calls()["openai"].get("create_assistant", 0),
+            })
+        result = _bench_stream(env, "prebuilt_generate_outline", "/api/generate_outline",
+                               {"repo": repo}, repetitions, concurrency)
+    finally:
+        routes.PREBUILT_VECTOR_STORE_ID, routes.PREBUILT_ASSISTANT_ID = saved
+    result["uploads"] = uploads
+    return result
+
+
+def bench_retry(env: BenchEnvironment, repetitions=1, concurrency=1, error_rate=0.2, timeout_s=60.0):
+    """
+    A build whose raw downloads fail `error_rate` of the time: its per-file
+    report, then the background retry of only the failed files (with downloads
+    working again), against what rebuilding the whole repo costs.
+    """
+    import routes
+
+    # Another fanout moves the files, so their blobs are not already uploaded by an earlier scenario
+    shape = RepoShape(name=f"{env.shape.name}-retry", files=env.shape.files, depth=env.shape.depth,
+                      fanout=env.shape.fanout + 1, file_size=env.shape.file_size)
+    env.github.add_repo(shape)
+    client = env.client()
+    repo = {"name": shape.name}
+
+    def history():
+        return client.get(f"/api/builds/history?repo={shape.name}").get_json()["jobs"]
+
+    saved = env.github.config, env.github.never_fail, routes.BUILD_RETRY_DELAY_SECONDS
+    env.github.config = FakeConfig(error_rate=error_rate, seed=7)
+    env.github.never_fail = ("list_repos", "contents", "trees")
+    routes.BUILD_RETRY_DELAY_SECONDS = 0.5
+    try:
+        env.reset_counts()
+        start = time.perf_counter()
+        body = client.post("/api/dynamic_upload_to_vs", json={"repo": repo}).get_json()
+        build_s = time.perf_counter() - start
+        first_calls = env.api_calls()
+        env.github.config = saved[0]
+        env.reset_counts()
+        retry_job = None
+        deadline = time.perf_counter() + timeout_s
+        while retry_job is None and time.perf_counter() < deadline:
+            time.sleep(0.1)
+            retry_job = next((j for j in history() if j["finished_at"] and (j["stats"] or {}).get("retry_round")), None)
+        retry_calls = env.api_calls()
+    finally:
+        env.github.config, env.github.never_fail, routes.BUILD_RETRY_DELAY_SECONDS = saved
+    retry_stats = (retry_job or {}).get("stats") or {}
+    return {
+        "scenario": "retry",
+        "latency": summarize([build_s]),
+        "report": body["report"],
+        "retry_scheduled": body["retry_scheduled"],
+        "build_calls": {"raw": first_calls["github"].get("raw", 0),
+                        "contents": first_calls["github"].get("contents", 0),
+                        "create_file": first_calls["openai"].get("create_file", 0)},
+        "retry": {
+            "status": (retry_job or {}).get("status"),
+            "wall_s": retry_stats.get("wall_s"),
+            "files": (retry_stats.get("report") or {}).get("files"),
+            "calls": {"raw": retry_calls["github"].get("raw", 0),
+                      "contents": retry_calls["github"].get("contents", 0),
+                      "create_file": retry_calls["openai"].get("create_file", 0)},
+        },
+    }
+
+
+def _current_rss_kb() -> int:
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def bench_load(env: BenchEnvironment, repetitions=200, concurrency=200, slow_ratio=0.2, read_delay_ms=50.0,
+               ramp_s=1.0):
+    """
+    `repetitions` concurrent SSE clients against the backend served over real
+    sockets (threaded werkzeug server, in process so the stream registry can
+    be sampled). A `slow_ratio` share of clients read with `read_delay_ms`
+    between frames. Faults come from the environment's StreamConfig
+    (--stall-every/--stall-ms/--fail-ratio/--fail-mode). Admission limits
+    are lifted so every client gets a stream.
+
+    Reports stream outcomes (lost = ended cleanly with text missing), latency
+    percentiles, and stream registry buffers and RSS sampled during the run.
+    """
+    from werkzeug.serving import make_server
+    from admission import ADMISSION
+    from bench.load import run_load
+    from streams import STREAMS
+
+    client = env.client()
+    repo = {"name": env.shape.name}
+    client.post("/api/dynamic_upload_to_vs", json={"repo": repo})
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # one access log line per client otherwise
+    server = make_server("127.0.0.1", _free_port(), env.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-server", daemon=True).start()
+    limits = ADMISSION.max_active, ADMISSION.max_per_key, ADMISSION.queue_size
+    ADMISSION.max_active = ADMISSION.max_per_key = ADMISSION.queue_size = repetitions
+    env.reset_counts()
+    gc.collect()
+    rss_before = _current_rss_kb()
+    streams_before = STREAMS.stats()
+
+    def sample():
+        return dict(STREAMS.stats(), rss_kb=_current_rss_kb())
+
+    try:
+        report = run_load(f"http://127.0.0.1:{server.server_port}", repetitions, "/api/dynamic_generate_outline",
+                          {"repo": repo, "fresh": True}, expected_text=env.openai.stream.text,
+                          read_delay=read_delay_ms / 1000.0, slow_ratio=slow_ratio, ramp_s=ramp_s, sample=sample)
+    finally:
+        ADMISSION.max_active, ADMISSION.max_per_key, ADMISSION.queue_size = limits
+        server.shutdown()
+    samples = report.pop("samples")
+    gc.collect()
+    after = STREAMS.stats()
+    return dict(report, **{
+        "scenario": "load",
+        "latency": report["stream_total"],
+        "faults": env.openai.stream.faults(),
+        "slow_ratio": slow_ratio,
+        "read_delay_ms": read_delay_ms,
+        "peak_live_streams": max((s["live"] for s in samples), default=0),
+        "peak_buffered_chars": max((s["buffered_chars"] for s in samples), default=0),
+        "retained_after": {k: after[k] - streams_before[k] for k in ("streams", "buffered_events", "buffered_chars")},
+        "rss_growth_kb": _current_rss_kb() - rss_before,
+        "peak_rss_growth_kb": max((s["rss_kb"] for s in samples), default=rss_before) - rss_before,
+        "api_calls": env.api_calls(),
+    })
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(url: str, proc, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+# Servers compared by the wsgi scenario: the Flask dev server as app.py runs it
+# (and without the shared cache, as before it existed), and gunicorn per gunicorn.conf.py.
+WSGI_SERVERS = {
+    "flask-dev": ([sys.executable, "-c", "import app; app.app.run(host='127.0.0.1', port={port})"],
+                  {"REPO_LIST_CACHE_SECONDS": "0"}),
+    "gunicorn-nocache": ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                         {"REPO_LIST_CACHE_SECONDS": "0"}),
+    "gunicorn": ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], {}),
+}
+
+
+def bench_wsgi(env: BenchEnvironment, repetitions=10, concurrency=4, workers=4):
+    """
+    Request throughput of GET /api/repos over real sockets, per server. Each
+    server gets a fresh shared cache; github_list_calls shows how many
+    listings reached GitHub.
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    requests_per_server = max(repetitions, 50) * 10
+    clients = max(concurrency, 16)
+    servers = []
+    for name, (argv, overrides) in WSGI_SERVERS.items():
+        port = _free_port()
+        child_env = {**os.environ, **overrides, "GUNICORN_BIND": f"127.0.0.1:{port}",
+                     "GUNICORN_WORKERS": str(workers),
+                     "SHARED_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="silo-cache-"), "shared.sqlite3")}
+        proc = subprocess.Popen([arg.format(port=port) for arg in argv], cwd=backend_dir, env=child_env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            _wait_for_server(f"{base}/api/keys", proc)
+            env.reset_counts()
+
+            def fetch():
+                start = time.perf_counter()
+                with urllib.request.urlopen(f"{base}/api/repos", timeout=30) as resp:
+                    resp.read()
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                latencies = list(pool.map(lambda _: fetch(), range(requests_per_server)))
+            wall = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        servers.append({
+            "server": name,
+            "requests": requests_per_server,
+            "clients": clients,
+            "requests_per_s": round(requests_per_server / wall, 1),
+            "latency": summarize(latencies),
+            "github_list_calls": env.api_calls()["github"].get("list_repos", 0),
+        })
+    return {"scenario": "wsgi", "workers": workers, "latency": servers[-1]["latency"], "servers": servers}
+
+
+def bench_rebuild(env: BenchEnvironment, repetitions=1, concurrency=1, change_share=0.1, delete_share=0.1):
+    """
+    Build a repo, push a commit that edits `change_share` and deletes
+    `delete_share` of its files, and build it again into the same vector
+    store. Reports what the rebuild sent and whether the store holds exactly
+    the files the manifest has attached: no superseded or deleted uploads.
+    """
+    shape = RepoShape(name=f"{env.shape.name}-rebuild", files=env.shape.files, depth=env.shape.depth,
+                      fanout=env.shape.fanout + 2, file_size=env.shape.file_size)
+    env.github.add_repo(shape)
+    client = env.client()
+    repo = {"name": shape.name}
+    client.post("/api/dynamic_upload_to_vs", json={"repo": repo})
+    paths = sorted(p for p in env.github.repos[(shape.owner, shape.name)]["files"] if p.endswith(".py"))
+    changed = paths[:int(len(paths) * change_share) or 1]
+    deleted = paths[len(changed):len(changed) + (int(len(paths) * delete_share) or 1)]
+    env.github.push(shape, {**{p: b"# rewritten\n" + p.encode() for p in changed}, **{p: None for p in deleted}},
+                    pushed_at="2026-02-01T00:00:00Z")
+    env.reset_counts()
+    start = time.perf_counter()
+    body = client.post("/api/dynamic_upload_to_vs", json={"repo": repo}).get_json() or {}
+    elapsed = time.perf_counter() - start
+    in_store = set(env.openai.vector_store_files.get(body.get("dynamic_vector_store_id"), []))
+    attached = set(body.get("attached_file_ids", []))
+    calls = env.api_calls()["openai"]
+    return {
+        "scenario": "rebuild",
+        "latency": summarize([elapsed]),
+        "files_changed": len(changed),
+        "files_deleted": len(deleted),
+        "pruned_files": body.get("pruned_files"),
+        "uploads": calls.get("create_file", 0),
+        "detached": calls.get("detach_file", 0),
+        "stale_in_store": len(in_store - attached),
+        "missing_from_store": len(attached - in_store),
+    }
+
+
+SCENARIOS = {
+    "upload": bench_upload,
+    "outline": bench_outline,
+    "expand": bench_expand,
+    "abort": bench_abort,
+    "burst": bench_burst,
+    "framing": bench_framing,
+    "coldstart": bench_coldstart,
+    "wsgi": bench_wsgi,
+    "memory": bench_memory,
+    "upload_failure": bench_upload_failure,
+    "dedup": bench_dedup,
+    "sources": bench_sources,
+    "ranking": bench_ranking,
+    "sections": bench_sections,
+    "storage": bench_storage,
+    "load": bench_load,
+    "prebuilt": bench_prebuilt,
+    "retry": bench_retry,
+    "rebuild": bench_rebuild,
+}
+
+
+def run(scenarios, shape, github_config, openai_config, stream_config, repetitions, concurrency):
+    report = {"repo_shape": vars(shape), "results": []}
+    with BenchEnvironment(shape, github_config, openai_config, stream_config) as env:
+        for name in scenarios:
+            if name == "upload":
+                result = SCENARIOS[name](env)
+            else:
+                result = SCENARIOS[name](env, repetitions, concurrency)
+            report["results"].append(result)
+    report["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regressions where p50/p99 grew by more than `tolerance`."""
+    regressions = []
+    previous = {r["scenario"]: r for r in baseline.get("results", [])}
+    for result in report["results"]:
+        old = previous.get(result["scenario"])
+        if not old:
+            continue
+        for key in ("p50_s", "p99_s"):
+            before, after = old["latency"][key], result["latency"][key]
+            if before and after > before * (1 + tolerance):
+                regressions.append(f"{result['scenario']} {key}: {before} -> {after}")
+    return regressions
+
+
+def load_report(path):
+    with open(path) as fh:
+        return json.load(fh)
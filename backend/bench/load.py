@@ -0,0 +1,187 @@
+"""
+Load driver for the streaming endpoints: opens many concurrent SSE clients
+against a running backend and checks every stream it reads.
+
+    python -m bench.load --url http://127.0.0.1:5001 --clients 300 --repo my-repo
+
+Each client POSTs a generation request, parses the event stream like the
+frontend does and records time to first token, total time, and how the
+stream ended. With --expect-text (what the fake OpenAI streams), a stream
+that ends without an error event must carry exactly that text; anything
+else counts as lost events. The in-process variant with fault injection
+and buffer sampling is the harness's "load" scenario.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+# How a stream ended, per client
+COMPLETE = "complete"        # ended normally with all of its text
+ERROR = "error"              # ended with an error event
+LOST = "lost"                # ended normally but text is missing or wrong: events were dropped
+DISCONNECTED = "disconnected"  # the connection broke before the stream ended
+REJECTED = "rejected"        # non-200 answer (429 from admission control, ...)
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {"n": 0, "p50_s": 0.0, "p90_s": 0.0, "p99_s": 0.0, "max_s": 0.0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"n": len(ordered), "p50_s": pick(0.5), "p90_s": pick(0.9), "p99_s": pick(0.99),
+            "max_s": round(ordered[-1], 4)}
+
+
+def read_stream(base_url: str, path: str, payload: dict, read_delay: float = 0.0, timeout: float = 120.0) -> dict:
+    """
+    One SSE client. `read_delay` seconds of sleep after every frame make it a
+    slow consumer. Returns what it saw: status, text, events, timings and outcome.
+    """
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+    start = time.perf_counter()
+    seen = {"status": None, "text": "", "events": [], "ttft_s": None, "total_s": None,
+            "frames": 0, "keepalives": 0, "outcome": None}
+    try:
+        conn.request("POST", path, body=json.dumps(payload),
+                     headers={"Content-Type": "application/json", "Accept": "text/event-stream"})
+        resp = conn.getresponse()
+        seen["status"] = resp.status
+        if resp.status != 200:
+            resp.read()
+            seen["outcome"] = REJECTED
+            return seen
+        data = []
+        while True:
+            line = resp.readline()
+            if not line:
+                break
+            line = line.decode().rstrip("\r\n")
+            if line.startswith("data: "):
+                data.append(line[6:])
+            elif line.startswith(":"):
+                seen["keepalives"] += 1
+            elif not line and data:
+                event = json.loads("\n".join(data))
+                data = []
+                seen["frames"] += 1
+                if "content" in event:
+                    if seen["ttft_s"] is None:
+                        seen["ttft_s"] = time.perf_counter() - start
+                    seen["text"] += event["content"]
+                else:
+                    seen["events"].append(event)
+                if read_delay:
+                    time.sleep(read_delay)
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        seen["outcome"] = DISCONNECTED
+        seen["events"].append({"client_error": str(e)})
+    finally:
+        seen["total_s"] = time.perf_counter() - start
+        conn.close()
+    return seen
+
+
+def classify(seen: dict, expected_text: str = None) -> str:
+    if seen["outcome"]:
+        return seen["outcome"]
+    if any("error" in e for e in seen["events"]):
+        return ERROR
+    if expected_text is not None and seen["text"].strip() != expected_text.strip():
+        return LOST
+    return COMPLETE
+
+
+def run_load(base_url: str, clients: int, path: str, payload: dict, expected_text: str = None,
+             read_delay: float = 0.0, slow_ratio: float = 0.0, ramp_s: float = 0.0, sample=None,
+             sample_interval: float = 0.1) -> dict:
+    """
+    Open `clients` concurrent streams (started over `ramp_s` seconds); a
+    `slow_ratio` share of them read with `read_delay` between frames. While
+    they run, `sample()` is called every `sample_interval` seconds (e.g. to
+    read the server's stream registry) and the samples are returned too.
+    """
+    results = [None] * clients
+    slow_every = int(round(1 / slow_ratio)) if slow_ratio > 0 else 0
+
+    def client(i):
+        delay = read_delay if slow_every and i % slow_every == 0 else 0.0
+        results[i] = read_stream(base_url, path, payload, delay)
+        results[i]["slow"] = bool(delay)
+
+    samples = []
+    stop = threading.Event()
+
+    def sampler():
+        while not stop.is_set():
+            samples.append(sample())
+            stop.wait(sample_interval)
+
+    if sample is not None:
+        threading.Thread(target=sampler, name="load-sampler", daemon=True).start()
+    start = time.perf_counter()
+    threads = []
+    for i in range(clients):
+        t = threading.Thread(target=client, args=(i,), name=f"load-client-{i}", daemon=True)
+        t.start()
+        threads.append(t)
+        if ramp_s:
+            time.sleep(ramp_s / clients)
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    stop.set()
+
+    outcomes = {}
+    for seen in results:
+        seen["outcome"] = classify(seen, expected_text)
+        outcomes[seen["outcome"]] = outcomes.get(seen["outcome"], 0) + 1
+    served = [s for s in results if s["status"] == 200]
+    return {
+        "clients": clients,
+        "outcomes": outcomes,
+        "statuses": {str(k): sum(1 for s in results if s["status"] == k) for k in {s["status"] for s in results}},
+        "time_to_first_token": _percentiles([s["ttft_s"] for s in served if s["ttft_s"] is not None]),
+        "stream_total": _percentiles([s["total_s"] for s in served]),
+        "slow_stream_total": _percentiles([s["total_s"] for s in served if s["slow"]]),
+        "frames_per_stream": round(statistics.fmean([s["frames"] for s in served]), 1) if served else 0.0,
+        "keepalives": sum(s["keepalives"] for s in results),
+        "wall_s": round(wall, 3),
+        "samples": samples,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="backend base URL, e.g. http://127.0.0.1:5001")
+    parser.add_argument("--repo", required=True, help="repository whose outline the clients request")
+    parser.add_argument("--path", default="/api/dynamic_generate_outline")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--ramp-s", type=float, default=0.0, help="spread client starts over this many seconds")
+    parser.add_argument("--slow-ratio", type=float, default=0.0, help="share of clients that read slowly")
+    parser.add_argument("--read-delay-ms", type=float, default=50.0, help="slow clients' pause after each frame")
+    parser.add_argument("--expect-text", help="file with the exact text every stream should carry")
+    args = parser.parse_args(argv)
+
+    expected = None
+    if args.expect_text:
+        with open(args.expect_text) as fh:
+            expected = fh.read()
+    report = run_load(args.url, args.clients, args.path, {"repo": {"name": args.repo}, "fresh": True},
+                      expected, args.read_delay_ms / 1000.0, args.slow_ratio, args.ramp_s)
+    print(json.dumps(report, indent=2))
+    lost = report["outcomes"].get(LOST, 0)
+    return 1 if lost else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
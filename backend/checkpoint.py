@@ -0,0 +1,446 @@
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; manifest locks are then per process only
+    fcntl = None
+
+from observability import get_logger
+from storage import BUILD_STATE_DIR, STORAGE
+
+log = get_logger("checkpoint")
+
+# Seconds between manifest writes while a build is running; a crash loses at most this much progress
+FLUSH_INTERVAL = float(os.getenv("BUILD_STATE_FLUSH_INTERVAL", "2.0"))
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def manifest_path(tenant_id: str, owner: str, repo: str) -> str:
+    """The repo's JSON manifest as earlier versions wrote it; its lock file sits next to it."""
+    return os.path.join(BUILD_STATE_DIR, _safe(tenant_id), f"{_safe(owner)}__{_safe(repo)}.json")
+
+
+class BuildManifest:
+    """
+    Record of a repo build: the vector store and assistant it uses, and for
+    every discovered file its blob sha, uploaded file id and attach status.
+    A retried build loads the manifest and only redoes the files it has not
+    finished.
+
+    Persisted through STORAGE (storage.py). The repo's fields are loaded
+    eagerly and its files on first use, so lookups such as the assistant id
+    don't read every file row; a flush writes only the files changed since
+    the last one.
+
+    A reused vector store must only hold the repo's current files: uploads
+    superseded by a changed file, and files a full listing no longer finds
+    (see prune_unseen), queue up in "detach_file_ids" until the build has
+    removed them from the store. Files the build leaves out (duplicates,
+    generated code) are dropped the same way and listed in "skipped_files",
+    so the next build can skip an unchanged one without downloading it.
+
+    "generation" counts changes to the set of attached files; a warm outline
+    is only served while the generation it was written at is current.
+    """
+
+    def __init__(self, tenant_id: str, owner: str, repo: str, data: dict, files: dict = None):
+        self.key = (tenant_id, owner, repo)
+        self.data = data
+        self._files = files
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._dirty_paths = set()
+        self._removed_paths = set()
+        self._clear_files = False
+        self._last_flush = 0.0
+        # Paths discovered since start(); None outside a full build
+        self._seen = None
+        # Path -> (sha, reason, original) of the files left out; a list in data (paths aren't Mongo keys)
+        self._skipped = {row[0]: tuple(row[1:]) for row in data.get("skipped_files", [])}
+
+    @classmethod
+    def load(cls, tenant_id: str, owner: str, repo: str) -> "BuildManifest":
+        data = STORAGE.load_repo(tenant_id, owner, repo)
+        if data is not None:
+            return cls(tenant_id, owner, repo, data)
+        manifest = cls._load_legacy(tenant_id, owner, repo)
+        if manifest is not None:
+            return manifest
+        return cls(tenant_id, owner, repo, {
+            "tenant": tenant_id, "owner": owner, "repo": repo, "status": "new",
+            "vector_store_id": None, "assistant_id": None, "stale_file_ids": [], "detach_file_ids": [],
+        }, files={})
+
+    @classmethod
+    def _load_legacy(cls, tenant_id: str, owner: str, repo: str):
+        """Import a JSON manifest written before build state moved to STORAGE."""
+        path = manifest_path(tenant_id, owner, repo)
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable build manifest %s: %s", path, e)
+            return None
+        files = data.pop("files", None) or {}
+        outline = data.pop("outline", None)
+        manifest = cls(tenant_id, owner, repo, data, files)
+        manifest._dirty = True
+        manifest._dirty_paths = set(files)
+        manifest.flush(force=True)
+        if outline:
+            STORAGE.add_outline(tenant_id, owner, repo, outline["text"], data.get("warm_pushed_at"))
+        os.replace(path, f"{path}.imported")
+        log.info("Imported build manifest %s", path)
+        return manifest
+
+    @property
+    def files(self) -> dict:
+        """Path -> {"sha", "file_id", "attached"}, loaded on first use."""
+        with self._lock:
+            if self._files is None:
+                self._files = STORAGE.load_files(*self.key)
+            return self._files
+
+    @property
+    def vector_store_id(self):
+        return self.data.get("vector_store_id")
+
+    @property
+    def assistant_id(self):
+        return self.data.get("assistant_id")
+
+    def set_resources(self, vector_store_id: str = None, assistant_id: str = None) -> None:
+        with self._lock:
+            if vector_store_id:
+                self.data["vector_store_id"] = vector_store_id
+            if assistant_id:
+                self.data["assistant_id"] = assistant_id
+            self._dirty = True
+        self.flush(force=True)
+
+    def reset(self) -> None:
+        """Forget the vector store and per-file progress, e.g. after the store expired."""
+        files = self.files
+        with self._lock:
+            stale = self.data.setdefault("stale_file_ids", [])
+            stale.extend(e["file_id"] for e in files.values() if e.get("file_id"))
+            # Nothing is attached to a store that is gone
+            self.data.update({"status": "new", "vector_store_id": None, "detach_file_ids": []})
+            self._index_changed()
+            self._skipped.clear()
+            self._files = {}
+            self._dirty_paths.clear()
+            self._removed_paths.clear()
+            self._clear_files = True
+            self._dirty = True
+        self.flush(force=True)
+
+    def start(self) -> None:
+        """Begin a full build: every file it discovers is recorded, so prune_unseen can drop the rest."""
+        with self._lock:
+            self.data["status"] = "in_progress"
+            self.data["started_at"] = time.time()
+            self._seen = set()
+            self._dirty = True
+        self.flush(force=True)
+
+    def finish(self, errors: int) -> None:
+        with self._lock:
+            self.data["status"] = "complete" if not errors else "partial"
+            self.data["finished_at"] = time.time()
+            self._dirty = True
+        self.flush(force=True)
+
+    # -- per-file progress ---------------------------------------------------
+
+    def _changed(self, path: str) -> None:
+        self._dirty_paths.add(path)
+        self._dirty = True
+
+    def discovered(self, path: str, sha: str):
+        """
+        Record `path` at blob `sha`. Returns (reason, original) if an earlier
+        build left this same blob out and the original it copies is still
+        tracked, else None.
+        """
+        files = self.files
+        with self._lock:
+            if self._seen is not None:
+                self._seen.add(path)
+            earlier = self._skipped.pop(path, None)
+            if earlier is not None:
+                self._dirty = True
+                sha_then, reason, original = earlier
+                if sha and sha_then == sha and (original is None or original in files):
+                    earlier = reason, original
+                else:
+                    earlier = None
+            entry = files.get(path)
+            if entry and entry.get("sha") == sha:
+                return earlier
+            if entry and entry.get("file_id"):
+                # File changed since it was uploaded; the old copy is now an orphan.
+                self._supersede(entry)
+            files[path] = {"sha": sha, "file_id": None, "attached": False}
+            self._changed(path)
+        self.flush()
+        return earlier
+
+    def skipped(self, path: str, sha: str, reason: str, original: str = None) -> None:
+        """Forget `path`, which the build left out (e.g. a copy of `original`), queueing any upload of it to be detached."""
+        files = self.files
+        with self._lock:
+            entry = files.pop(path, None)
+            if entry and entry.get("file_id"):
+                self._supersede(entry)
+            self._dirty_paths.discard(path)
+            self._removed_paths.add(path)
+            self._skipped[path] = (sha, reason, original)
+            self._dirty = True
+        self.flush()
+
+    def checked_with(self, dedup_settings: str) -> None:
+        """Record the dedup settings every attached file has now been checked against."""
+        with self._lock:
+            self.data["dedup_settings"] = dedup_settings
+            self._dirty = True
+        self.flush(force=True)
+
+    def _supersede(self, entry: dict) -> None:
+        # Caller holds the lock. The reaper deletes the upload; the build detaches it from the store.
+        self.data.setdefault("stale_file_ids", []).append(entry["file_id"])
+        if entry.get("attached"):
+            self.data.setdefault("detach_file_ids", []).append(entry["file_id"])
+            self._index_changed()
+
+    def _index_changed(self) -> None:
+        # Caller holds the lock
+        self.data["generation"] = self.data.get("generation", 0) + 1
+        self._dirty = True
+
+    def prune_unseen(self) -> list:
+        """
+        After a full listing: forget every file this build did not discover
+        (deleted from the repo, or now filtered out), queueing its upload to be
+        detached. Returns the paths dropped.
+        """
+        files = self.files
+        with self._lock:
+            if self._seen is None:
+                return []
+            gone = [path for path in files if path not in self._seen]
+            for path in [p for p in self._skipped if p not in self._seen]:
+                del self._skipped[path]
+                self._dirty = True
+            for path in gone:
+                entry = files.pop(path)
+                if entry.get("file_id"):
+                    self._supersede(entry)
+                self._dirty_paths.discard(path)
+                self._removed_paths.add(path)
+            if gone:
+                self._dirty = True
+        self.flush(force=True)
+        return gone
+
+    def uploaded(self, path: str, file_id: str) -> None:
+        files = self.files
+        with self._lock:
+            files.setdefault(path, {"sha": None, "attached": False})["file_id"] = file_id
+            self._changed(path)
+        self.flush()
+
+    def attached(self, path: str) -> None:
+        files = self.files
+        with self._lock:
+            entry = files.setdefault(path, {"sha": None, "file_id": None})
+            if not entry.get("attached"):
+                entry["attached"] = True
+                self._index_changed()
+            self._changed(path)
+        self.flush()
+
+    def uploaded_file_id(self, path: str, sha: str):
+        """Return the file id uploaded for this exact blob in a previous attempt, if any."""
+        files = self.files
+        with self._lock:
+            entry = files.get(path)
+            if entry and entry.get("sha") == sha:
+                return entry.get("file_id")
+        return None
+
+    def is_attached(self, path: str, sha: str) -> bool:
+        files = self.files
+        with self._lock:
+            entry = files.get(path)
+            return bool(entry and entry.get("sha") == sha and entry.get("attached"))
+
+    def drop_stale_file_ids(self, deleted: set) -> None:
+        """Forget superseded file ids once the reaper has deleted them."""
+        with self._lock:
+            stale = self.data.get("stale_file_ids", [])
+            remaining = [i for i in stale if i not in deleted]
+            if len(remaining) == len(stale):
+                return
+            self.data["stale_file_ids"] = remaining
+            self._dirty = True
+        self.flush(force=True)
+
+    def pending_detach(self) -> list:
+        """Superseded uploads still to be removed from the vector store."""
+        with self._lock:
+            return list(self.data.get("detach_file_ids", []))
+
+    def detached(self, file_ids) -> None:
+        """Forget pending detaches that are done (or turned out to be still in use)."""
+        done = set(file_ids)
+        with self._lock:
+            pending = self.data.get("detach_file_ids", [])
+            remaining = [i for i in pending if i not in done]
+            if len(remaining) == len(pending):
+                return
+            self.data["detach_file_ids"] = remaining
+            self._dirty = True
+        self.flush(force=True)
+
+    def attached_file_ids(self) -> list:
+        files = self.files
+        with self._lock:
+            return [e["file_id"] for e in files.values() if e.get("attached") and e.get("file_id")]
+
+    # -- pre-generated outline ----------------------------------------------
+
+    @property
+    def warm_pushed_at(self):
+        """The repo's pushed_at when the warm-up last built it and generated an outline."""
+        return self.data.get("warm_pushed_at")
+
+    def record_outline(self, text: str, pushed_at: str = None) -> None:
+        STORAGE.add_outline(*self.key, text, pushed_at)
+        with self._lock:
+            self.data["warm_pushed_at"] = pushed_at
+            self.data["warm_generation"] = self.data.get("generation", 0)
+            self._dirty = True
+        self.flush(force=True)
+
+    def take_outline(self):
+        """
+        Return the pre-generated outline and forget it, so it is served once;
+        None if there is none, or if files were attached or detached since it
+        was written (it is dropped then: a newer push has been built).
+        """
+        text = STORAGE.take_outline(*self.key)
+        if text is not None and self.data.get("warm_generation") != self.data.get("generation", 0):
+            log.info("Dropping the warm outline of %s/%s/%s: the repo was built again since", *self.key)
+            return None
+        return text
+
+    # -- persistence ---------------------------------------------------------
+
+    def flush(self, force: bool = False) -> None:
+        """Write the changes if dirty and FLUSH_INTERVAL has passed (or `force`)."""
+        with self._lock:
+            now = time.monotonic()
+            if not self._dirty or (not force and now - self._last_flush < FLUSH_INTERVAL):
+                return
+            self.data["updated_at"] = time.time()
+            self.data["skipped_files"] = [[path, *skip] for path, skip in self._skipped.items()]
+            files = self._files or {}
+            changed = {path: dict(files[path]) for path in self._dirty_paths if path in files}
+            STORAGE.save_manifest(*self.key, dict(self.data), changed, clear_files=self._clear_files,
+                                  removed=self._removed_paths)
+            self._dirty = False
+            self._dirty_paths = set()
+            self._removed_paths = set()
+            self._clear_files = False
+            self._last_flush = now
+
+
+class ManifestLock:
+    """
+    Exclusive lock on one repo's manifest across threads and processes: a
+    thread lock plus an flock on a sidecar file, so two gunicorn workers on a
+    host can't build (and write the manifest of) the same repo at once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fh = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fh = open(self.path, "a")
+        except OSError:
+            self._thread_lock.release()
+            raise
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BaseException as e:
+            fh.close()
+            self._thread_lock.release()
+            if isinstance(e, BlockingIOError):
+                return False
+            raise
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_manifest_locks = {}
+_manifest_locks_guard = threading.Lock()
+
+
+def manifest_lock(tenant_id: str, owner: str, repo: str) -> ManifestLock:
+    """The (shared) lock for one repo's manifest."""
+    with _manifest_locks_guard:
+        key = (tenant_id, owner, repo)
+        if key not in _manifest_locks:
+            _manifest_locks[key] = ManifestLock(manifest_path(tenant_id, owner, repo) + ".lock")
+        return _manifest_locks[key]
+
+
+def _reset_locks_after_fork():
+    # A forked worker must not keep the parent's flock alive through its copy of
+    # the file descriptor; close it without unlocking so the parent still owns it.
+    global _manifest_locks, _manifest_locks_guard
+    for lock in _manifest_locks.values():
+        if lock._fh is not None:
+            lock._fh.close()
+    _manifest_locks = {}
+    _manifest_locks_guard = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def list_manifests(tenant_id: str) -> list:
+    """Load every manifest belonging to one tenant (files are read when first used)."""
+    return [BuildManifest(tenant_id, data["owner"], data["repo"], data) for data in STORAGE.list_repos(tenant_id)]
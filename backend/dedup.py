@@ -0,0 +1,236 @@
+import hashlib
+import os
+import re
+import threading
+
+from observability import Counter, get_logger, register
+
+log = get_logger("dedup")
+
+# Skip files whose content was already seen in this build (same git blob sha or content hash)
+DEDUP_EXACT = os.getenv("DEDUP_EXACT", "1").lower() in ("1", "true", "yes")
+# Largest SimHash Hamming distance (of 64 bits) at which two files count as near duplicates; 0 turns it off.
+# At 6 a 300-line file with a handful of edited lines matches; unrelated source files sit 16+ apart.
+DEDUP_NEAR_DISTANCE = int(os.getenv("DEDUP_NEAR_DISTANCE", "6"))
+# Files smaller than this aren't compared for near duplicates: short files share too many shingles by chance
+DEDUP_NEAR_MIN_BYTES = int(os.getenv("DEDUP_NEAR_MIN_BYTES", "1024"))
+# Skip generated files (codegen headers, protobuf output, minified bundles)
+DEDUP_GENERATED = os.getenv("DEDUP_GENERATED", "1").lower() in ("1", "true", "yes")
+
+DEDUP_SKIPPED = register(Counter(
+    "silo_dedup_skipped_total",
+    "Files not uploaded because they duplicate another file or are generated, by reason.",
+))
+DEDUP_SKIPPED_BYTES = register(Counter(
+    "silo_dedup_skipped_bytes_total",
+    "Bytes not uploaded because of deduplication, by reason.",
+))
+
+DUPLICATE = "duplicate"
+NEAR_DUPLICATE = "near_duplicate"
+GENERATED = "generated"
+
+###############################################################################
+# Generated files
+###############################################################################
+
+generated_name_patterns = [
+    re.compile(r"\.min\.(js|css)$", re.IGNORECASE),
+    re.compile(r"[._-]bundle\.js$", re.IGNORECASE),
+    re.compile(r"_pb2(_grpc)?\.py$"),
+    re.compile(r"\.pb\.(cc|h|go)$"),
+    re.compile(r"\.generated\.\w+$", re.IGNORECASE),
+    re.compile(r"(^|/)generated/", re.IGNORECASE),
+]
+
+# Looked for in the comment block a file starts with (a generator's banner), never in its body or prose
+generated_header_patterns = [
+    re.compile(rb"@generated\b"),
+    re.compile(rb"\bDO NOT EDIT\b", re.IGNORECASE),
+    re.compile(rb"\bauto-?generated\b", re.IGNORECASE),
+    re.compile(rb"\bCode generated by\b"),
+    re.compile(rb"\bGenerated by (the )?protoc", re.IGNORECASE),
+]
+GENERATED_HEADER_LINES = 10
+COMMENT_PREFIXES = (b"#", b"//", b"/*", b"*", b"<!--", b"--", b";", b"%")
+
+# Minified: long enough to matter and lines far longer than anyone writes by hand. Only
+# checked for web assets; prose (.tex, .md) and data (.csv) legitimately have long lines.
+MINIFIED_EXTENSIONS = (".js", ".css", ".map")
+MINIFIED_MIN_BYTES = 2048
+MINIFIED_AVG_LINE = 300
+
+
+def leading_comments(content: bytes, max_lines: int = GENERATED_HEADER_LINES) -> list:
+    """The comment lines a file opens with (after blank lines and a shebang), up to `max_lines` lines in."""
+    comments = []
+    for line in content.split(b"\n", max_lines)[:max_lines]:
+        line = line.strip()
+        if not line or (line.startswith(b"#!") and not comments):
+            continue
+        if not line.startswith(COMMENT_PREFIXES):
+            break
+        comments.append(line)
+    return comments
+
+
+def is_generated(path: str, content: bytes) -> bool:
+    """True if `path`/`content` look machine-generated rather than written by hand."""
+    if any(p.search(path) for p in generated_name_patterns):
+        return True
+    for line in leading_comments(content):
+        if any(p.search(line) for p in generated_header_patterns):
+            return True
+    if (path.lower().endswith(MINIFIED_EXTENSIONS) and len(content) >= MINIFIED_MIN_BYTES
+            and len(content) / (content.count(b"\n") + 1) > MINIFIED_AVG_LINE):
+        return True
+    return False
+
+###############################################################################
+# SimHash
+###############################################################################
+
+_TOKEN = re.compile(r"\w+")
+SHINGLE = 3
+# Bits per counter when summing hashes lane-wise (room for 16M shingles)
+_LANE = 24
+_LANE_MASK = (1 << _LANE) - 1
+# _SPREAD[k][b]: byte b of a hash at position k, one bit per lane
+_SPREAD = [
+    [sum(((b >> j) & 1) << ((8 * k + j) * _LANE) for j in range(8)) for b in range(256)]
+    for k in range(8)
+]
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash over word 3-shingles. Files that differ in a few lines
+    hash to values a few bits apart. Bits are counted in 64 lanes of one big
+    integer, eight table lookups per shingle instead of 64 bit tests.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    shingles = [" ".join(tokens[i:i + SHINGLE]) for i in range(max(1, len(tokens) - SHINGLE + 1))]
+    total = 0
+    for shingle in shingles:
+        digest = hashlib.blake2b(shingle.encode(), digest_size=8).digest()
+        for k, byte in enumerate(digest):
+            total += _SPREAD[k][byte]
+    n = len(shingles)
+    return sum(1 << i for i in range(64) if ((total >> (i * _LANE)) & _LANE_MASK) * 2 > n)
+
+
+class NearDuplicateIndex:
+    """
+    SimHashes split into `distance + 1` bands. Two hashes within `distance`
+    bits of each other agree exactly on at least one band, so only entries
+    sharing a band are compared.
+    """
+
+    def __init__(self, distance: int = DEDUP_NEAR_DISTANCE):
+        self.distance = distance
+        self.bands = distance + 1
+        self._width = 64 // self.bands
+        self._bands = {}
+
+    def _keys(self, value: int):
+        mask = (1 << self._width) - 1
+        # the last band takes the leftover high bits
+        return [(i, (value >> (i * self._width)) & (mask if i < self.bands - 1 else ~0))
+                for i in range(self.bands)]
+
+    def match(self, value: int):
+        """The first indexed (value, path) within `distance` bits of `value`, or None."""
+        for key in self._keys(value):
+            for other, path in self._bands.get(key, ()):
+                if (value ^ other).bit_count() <= self.distance:
+                    return other, path
+        return None
+
+    def add(self, value: int, path: str) -> None:
+        for key in self._keys(value):
+            self._bands.setdefault(key, []).append((value, path))
+
+###############################################################################
+# Per-build deduplicator
+###############################################################################
+
+
+class Deduplicator:
+    """
+    Decides, for one build, which files are worth uploading. The first copy
+    of any content wins; later exact copies, near copies and generated files
+    are skipped. Shared by all download workers of the build.
+
+    `claim(path, sha)` works from the listing alone (git blob shas are
+    content hashes), so exact duplicates are skipped before being
+    downloaded. `check(path, content)` needs the body.
+    """
+
+    def __init__(self, exact: bool = DEDUP_EXACT, near_distance: int = DEDUP_NEAR_DISTANCE,
+                 near_min_bytes: int = DEDUP_NEAR_MIN_BYTES, generated: bool = DEDUP_GENERATED):
+        self.exact = exact
+        self.near_min_bytes = near_min_bytes
+        self.generated = generated
+        self.near = NearDuplicateIndex(near_distance) if near_distance > 0 else None
+        self.skipped = {}           # reason -> count
+        self.originals = {}         # skipped path -> the path it copies
+        self._seen = {}             # blob sha or content hash -> first path
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> str:
+        """What this deduplicator skips, to tell whether files checked by an earlier build need checking again."""
+        near = f"{self.near.distance}/{self.near_min_bytes}" if self.near is not None else "off"
+        return f"exact={int(self.exact)},near={near},generated={int(self.generated)}"
+
+    @property
+    def checks_content(self) -> bool:
+        """Whether `check` can skip a file `claim` let through (its content must be read to know)."""
+        return self.generated or self.near is not None
+
+    def _skip(self, reason: str, path: str, size: int, original: str = None) -> str:
+        with self._lock:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+            if original:
+                self.originals[path] = original
+        DEDUP_SKIPPED.inc(reason=reason)
+        DEDUP_SKIPPED_BYTES.inc(size, reason=reason)
+        if original:
+            log.debug("Skipping %s (%s of %s)", path, reason, original)
+        else:
+            log.debug("Skipping %s (%s)", path, reason)
+        return reason
+
+    def repeat(self, reason: str, path: str, size: int = 0, original: str = None) -> str:
+        """Skip `path` again for the `reason` an earlier build found, without reading it."""
+        return self._skip(reason, path, size, original)
+
+    def claim(self, path: str, sha: str, size: int = 0):
+        """Record `path` as the holder of blob `sha`; DUPLICATE if another path got there first."""
+        if not self.exact or not sha:
+            return None
+        with self._lock:
+            original = self._seen.setdefault(sha, path)
+        if original != path:
+            return self._skip(DUPLICATE, path, size, original)
+        return None
+
+    def check(self, path: str, content: bytes):
+        """Why `content` should not be uploaded (DUPLICATE, NEAR_DUPLICATE, GENERATED), or None."""
+        if self.generated and is_generated(path, content):
+            return self._skip(GENERATED, path, len(content))
+        if self.exact:
+            digest = hashlib.sha1(content).hexdigest()
+            with self._lock:
+                original = self._seen.setdefault(digest, path)
+            if original != path:
+                return self._skip(DUPLICATE, path, len(content), original)
+        if self.near is not None and len(content) >= self.near_min_bytes:
+            value = simhash(content.decode("utf-8", errors="replace"))
+            with self._lock:
+                found = self.near.match(value)
+                if found is None:
+                    self.near.add(value, path)
+            if found is not None:
+                return self._skip(NEAR_DUPLICATE, path, len(content), found[1])
+        return None
@@ -0,0 +1,53 @@
+"""
+Production server configuration: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+The app is imported once in the master (preload_app) and forked into the
+workers, so the tenant registry, compiled path filters and lazily imported
+client libraries are shared copy-on-write instead of loaded per worker.
+Modules holding locks, threads or connection pools reset them in each
+worker via os.register_at_fork. Repo listings and assistant lookups go
+through the SQLite-backed shared cache (sharedcache.py), so one worker's
+GitHub call serves them all.
+
+gthread workers suit this app: requests mostly wait on GitHub and OpenAI,
+and a streaming generation holds its thread for the whole run.
+
+Per-process state to keep in mind when running more than one worker:
+- Generation streams live in the worker that started them, so a resume
+  (GET /api/streams/<id>) needs sticky routing, e.g. by client IP.
+- Admission limits and /api/metrics counters are per worker.
+- The background reaper, warm-up and cache purge loops run in one worker,
+  started from post_fork: whichever takes the lock file in BUILD_STATE_DIR
+  first. Not in the master, which never sees a request: the warm-up waits
+  for the service to be idle, judged from every worker's load reports in
+  the shared cache.
+"""
+import multiprocessing
+import os
+
+# Address to listen on
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5001')}")
+# Worker processes; defaults to one per core, capped so a large host doesn't fan out OpenAI clients
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count(), 8))))
+# Threads per worker; each open event stream holds one
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_class = "gthread"
+preload_app = True
+# Seconds a worker may stay silent before it is restarted; builds run on background threads
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers after this many requests (with jitter); 0 never recycles
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Read by routes.register_routes when the app is preloaded here in the master
+os.environ["BACKGROUND_TASKS_IN_WORKERS"] = "1"
+
+
+def post_fork(server, worker):
+    from routes import start_background_tasks
+    start_background_tasks()
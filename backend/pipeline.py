@@ -0,0 +1,280 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class FileRecord:
+    """
+    One file found while crawling a repo: just the fields the build needs.
+    GitHub's contents items carry a dozen URLs each; for a 50k-file repo
+    keeping those dicts around costs far more than the files' metadata.
+    """
+
+    __slots__ = ("path", "size", "sha", "download_url")
+
+    def __init__(self, path: str, size: int = 0, sha: str = None, download_url: str = None):
+        self.path = path
+        self.size = size
+        self.sha = sha
+        self.download_url = download_url
+
+    @classmethod
+    def from_item(cls, item: dict) -> "FileRecord":
+        """From a GitHub contents API item."""
+        return cls(item.get("path", ""), item.get("size") or 0, item.get("sha"), item.get("download_url"))
+
+    def __repr__(self):
+        return f"FileRecord({self.path!r}, size={self.size})"
+
+
+class BudgetClosed(RuntimeError):
+    """Raised by ByteBudget.acquire once the budget is closed: the build is over."""
+
+
+class ByteBudget:
+    """
+    Caps the bytes of file content held at once across pipeline workers.
+    `acquire(n)` blocks until `n` more bytes fit under `limit`; a single item
+    larger than the limit is let through alone, so nothing waits forever.
+    A limit of 0 disables the cap. `close()` ends the build's use of it:
+    waiting workers wake up with BudgetClosed instead of waiting for bytes
+    that will never be released.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int) -> None:
+        with self._cond:
+            if self.limit > 0:
+                self._cond.wait_for(lambda: self._closed or not self.in_flight or self.in_flight + n <= self.limit)
+            if self._closed:
+                raise BudgetClosed("byte budget closed")
+            self.in_flight += n
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.in_flight -= n
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# How a file's trip through a build ended
+ATTACHED = "attached"      # uploaded (or reused) and attached to the vector store
+UNCHANGED = "unchanged"    # attached by an earlier build, nothing to do
+SKIPPED = "skipped"        # duplicate, empty or binary: nothing worth uploading
+FAILED = "failed"
+
+
+class FileResult:
+    """
+    What happened to one file in a build: its outcome, the stage it failed
+    in, upload attempts, bytes uploaded and seconds spent per stage.
+    """
+
+    __slots__ = ("record", "status", "stage", "error", "attempts", "bytes_uploaded", "seconds")
+
+    def __init__(self, record: FileRecord, status: str = None):
+        self.record = record
+        self.status = status
+        self.stage = None
+        self.error = None
+        self.attempts = 0
+        self.bytes_uploaded = 0
+        self.seconds = {}
+
+    def timed(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def failed(self, stage: str, error: str) -> "FileResult":
+        self.status, self.stage, self.error = FAILED, stage, error
+        return self
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.record.path,
+            "bytes": self.record.size,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "attempts": self.attempts,
+            "seconds": {stage: round(s, 4) for stage, s in self.seconds.items()},
+        }
+
+
+class BuildReport:
+    """
+    Collects a build's FileResults and the time spent per stage. Stages run
+    concurrently, so each one's share of the build is reported as utilization:
+    busy seconds over (workers x wall time). The most utilized stage is the
+    one holding the build back.
+    """
+
+    def __init__(self, workers: dict):
+        self.workers = dict(workers)   # stage -> worker threads
+        self.results = []
+        self._busy = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def add(self, result: FileResult) -> None:
+        with self._lock:
+            self.results.append(result)
+            for stage, seconds in result.seconds.items():
+                self._busy.setdefault(stage, []).append(seconds)
+
+    def timed(self, stage: str, seconds: float) -> None:
+        """Time spent outside any one file, e.g. creating the vector store."""
+        with self._lock:
+            self._busy.setdefault(stage, []).append(seconds)
+
+    def timed_iter(self, stage: str, iterable):
+        """Yield from `iterable`, counting the time spent waiting on it (a lazy crawl) under `stage`."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.timed(stage, time.perf_counter() - started)
+                return
+            self.timed(stage, time.perf_counter() - started)
+            yield item
+
+    def failed(self) -> list:
+        with self._lock:
+            return [r for r in self.results if r.status == FAILED]
+
+    def summary(self, failed_limit: int = 50) -> dict:
+        wall = time.perf_counter() - self._started
+        with self._lock:
+            results = list(self.results)
+            busy = {stage: list(times) for stage, times in self._busy.items()}
+        counts = {}
+        for r in results:
+            counts[r.status] = counts.get(r.status, 0) + 1
+        stages = {}
+        for stage, times in busy.items():
+            ordered = sorted(times)
+            total = sum(ordered)
+            workers = self.workers.get(stage, 1)
+            stages[stage] = {
+                "count": len(ordered),
+                "busy_s": round(total, 3),
+                "p50_s": round(ordered[len(ordered) // 2], 4),
+                "max_s": round(ordered[-1], 4),
+                "workers": workers,
+                "utilization": round(total / (workers * wall), 3) if wall > 0 else 0.0,
+            }
+        failed = [r for r in results if r.status == FAILED]
+        return {
+            "wall_s": round(wall, 3),
+            "files": counts,
+            "bytes_uploaded": sum(r.bytes_uploaded for r in results),
+            "upload_attempts": sum(r.attempts for r in results),
+            "stages": stages,
+            "bottleneck": max(stages, key=lambda s: stages[s]["utilization"]) if stages else None,
+            "failed_files": [r.as_dict() for r in failed[:failed_limit]],
+        }
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def stage(source, fn, workers: int, buffer: int = None, stop: threading.Event = None, discard=None):
+    """
+    Apply `fn` to every item of `source` on `workers` threads and yield the results
+    in completion order.
+
+    Workers pull from `source` lazily, so a generator upstream keeps producing while
+    this stage works. The output queue holds at most `buffer` results; when the
+    consumer falls behind, workers block instead of piling up work in memory.
+    Results of None are dropped so `fn` can filter.
+
+    The stage winds down when `stop` is set or the consumer stops early (which sets
+    it): workers take no more items and results nobody will get are passed to
+    `discard`, e.g. to give back what they hold. Share one `stop` across chained
+    stages so a failure downstream also ends the stages feeding it.
+    """
+    workers = max(1, workers)
+    out = queue.Queue(maxsize=buffer or workers * 2)
+    source = iter(source)
+    source_lock = threading.Lock()
+    stop = stop or threading.Event()
+
+    def discard_queued():
+        while True:
+            try:
+                item = out.get_nowait()
+            except queue.Empty:
+                return
+            if discard is not None and item is not _DONE and not isinstance(item, _Failure):
+                discard(item)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work():
+        try:
+            while not stop.is_set():
+                with source_lock:
+                    try:
+                        item = next(source)
+                    except StopIteration:
+                        break
+                result = fn(item)
+                if result is not None and not put(result):
+                    if discard is not None:
+                        discard(result)
+                    return
+        except BaseException as exc:
+            put(_Failure(exc))
+        finally:
+            put(_DONE)
+            if stop.is_set():
+                # Whatever this worker queued after the consumer's last look
+                discard_queued()
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    finished = False
+    try:
+        remaining = workers
+        while remaining:
+            try:
+                item = out.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, _Failure):
+                raise item.exc
+            else:
+                yield item
+        finished = True
+    finally:
+        if not finished:
+            stop.set()
+        discard_queued()
@@ -0,0 +1,168 @@
+import math
+import os
+import re
+import time
+
+from observability import Counter, get_logger, register, span
+
+log = get_logger("ranking")
+
+# Estimated tokens uploaded per repo build, highest-ranked files first; 0 uploads everything unranked
+INGEST_TOKEN_BUDGET = int(os.getenv("INGEST_TOKEN_BUDGET", "0"))
+
+RANKING_DROPPED = register(Counter(
+    "silo_ranking_dropped_total",
+    "Files left out of a build because they did not fit its token budget.",
+))
+
+###############################################################################
+# Token estimate
+###############################################################################
+
+# Characters per token for the OpenAI BPE tokenizers: code splits into more,
+# shorter tokens than prose. Rules of thumb, not exact counts; a budget is a
+# cost bound, so being off by 10-20% either way is fine.
+CHARS_PER_TOKEN = {
+    ".md": 4.2, ".markdown": 4.2, ".txt": 4.2, ".tex": 3.8, ".html": 3.0,
+    ".csv": 2.8, ".css": 3.0, ".json": 3.0,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(path: str, size: int) -> int:
+    """Rough token count of a file from its size alone, so files can be budgeted before they are fetched."""
+    ratio = CHARS_PER_TOKEN.get(os.path.splitext(path)[1].lower(), DEFAULT_CHARS_PER_TOKEN)
+    return max(1, math.ceil(size / ratio))
+
+###############################################################################
+# Scoring
+###############################################################################
+
+ENTRY_POINT_STEMS = {
+    "main", "app", "index", "server", "cli", "manage", "setup", "wsgi", "asgi", "routes", "api",
+    "__main__", "program", "application",
+}
+# Stylesheets, data and markup named app.* or index.* are not entry points
+NON_CODE_EXTENSIONS = (".css", ".csv", ".html", ".md", ".markdown", ".txt", ".tex", ".json")
+
+# Files this large are rarely read whole by retrieval; the score falls off beyond it
+LARGE_FILE_TOKENS = 12_000
+
+# Imports that name another module of the repo, as dotted names (Python, Java)...
+_DOTTED_IMPORT = re.compile(rb"^\s*(?:from\s+([\w.]+)\s+import|import\s+(?:static\s+)?([\w.]+))", re.MULTILINE)
+# ...or as paths (JS/TS, C/C++, PHP)
+_PATH_IMPORTS = [
+    re.compile(rb"""(?:from\s+|require\(\s*|import\s+)['"]([^'"]+)['"]"""),
+    re.compile(rb'^\s*#include\s+"([^"]+)"', re.MULTILINE),
+    re.compile(rb"""^\s*(?:require|include)(?:_once)?\s*\(?\s*['"]([^'"]+)['"]""", re.MULTILINE),
+]
+
+
+def imported_modules(content: bytes) -> set:
+    """Module names a file imports, reduced to the last component: `pkg.util`, `./util.js` and `util.h` give `util`."""
+    keys = set()
+    for match in _DOTTED_IMPORT.finditer(content):
+        name = (match.group(1) or match.group(2)).decode()
+        keys.add(name.rsplit(".", 1)[-1].lower())
+    for pattern in _PATH_IMPORTS:
+        for match in pattern.finditer(content):
+            name = match.group(1).decode("utf-8", errors="replace").rstrip("/")
+            keys.add(os.path.splitext(name.rsplit("/", 1)[-1])[0].lower())
+    return keys
+
+
+def import_in_degree(records, read) -> dict:
+    """
+    How many other files import each file, matching imports to files by
+    module name. `read(record)` returns the content (or None).
+    """
+    by_key = {}
+    for record in records:
+        stem = os.path.splitext(os.path.basename(record.path))[0].lower()
+        if stem == "__init__":
+            stem = os.path.basename(os.path.dirname(record.path)).lower()
+        by_key.setdefault(stem, []).append(record.path)
+    degree = {}
+    for record in records:
+        content = read(record)
+        if not content:
+            continue
+        for key in imported_modules(content):
+            for path in by_key.get(key, ()):
+                if path != record.path:
+                    degree[path] = degree.get(path, 0) + 1
+    return degree
+
+
+def score(record, in_degree: int = 0, changed_at: float = None, now: float = None) -> float:
+    """Higher is more worth indexing."""
+    path = record.path
+    name = os.path.basename(path).lower()
+    stem = os.path.splitext(name)[0]
+    depth = path.count("/")
+    value = 1.0
+    if stem == "readme":
+        value += 3.0 if depth == 0 else 1.0
+    elif stem in ENTRY_POINT_STEMS and not name.endswith(NON_CODE_EXTENSIONS):
+        value += 2.0
+    value -= 0.25 * depth
+    value += math.log1p(in_degree)
+    tokens = estimate_tokens(path, record.size)
+    if tokens < 50:
+        value -= 0.5
+    elif tokens > LARGE_FILE_TOKENS:
+        value -= math.log2(tokens / LARGE_FILE_TOKENS)
+    if changed_at:
+        age_days = max(0.0, ((now or time.time()) - changed_at) / 86400)
+        value += math.exp(-age_days / 90)
+    return value
+
+
+def rank(records, read=None, recency=None) -> list:
+    """
+    Order `records` best first. Import centrality needs every file's content
+    and is only computed when `read` is given (cheap for local sources);
+    `recency` maps paths to the time they last changed.
+    """
+    records = list(records)
+    with span("rank"):
+        degree = import_in_degree(records, read) if read else {}
+        recency = recency or {}
+        now = time.time()
+        scored = [(score(r, degree.get(r.path, 0), recency.get(r.path), now), r) for r in records]
+        scored.sort(key=lambda item: (-item[0], item[1].path))
+    return [r for _, r in scored]
+
+
+def prioritize(source, budget: int):
+    """
+    List every file from `source`, rank them and keep what fits `budget`.
+    Local sources also contribute import centrality and recent changes.
+    Returns (records, summary).
+    """
+    records = list(source.iter_files())
+    read = (lambda record: source.read(record)[1]) if source.cheap_reads else None
+    selected, summary = within_budget(rank(records, read, source.recency()), budget)
+    log.info("Token budget %d: %d of %d files selected (~%d tokens)",
+             budget, summary["files_selected"], len(records), summary["estimated_tokens"])
+    return selected, summary
+
+
+def within_budget(ranked, budget: int):
+    """
+    Take files in rank order while their estimated tokens fit the budget;
+    a file that doesn't fit is skipped and smaller ones after it may still
+    go in. Returns (selected, summary).
+    """
+    selected, used, dropped = [], 0, 0
+    for record in ranked:
+        tokens = estimate_tokens(record.path, record.size)
+        if used + tokens > budget:
+            dropped += 1
+            continue
+        used += tokens
+        selected.append(record)
+    if dropped:
+        RANKING_DROPPED.inc(dropped)
+    return selected, {"token_budget": budget, "estimated_tokens": used,
+                      "files_selected": len(selected), "files_dropped": dropped}
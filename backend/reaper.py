@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+
+from checkpoint import list_manifests
+from observability import Counter, get_logger, register, span
+from storage import STORAGE
+
+log = get_logger("reaper")
+
+# Metadata key stamped on every vector store and assistant a dynamic build creates
+MANAGED_METADATA_KEY = "silo_build"
+# Instructions used by dynamic assistants created before they carried metadata
+LEGACY_ASSISTANT_INSTRUCTIONS = "You are an assistant that helps analyze code repositories and generate project outlines."
+
+# Seconds between background sweeps; 0 leaves the reaper to the /api/reaper/run endpoint
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL_SECONDS", "0"))
+# Never touch anything younger than this, so in-flight builds whose ids haven't been checkpointed survive
+REAPER_GRACE_SECONDS = float(os.getenv("REAPER_GRACE_SECONDS", "3600"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "20"))
+# Deletes per second across all resource kinds
+REAPER_RATE = float(os.getenv("REAPER_RATE", "5"))
+# Unserved warm outlines older than this are dropped with the served ones; a repo changed since has a newer one
+REAPER_OUTLINE_MAX_AGE_SECONDS = float(os.getenv("REAPER_OUTLINE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+RECLAIMED = register(Counter(
+    "silo_reaper_reclaimed_total",
+    "Remote resources deleted by the reaper, by kind.",
+))
+
+
+def _is_managed_vector_store(vs) -> bool:
+    metadata = getattr(vs, "metadata", None) or {}
+    if MANAGED_METADATA_KEY in metadata:
+        return True
+    expires = getattr(vs, "expires_after", None)
+    return bool((vs.name or "").startswith("vs_") and expires and getattr(expires, "days", None) == 1)
+
+
+def _is_managed_assistant(assistant) -> bool:
+    metadata = getattr(assistant, "metadata", None) or {}
+    return MANAGED_METADATA_KEY in metadata or assistant.instructions == LEGACY_ASSISTANT_INSTRUCTIONS
+
+
+class Reaper:
+    """
+    Reconciles the build manifests against the OpenAI account and deletes what
+    nothing references any more:
+
+    - vector stores created by dynamic builds that no manifest points at, or that expired;
+    - dynamic assistants that are not the manifest's assistant for their repo
+      (duplicates left by rebuilds), or whose vector store is gone;
+    - files a manifest recorded (as an upload or as superseded) that no
+      manifest with a live vector store still uses, when they are superseded
+      or attached to no surviving vector store.
+
+    Files are only ever deleted by id from the manifests: other uploads in
+    the same OpenAI account (other apps, the pre-built store's files) are
+    never candidates, attached or not.
+
+    Deletions run in batches under a global rate limit. Resources younger than
+    REAPER_GRACE_SECONDS and the pre-built vector store/assistant are never touched.
+
+    The sweep also drops the `tenant_ids`' warm outlines from storage once
+    they are served or older than REAPER_OUTLINE_MAX_AGE_SECONDS.
+    """
+
+    def __init__(self, client, manifests, protected_ids=(), grace_seconds: float = REAPER_GRACE_SECONDS,
+                 batch_size: int = REAPER_BATCH_SIZE, rate: float = REAPER_RATE, tenant_ids=()):
+        self.client = client
+        self.tenant_ids = list(tenant_ids)
+        self.protected = {i for i in protected_ids if i}
+        self.grace_seconds = grace_seconds
+        self.batch_size = max(1, batch_size)
+        self.rate = rate
+        self.manifests = list(manifests)
+        self._next_delete_at = 0.0
+
+    def _old_enough(self, obj, now) -> bool:
+        return now - (getattr(obj, "created_at", None) or 0) >= self.grace_seconds
+
+    def plan(self) -> dict:
+        """Work out what would be deleted, without deleting anything."""
+        now = time.time()
+        manifests = self.manifests
+        vector_stores = list(self.client.beta.vector_stores.list(limit=100))
+        assistants = list(self.client.beta.assistants.list(limit=100))
+        files = list(self.client.files.list(purpose="assistants"))
+
+        live_stores = {vs.id for vs in vector_stores if getattr(vs, "status", None) != "expired"}
+        referenced_stores = {m.vector_store_id for m in manifests if m.vector_store_id}
+        referenced_assistants = {m.assistant_id for m in manifests if m.assistant_id}
+        referenced_files = set()
+        recorded_files = set()
+        stale_files = set()
+        for m in manifests:
+            stale_files.update(m.data.get("stale_file_ids", []))
+            file_ids = {e["file_id"] for e in m.files.values() if e.get("file_id")}
+            recorded_files.update(file_ids)
+            if m.vector_store_id in live_stores:
+                referenced_files.update(file_ids)
+        recorded_files |= stale_files
+
+        orphan_stores = [
+            vs for vs in vector_stores
+            if vs.id not in self.protected and _is_managed_vector_store(vs)
+            and (vs.id not in live_stores or (vs.id not in referenced_stores and self._old_enough(vs, now)))
+        ]
+        surviving_stores = live_stores - {vs.id for vs in orphan_stores}
+
+        def assistant_stores(a):
+            resources = getattr(a, "tool_resources", None)
+            file_search = getattr(resources, "file_search", None) if resources else None
+            return set(getattr(file_search, "vector_store_ids", None) or [])
+
+        orphan_assistants = [
+            a for a in assistants
+            if a.id not in self.protected and _is_managed_assistant(a) and a.id not in referenced_assistants
+            and self._old_enough(a, now)
+            and (a.name in {m.data.get("repo") for m in manifests} or not (assistant_stores(a) & surviving_stores))
+        ]
+
+        attached = set()
+        for vs_id in surviving_stores:
+            attached.update(f.id for f in self.client.beta.vector_stores.files.list(vs_id, limit=100))
+        orphan_files = [
+            f for f in files
+            if f.id in recorded_files and f.id not in self.protected and (
+                # a superseded upload may still be in use by another repo with the same blob
+                (f.id in stale_files and f.id not in referenced_files)
+                or (f.id not in attached and f.id not in referenced_files and self._old_enough(f, now))
+            )
+        ]
+        return {"vector_stores": orphan_stores, "assistants": orphan_assistants, "files": orphan_files,
+                "manifests": manifests}
+
+    def _throttle(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_delete_at:
+            time.sleep(self._next_delete_at - now)
+        self._next_delete_at = max(now, self._next_delete_at) + 1.0 / self.rate
+
+    def _sweep(self, kind, objects, delete) -> dict:
+        report = {"deleted": 0, "failed": 0, "ids": []}
+        if kind == "files":
+            report["bytes"] = 0
+        for start in range(0, len(objects), self.batch_size):
+            for obj in objects[start:start + self.batch_size]:
+                self._throttle()
+                try:
+                    delete(obj.id)
+                except Exception as e:
+                    log.warning("Failed to delete %s %s: %s", kind, obj.id, e)
+                    report["failed"] += 1
+                    continue
+                report["deleted"] += 1
+                report["ids"].append(obj.id)
+                if kind == "files":
+                    report["bytes"] += getattr(obj, "bytes", 0) or 0
+                RECLAIMED.inc(kind=kind)
+            log.info("Reaper %s batch done: %d deleted so far", kind, report["deleted"])
+        return report
+
+    def run(self, dry_run: bool = False) -> dict:
+        """Run one sweep and return what was (or, with dry_run, would be) reclaimed."""
+        with span("reaper_sweep"):
+            plan = self.plan()
+            if dry_run:
+                return {
+                    "dry_run": True,
+                    **{kind: {"would_delete": [o.id for o in plan[kind]]}
+                       for kind in ("assistants", "vector_stores", "files")},
+                }
+            report = {"dry_run": False}
+            # Assistants first so nothing points at a store while it is being deleted.
+            report["assistants"] = self._sweep("assistants", plan["assistants"], self.client.beta.assistants.delete)
+            report["vector_stores"] = self._sweep("vector_stores", plan["vector_stores"], self.client.beta.vector_stores.delete)
+            report["files"] = self._sweep("files", plan["files"], self.client.files.delete)
+
+            deleted_files = set(report["files"]["ids"])
+            for manifest in plan["manifests"]:
+                manifest.drop_stale_file_ids(deleted_files)
+
+            generated_before = time.time() - REAPER_OUTLINE_MAX_AGE_SECONDS
+            report["outlines"] = {"deleted": sum(STORAGE.purge_outlines(tenant_id, generated_before)
+                                                 for tenant_id in self.tenant_ids)}
+        log.info(
+            "Reaper reclaimed %d assistants, %d vector stores, %d files (%d bytes), %d warm outlines",
+            report["assistants"]["deleted"], report["vector_stores"]["deleted"],
+            report["files"]["deleted"], report["files"]["bytes"], report["outlines"]["deleted"],
+        )
+        return report
+
+
+_reaper_thread = None
+
+
+def reaper_for_tenant(tenant, protected_ids=(), tenants=()) -> Reaper:
+    """
+    A reaper for the tenant's OpenAI account. Tenants may share an API key, so
+    the manifests of every tenant in `tenants` on the same key count as live
+    too; otherwise one tenant's sweep would delete the other's builds.
+    """
+    sharing = {t.id for t in tenants if t.openai_api_key == tenant.openai_api_key} | {tenant.id}
+    manifests = [m for tenant_id in sorted(sharing) for m in list_manifests(tenant_id)]
+    return Reaper(tenant.openai_client(), manifests, protected_ids, tenant_ids=sorted(sharing))
+
+
+def start_reaper(tenants, protected_ids=(), interval: float = REAPER_INTERVAL):
+    """
+    Start the background sweep thread once per process; a no-op when interval is 0.
+    `tenants` is a callable returning the tenants to sweep, one OpenAI account after another.
+    """
+    global _reaper_thread
+    if interval <= 0 or _reaper_thread is not None:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            current = list(tenants())
+            swept = set()
+            for tenant in current:
+                if not tenant.openai_api_key or tenant.openai_api_key in swept:
+                    continue
+                swept.add(tenant.openai_api_key)
+                try:
+                    reaper_for_tenant(tenant, protected_ids, current).run()
+                except Exception as e:
+                    log.error("Reaper sweep failed for tenant %s: %s", tenant.id, e)
+
+    _reaper_thread = threading.Thread(target=loop, name="reaper", daemon=True)
+    _reaper_thread.start()
+    return _reaper_thread
@@ -1,26 +1,66 @@
 import os
 import re
-import requests
 from flask import Blueprint, jsonify, request, Response, stream_with_context
 import json
-from openai import OpenAI
 import io
 import mimetypes
 import time
-from tenacity import retry, stop_after_attempt, wait_exponential
-from typing_extensions import override
-from openai import AssistantEventHandler
+import threading
+import itertools
+from functools import lru_cache
+# requests, tenacity and openai are imported on first use (see github_session,
+# openai_upload_with_retry and outline_handler_class) to keep cold starts fast.
+from observability import Counter, get_logger, observe, register, render_prometheus, span
+from ranking import INGEST_TOKEN_BUDGET, prioritize
+from pipeline import ATTACHED, SKIPPED, UNCHANGED, BuildReport, ByteBudget, FileRecord, FileResult, stage
+from admission import ADMISSION, ADMISSION_RETRY_AFTER
+from checkpoint import BUILD_STATE_DIR, BuildManifest, manifest_lock
+from dedup import DUPLICATE, Deduplicator
+from reaper import MANAGED_METADATA_KEY, reaper_for_tenant, start_reaper
+from scheduler import BUILD_SCHEDULER
+from sources import GitSource, Source, WorkTreeSource, find_checkout, find_mirror, shallow_clone, usable_content
+from sharedcache import SHARED_CACHE, start_cache_purge
+from storage import STORAGE
+from streams import FRAMING_COMPACT, FRAMING_JSON, STREAMS, GenerationStream, choose_encoding, compress_stream
+from tenants import UnknownTenant, get_tenant, load_tenants, tenant_from_request
+from warmup import OUTLINE_CACHE, Warmer, start_warmup
+
+log = get_logger("routes")
 
 routes = Blueprint("routes", __name__)
 def register_routes(app):
     """Register this blueprint with the Flask app."""
     app.register_blueprint(routes)
+    # gunicorn.conf.py sets this: the master never serves traffic, so the loops start in a worker (post_fork)
+    if not BACKGROUND_TASKS_IN_WORKERS:
+        start_background_tasks()
+    if PRELOAD_CLIENT_LIBS:
+        threading.Thread(target=preload_client_libs, name="preload", daemon=True).start()
+
+@routes.errorhandler(UnknownTenant)
+def unknown_tenant(e):
+    return jsonify({"error": str(e)}), 404
+
+@routes.errorhandler(PermissionError)
+def forbidden_owner(e):
+    return jsonify({"error": str(e)}), 403
 
-# Environment variables (for pre-built mode)
-GITHUB_API_KEY = os.getenv("GITHUB_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Environment variables (for pre-built mode); per-tenant credentials live in tenants.py
 PREBUILT_VECTOR_STORE_ID = os.getenv("VECTOR_STORE_ID")  # e.g. vs_ANGoJfG1WLHRoVM9x46J8dH4
 PREBUILT_ASSISTANT_ID = os.getenv("ASSISTANT_ID")        # e.g. asst_ICqgIQQ0DZGNCRI48Ic77Oww
+# Overridable so the benchmark harness can point the crawler at a local stand-in.
+# The OpenAI client honours OPENAI_BASE_URL on its own.
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# Import openai/requests/tenacity in a background thread right after startup instead of on first use
+PRELOAD_CLIENT_LIBS = os.getenv("PRELOAD_CLIENT_LIBS", "0").lower() in ("1", "true", "yes")
+# Seconds a GitHub repo listing is served from the shared cache; 0 always asks GitHub
+REPO_LIST_CACHE_SECONDS = float(os.getenv("REPO_LIST_CACHE_SECONDS", "60"))
+# Seconds an assistant found by name is remembered, so workers don't each page through the account
+ASSISTANT_LOOKUP_CACHE_SECONDS = float(os.getenv("ASSISTANT_LOOKUP_CACHE_SECONDS", "300"))
+# Leave the background loops to start_background_tasks() in a forked worker rather than at import
+BACKGROUND_TASKS_IN_WORKERS = os.getenv("BACKGROUND_TASKS_IN_WORKERS", "0").lower() in ("1", "true", "yes")
+# Seconds between a process's load reports in the shared cache, which tell the warm-up whether any worker is busy
+LOAD_REPORT_SECONDS = float(os.getenv("LOAD_REPORT_SECONDS", "5"))
 
 ###############################################################################
 # Helper Functions & Constants
@@ -82,7 +122,7 @@ def skip_directory(dir_path: str) -> bool:
     lp = dir_path.lower()
     for pattern in excluded_dir_patterns:
         if pattern.search(lp):
-            print(f"[DEBUG] Skipping directory: {dir_path}")
+            log.debug("Skipping directory: %s", dir_path)
             return True
     return False
 
@@ -120,12 +160,12 @@ def is_venv_or_dependency_file(file_path: str) -> bool:
     # Check virtual environment markers using path component checking
     for marker in venv_markers:
         if f"/{marker}/" in lp or lp.endswith(f"/{marker}") or lp.startswith(f"{marker}/"):
-            print(f"[DEBUG] Skipping file (virtual environment marker '{marker}'): {file_path}")
+            log.debug("Skipping file (virtual environment marker '%s'): %s", marker, file_path)
             return True
     # Check dependency directory markers
     for marker in dependency_markers:
         if f"/{marker}/" in lp or lp.startswith(f"{marker}/"):
-            print(f"[DEBUG] Skipping file (dependency marker '{marker}'): {file_path}")
+            log.debug("Skipping file (dependency marker '%s'): %s", marker, file_path)
             return True
     # Skip common compiled or binary files
     compiled_extensions = [
@@ -134,29 +174,29 @@ def is_venv_or_dependency_file(file_path: str) -> bool:
     ]
     for ext in compiled_extensions:
         if lp.endswith(ext):
-            print(f"[DEBUG] Skipping compiled/binary file: {file_path}")
+            log.debug("Skipping compiled/binary file: %s", file_path)
             return True
     return False
 
-def skip_file(file_info: dict) -> bool:
+def skip_file(file_info: FileRecord) -> bool:
     """
     Return True if the file (represented by file_info) should be excluded.
     Checks file size, file exclusion patterns, virtual environment/dependency markers,
     and allowed file extensions.
     """
-    file_path = file_info.get("path", "")
-    file_size = file_info.get("size", 0)
+    file_path = file_info.path
+    file_size = file_info.size
     lp = file_path.lower()
 
     # Skip oversized files
     if file_size > MAX_FILE_SIZE:
-        print(f"[DEBUG] Skipping oversized file: {file_path} ({file_size} bytes)")
+        log.debug("Skipping oversized file: %s (%d bytes)", file_path, file_size)
         return True
 
     # Check hardcoded exclusion patterns
     for pattern in excluded_file_patterns:
         if pattern.search(lp):
-            print(f"[DEBUG] Skipping file (excluded pattern): {file_path}")
+            log.debug("Skipping file (excluded pattern): %s", file_path)
             return True
 
     # Check for virtual environment/dependency markers
@@ -165,7 +205,7 @@ def skip_file(file_info: dict) -> bool:
 
     # Check for allowed file extensions
     if not lp.endswith(allowed_extensions):
-        print(f"[DEBUG] Skipping file (extension not allowed): {file_path}")
+        log.debug("Skipping file (extension not allowed): %s", file_path)
         return True
 
     return False
@@ -173,54 +213,120 @@ def skip_file(file_info: dict) -> bool:
 ###############################################################################
 # Recursively fetch files from GitHub with parallel processing
 ###############################################################################
-def fetch_repo_files_recursively(owner: str, repo: str, path: str, headers: dict) -> list:
+
+# Directory listings fetched concurrently while crawling
+CRAWL_WORKERS = 10
+# Files discovered but not yet picked up by the download stage
+CRAWL_BUFFER = 256
+
+def iter_repo_files(owner: str, repo: str, path: str, headers: dict, max_depth: int = 8, on_error=None):
     """
-    Recursively traverse a GitHub repo at `path`, skipping excluded directories and files,
-    and return a list of valid file objects.
+    Traverse a GitHub repo from `path` on a pool of directory workers, yielding
+    a FileRecord for each file that passes the filters as soon as it is
+    discovered. Listing pages are dropped once processed, so memory stays flat
+    however large the repo.
+    Workers block once CRAWL_BUFFER files are waiting, so a slow consumer
+    throttles the crawl instead of letting it run ahead unbounded.
+    A directory that can't be listed is logged and skipped; `on_error(dir_path)`
+    is called for it, so callers can tell the listing is incomplete.
     """
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    file_list = []
-    
-    def process_directory(dir_path, depth=0, max_depth=8):
+    import queue
+
+    dirs = queue.Queue()
+    found = queue.Queue(maxsize=CRAWL_BUFFER)
+    done = object()
+    pending = [1]
+    pending_lock = threading.Lock()
+    stop = threading.Event()
+
+    def emit(item):
+        while not stop.is_set():
+            try:
+                found.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def listing_failed(dir_path):
+        if on_error is not None:
+            on_error(dir_path)
+
+    def process_directory(dir_path, depth):
         if depth > max_depth:
-            print(f"[DEBUG] Reached maximum depth at {dir_path}")
-            return []
-        local_files = []
-        api_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{dir_path}"
-        while api_url:
-            resp = requests.get(api_url, headers=headers)
+            log.debug("Reached maximum depth at %s", dir_path)
+            return
+        api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{dir_path}"
+        while api_url and not stop.is_set():
+            resp = github_session().get(api_url, headers=headers)
             if resp.status_code != 200:
-                print(f"[DEBUG] Failed to fetch {api_url}, status code: {resp.status_code}")
+                log.warning("Failed to fetch %s, status code: %s", api_url, resp.status_code)
+                listing_failed(dir_path)
                 break
             items = resp.json()
             if not isinstance(items, list):
-                print(f"[DEBUG] Unexpected GitHub API response at {api_url}: {items}")
+                log.warning("Unexpected GitHub API response at %s: %s", api_url, items)
+                listing_failed(dir_path)
                 break
-            print(f"[DEBUG] Fetched {len(items)} items from {api_url}.")
-            
-            dirs_to_process = []
+            log.debug("Fetched %d items from %s.", len(items), api_url)
+
             for item in items:
                 item_type = item.get("type", "")
                 if item_type == "dir":
                     if not skip_directory(item.get("path", "")):
-                        dirs_to_process.append(item.get("path", ""))
+                        with pending_lock:
+                            pending[0] += 1
+                        dirs.put((item.get("path", ""), depth + 1))
                 elif item_type == "file":
-                    if not skip_file(item):
-                        print(f"[DEBUG] -> Adding file to final upload list: {item.get('path', '')}")
-                        local_files.append(item)
+                    record = FileRecord.from_item(item)
+                    with span("filter"):
+                        skipped = skip_file(record)
+                    if not skipped:
+                        log.debug("-> Adding file to final upload list: %s", record.path)
+                        emit(record)
                 else:
-                    print(f"[DEBUG] Skipping unknown item type: {item.get('name', '')}, type={item_type}")
-            
-            if dirs_to_process:
-                with ThreadPoolExecutor(max_workers=min(10, len(dirs_to_process))) as executor:
-                    future_to_dir = {executor.submit(process_directory, d, depth+1, max_depth): d for d in dirs_to_process}
-                    for future in as_completed(future_to_dir):
-                        local_files.extend(future.result())
-            
+                    log.debug("Skipping unknown item type: %s, type=%s", item.get("name", ""), item_type)
+
             api_url = resp.links.get("next", {}).get("url")
-        return local_files
-    
-    return process_directory(path)
+
+    def worker():
+        while True:
+            task = dirs.get()
+            if task is None:
+                return
+            try:
+                process_directory(*task)
+            except Exception as e:
+                log.warning("Error crawling %s: %s", task[0], e)
+                listing_failed(task[0])
+            finally:
+                with pending_lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    for _ in range(CRAWL_WORKERS):
+                        dirs.put(None)
+                    emit(done)
+
+    started = time.perf_counter()
+    dirs.put((path, 0))
+    for _ in range(CRAWL_WORKERS):
+        threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item = found.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        observe("crawl", time.perf_counter() - started)
+
+def fetch_repo_files_recursively(owner: str, repo: str, path: str, headers: dict) -> list:
+    """
+    Recursively traverse a GitHub repo at `path`, skipping excluded directories and files,
+    and return a list of FileRecords. Builds stream `iter_repo_files` instead.
+    """
+    return list(iter_repo_files(owner, repo, path, headers))
 
 mime_map = {
     ".cpp": "text/x-c++",
@@ -242,119 +348,644 @@ mime_map = {
     ".tex": "text/x-tex"
 }
 
-SESSION = requests.Session()
-SESSION.verify = True
-SESSION.timeout = (3.05, 27)
+@lru_cache(maxsize=None)
+def github_session():
+    """
+    Shared HTTP session for file downloads, created on first use. Its pool
+    keeps a connection per download worker and crawl thread; requests' default
+    of 10 would discard and reopen connections under a full pipeline.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    session.verify = True
+    session.timeout = (3.05, 27)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(DOWNLOAD_WORKERS, CRAWL_WORKERS))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# A pooled session's sockets must not be shared with a forked worker.
+os.register_at_fork(after_in_child=github_session.cache_clear)
+
+@lru_cache(maxsize=None)
+def _upload_with_retry():
+    from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+    def upload(client, content, filename, mimetype):
+        for attempt in Retrying(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10)):
+            with attempt:
+                uploaded_file = client.files.create(
+                    file=(filename, io.BytesIO(content), mimetype),
+                    purpose="assistants"
+                )
+        return uploaded_file, attempt.retry_state.attempt_number
+    return upload
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
 def openai_upload_with_retry(client, content, filename, mimetype):
-    return client.files.create(
-        file=(filename, io.BytesIO(content), mimetype),
-        purpose="assistants"
-    )
+    """Upload with retries; returns (file, attempts). Raises tenacity's RetryError once attempts run out."""
+    return _upload_with_retry()(client, content, filename, mimetype)
+
+def preload_client_libs():
+    """Build the lazily created clients now, so the first build or generation doesn't pay for the imports."""
+    with span("preload"):
+        github_session()
+        _upload_with_retry()
+        outline_handler_class()
+
+def list_github_repos(tenant, owner: str = None) -> list:
+    """
+    Repos of one of the tenant's owners, with pushed_at; raises requests.HTTPError on failure.
+    Listings are shared between workers for REPO_LIST_CACHE_SECONDS.
+    """
+    owner = tenant.resolve_owner(owner)
+    cache_key = f"{tenant.id}:{owner}"
+    if REPO_LIST_CACHE_SECONDS > 0:
+        cached = SHARED_CACHE.get("repos", cache_key)
+        if cached is not None:
+            return cached
+    import requests
+    owner_type = tenant.owner_type if owner == tenant.owner else "users"
+    response = requests.get(f"{GITHUB_API_URL}/{owner_type}/{owner}/repos", headers=tenant.github_headers())
+    response.raise_for_status()
+    repos = [
+        {"id": repo["id"], "name": repo["name"], "url": repo["html_url"], "owner": owner,
+         "pushed_at": repo.get("pushed_at")}
+        for repo in response.json()
+    ]
+    if REPO_LIST_CACHE_SECONDS > 0:
+        SHARED_CACHE.set("repos", cache_key, repos, REPO_LIST_CACHE_SECONDS)
+    return repos
 
 def find_assistant_by_name(client, name):
     """Find an assistant by name from the list of all assistants."""
     try:
-        assistants = client.beta.assistants.list(limit=100)
+        with span("assistant_lookup"):
+            assistants = client.beta.assistants.list(limit=100)
         for assistant in assistants.data:
             if assistant.name == name:
                 return assistant
     except Exception as e:
-        print(f"[DEBUG] Error listing assistants: {str(e)}")
+        log.warning("Error listing assistants: %s", e)
     return None
 
-def create_dynamic_assistant_helper(repo):
+# Worker threads per pipeline stage, and results buffered between stages
+DOWNLOAD_WORKERS = 20
+UPLOAD_WORKERS = 20
+STAGE_BUFFER = 64
+# File content held at once per build, from download until upload; 0 for no cap
+BUILD_INFLIGHT_BYTES = int(os.getenv("BUILD_INFLIGHT_BYTES", str(16 * 1024 * 1024)))
+
+def download_file(file_info: FileRecord):
+    """
+    Download stage: fetch one file's content.
+    Returns (file_info, content, error); content is None for skipped files.
+    """
+    file_path = file_info.path
+    download_url = file_info.download_url
+    log.debug("Processing file: %s", file_path)
+    if not download_url:
+        return file_info, None, None
+    try:
+        with span("download"):
+            file_content_resp = github_session().get(download_url, timeout=10)
+            if file_content_resp.status_code != 200:
+                raise RuntimeError(f"HTTP {file_content_resp.status_code}")
+            content = file_content_resp.content
+    except Exception as e:
+        error_msg = f"Error processing {file_path}: {str(e)}"
+        log.warning(error_msg)
+        return file_info, None, error_msg
+    if not usable_content(file_path, content):
+        return file_info, None, None
+    return file_info, content, None
+
+# Local copies builds read instead of the GitHub API: git mirrors (<dir>/<owner>/<repo>.git or
+# <dir>/<owner>/<repo>) or plain checkouts without .git (<dir>/<owner>/<repo>)
+INGEST_MIRROR_DIR = os.getenv("INGEST_MIRROR_DIR", "")
+# Shallow-clone repos without a mirror rather than crawl them file by file through the Contents API
+INGEST_CLONE = os.getenv("INGEST_CLONE", "0").lower() in ("1", "true", "yes")
+INGEST_CLONE_DIR = os.getenv("INGEST_CLONE_DIR", os.path.join(BUILD_STATE_DIR, "clones"))
+# Base URL clones are fetched from (<url>/<owner>/<repo>.git); a local directory of bare repos works too
+GITHUB_CLONE_URL = os.getenv("GITHUB_CLONE_URL", "https://github.com").rstrip("/")
+# Comma-separated directories to ingest from clones (a sparse checkout); empty takes the whole repo
+INGEST_SPARSE_PATHS = [p.strip() for p in os.getenv("INGEST_SPARSE_PATHS", "").split(",") if p.strip()]
+
+class GitHubSource(Source):
+    """The Contents API crawler and raw downloads, one HTTP request per directory page and per file."""
+
+    name = "github"
+
+    def __init__(self, owner: str, repo: str, headers: dict):
+        self.owner = owner
+        self.repo = repo
+        self.headers = headers
+
+    def iter_files(self):
+        return iter_repo_files(self.owner, self.repo, "", self.headers, on_error=self._listing_failed)
+
+    def _listing_failed(self, dir_path):
+        self.incomplete = True
+
+    def read(self, record):
+        return download_file(record)
+
+def repo_source(tenant, owner: str, repo_name: str) -> Source:
+    """
+    Where to read a repo from: a local mirror if there is one, else a plain
+    local checkout, else a shallow clone when INGEST_CLONE is on, else the
+    GitHub API. A failed clone falls back to the API.
+    """
+    mirror = find_mirror(INGEST_MIRROR_DIR, owner, repo_name)
+    if mirror:
+        log.info("Reading %s/%s from mirror %s", owner, repo_name, mirror)
+        return GitSource(mirror, skip_dir=skip_directory, skip_file=skip_file)
+    checkout = find_checkout(INGEST_MIRROR_DIR, owner, repo_name)
+    if checkout:
+        log.info("Reading %s/%s from checkout %s", owner, repo_name, checkout)
+        return WorkTreeSource(checkout, skip_dir=skip_directory, skip_file=skip_file)
+    if INGEST_CLONE:
+        dest = os.path.join(INGEST_CLONE_DIR, tenant.id, owner, repo_name)
+        try:
+            rev = shallow_clone(f"{GITHUB_CLONE_URL}/{owner}/{repo_name}.git", dest,
+                                sparse_paths=INGEST_SPARSE_PATHS, token=tenant.github_token)
+        except Exception as e:
+            log.warning("Shallow clone of %s/%s failed, using the GitHub API: %s", owner, repo_name, e)
+        else:
+            return GitSource(dest, rev, paths=INGEST_SPARSE_PATHS, skip_dir=skip_directory, skip_file=skip_file)
+    return GitHubSource(owner, repo_name, tenant.github_headers())
+
+def upload_content(client, file_path: str, content: bytes):
+    """Upload stage, part one: push file content to OpenAI. Returns (file_id, error, attempts)."""
+    try:
+        filename = os.path.basename(file_path)
+        extension = os.path.splitext(filename)[1].lower()
+        mimetype = mime_map.get(extension, "text/plain")
+        with span("upload"):
+            uploaded_file, attempts = openai_upload_with_retry(client, content, filename, mimetype)
+        log.debug("Uploaded file: %s, id: %s", file_path, uploaded_file.id)
+        return uploaded_file.id, None, attempts
+    except Exception as e:
+        error_msg = f"Error processing {file_path}: {str(e)}"
+        log.warning(error_msg)
+        attempts = getattr(getattr(e, "last_attempt", None), "attempt_number", 1)
+        return None, error_msg, attempts
+
+def detach_file(client, vector_store_id: str, file_id: str):
+    """Remove an upload from the vector store (deleting the upload is the reaper's job). Returns an error or None."""
+    try:
+        with span("vector_detach"):
+            client.beta.vector_stores.files.delete(file_id, vector_store_id=vector_store_id)
+        return None
+    except Exception as e:
+        if getattr(e, "status_code", None) == 404:
+            return None
+        error_msg = f"Error detaching {file_id} from {vector_store_id}: {str(e)}"
+        log.warning(error_msg)
+        return error_msg
+
+def attach_file(client, vector_store_id: str, file_path: str, file_id: str):
+    """Upload stage, part two: attach an uploaded file to the vector store. Returns an error or None."""
+    try:
+        with span("vector_attach"):
+            client.beta.vector_stores.files.create(
+                vector_store_id=vector_store_id,
+                file_id=file_id
+            )
+        return None
+    except Exception as e:
+        error_msg = f"Error processing {file_path}: {str(e)}"
+        log.warning(error_msg)
+        return error_msg
+
+def _reusable(fetch, resource_id):
+    """Return resource_id if the remote object still exists and has not expired."""
+    if not resource_id:
+        return None
+    try:
+        obj = fetch(resource_id)
+    except Exception as e:
+        log.info("Not reusing %s: %s", resource_id, e)
+        return None
+    if getattr(obj, "status", None) == "expired":
+        return None
+    return resource_id
+
+# One build per repo at a time, so concurrent requests can't race on the same manifest
+def _build_lock(key):
+    return manifest_lock(*key)
+
+def prebuilt_manifest_name(repo_name: str) -> str:
+    """
+    Manifest (and scheduler) key for a repo built into the pre-built vector
+    store, kept apart from its dynamic build. `#` cannot occur in a GitHub repo name.
+    """
+    return f"{repo_name}#prebuilt"
+
+def create_dynamic_assistant_helper(repo, tenant=None, prebuilt: bool = False):
     """
     Helper to create a new vector store and dynamic assistant for the repository.
     Returns a dict with the new vector store and assistant IDs.
+
+    The vector store and assistant are created in the background while the repo is
+    crawled, and files stream through the download and upload stages as soon as
+    they are discovered, so build time tracks the slowest stage rather than the
+    sum of all of them.
+
+    Progress is checkpointed to a BuildManifest. A retried build reuses the same
+    vector store and assistant and skips files that were already attached.
+    Uploads of files that changed are detached from the reused store, and after
+    a complete listing so are files no longer in the repo.
+
+    The repo is read from `repo["owner"]` when given (it must be one of the
+    tenant's owners), otherwise from the tenant's default owner, using the
+    tenant's own GitHub and OpenAI credentials.
+
+    With `prebuilt`, the files go into the pre-built vector store
+    (VECTOR_STORE_ID) instead and no assistant is created: the pre-built
+    assistant already searches that store.
+
+    A build that fails on some files still finishes (status "partial") and is
+    served with what it attached; only the failed files are retried later, in
+    the background (see schedule_file_retry).
     """
-    if not GITHUB_API_KEY or not OPENAI_API_KEY:
+    tenant = tenant or get_tenant()
+    if not tenant.github_token or not tenant.openai_api_key:
         raise Exception("Missing API keys")
         
-    repo_name = repo["name"]
-    print(f"[DEBUG] Starting dynamic upload for repo: {repo_name}")
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    try:
-        new_vector_store = client.beta.vector_stores.create(
-            name=f"vs_{repo_name}",
-            expires_after={"anchor": "last_active_at", "days": 1}
-        )
-        dynamic_vector_store_id = new_vector_store.id
-        print(f"[DEBUG] Created dynamic vector store with id: {dynamic_vector_store_id}")
-    except Exception as e:
-        raise Exception(f"Error creating dynamic vector store: {str(e)}")
-        
-    headers = {"Authorization": f"token {GITHUB_API_KEY}"}
-    github_files = fetch_repo_files_recursively("Bykho", repo_name, "", headers)
-    print(f"[DEBUG] Files to upload: {[f.get('path') for f in github_files]}")
-    attached_file_ids = []
-    errors = []
+    owner = tenant.resolve_owner(repo.get("owner"))
+    return _run_build(tenant, owner, repo["name"], prebuilt)
 
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    def process_file(file_info):
-        file_path = file_info.get("path", "")
-        download_url = file_info.get("download_url", "")
-        print(f"[DEBUG] Processing file: {file_path}")
-        if not download_url:
-            return None, None
+# Background retries of the files a build failed on: rounds per build (0 turns them off),
+# and the delay before the first round, doubling for each one after it
+BUILD_RETRY_ROUNDS = int(os.getenv("BUILD_RETRY_ROUNDS", "2"))
+BUILD_RETRY_DELAY_SECONDS = float(os.getenv("BUILD_RETRY_DELAY_SECONDS", "30"))
+
+BUILD_FILES = register(Counter(
+    "silo_build_files_total",
+    "Files seen by builds, by outcome (attached, unchanged, skipped, failed).",
+))
+BUILD_FILE_RETRIES = register(Counter(
+    "silo_build_file_retries_total",
+    "Background retry rounds scheduled for files a build failed on.",
+))
+
+# Retries waiting for their timer: (tenant id, owner, manifest name) -> {path: record}. A build that
+# fails meanwhile adds its files to the waiting retry instead of scheduling (and losing) another.
+_pending_retries = {}
+_pending_retries_lock = threading.Lock()
+_retry_ids = itertools.count(1)
+
+def _run_build(tenant, owner, repo_name, prebuilt: bool = False, records=None, retry_round: int = 0):
+    """Run one build (or, with `records`, a retry of just those files) as a recorded job."""
+    manifest_name = prebuilt_manifest_name(repo_name) if prebuilt else repo_name
+    with _build_lock((tenant.id, owner, manifest_name)):
+        job_id = STORAGE.start_job(tenant.id, owner, manifest_name)
+        started_at = time.perf_counter()
         try:
-            file_content_resp = SESSION.get(download_url, timeout=10)
-            if file_content_resp.status_code != 200:
-                raise requests.HTTPError(f"HTTP {file_content_resp.status_code}")
-            content = file_content_resp.content
-            if len(content) == 0:
-                print(f"[DEBUG] Skipping empty file: {file_path}")
-                return None, None
-            try:
-                content.decode("utf-8")
-            except UnicodeDecodeError:
-                print(f"[DEBUG] Skipping non-UTF-8 file: {file_path}")
-                return None, None
-            filename = os.path.basename(file_path)
-            extension = os.path.splitext(filename)[1].lower()
-            mimetype = mime_map.get(extension, "text/plain")
-            uploaded_file = openai_upload_with_retry(client, content, filename, mimetype)
-            print(f"[DEBUG] Uploaded file: {file_path}, id: {uploaded_file.id}")
-            vs_file = client.beta.vector_stores.files.create(
-                vector_store_id=dynamic_vector_store_id,
-                file_id=uploaded_file.id
+            result = _build_repo(tenant, owner, repo_name, prebuilt, records)
+        except Exception as e:
+            STORAGE.finish_job(job_id, "failed", {"error": str(e), "wall_s": round(time.perf_counter() - started_at, 3),
+                                                  "retry_round": retry_round})
+            raise
+        report = result["report"]
+        for status, count in report["files"].items():
+            BUILD_FILES.inc(count, status=status)
+        result["retry_scheduled"] = schedule_file_retry(
+            tenant, owner, repo_name, prebuilt, result.pop("failed_records"), retry_round + 1)
+        STORAGE.finish_job(job_id, "partial" if result["errors"] else "complete", {
+            "wall_s": round(time.perf_counter() - started_at, 3),
+            "files_attached": len(result["attached_file_ids"]),
+            "errors": len(result["errors"]),
+            "resumed": result["resumed"],
+            "reused_uploads": result["reused_uploads"],
+            "pruned_files": result["pruned_files"],
+            "detached_uploads": result["detached_uploads"],
+            "deduplicated": result["deduplicated"],
+            "ranking": result["ranking"],
+            "report": report,
+            "retry_round": retry_round,
+            "retry_scheduled": result["retry_scheduled"],
+        })
+        return result
+
+def schedule_file_retry(tenant, owner, repo_name, prebuilt: bool, records, retry_round: int) -> bool:
+    """
+    Retry just `records`, the files a build failed on, after a delay and
+    through the build scheduler. Nothing is re-listed and files attached in
+    the meantime are skipped. A round that still fails schedules the next,
+    up to BUILD_RETRY_ROUNDS. If a retry of the repo is already waiting,
+    `records` join it. Returns whether the files will be retried.
+    """
+    if not records or retry_round > BUILD_RETRY_ROUNDS:
+        return False
+    pending_key = (tenant.id, owner, prebuilt_manifest_name(repo_name) if prebuilt else repo_name)
+    with _pending_retries_lock:
+        pending = _pending_retries.get(pending_key)
+        if pending is not None:
+            pending.update((record.path, record) for record in records)
+            log.info("Adding %d failed files of %s/%s to the pending retry", len(records), owner, repo_name)
+            return True
+        _pending_retries[pending_key] = {record.path: record for record in records}
+    delay = BUILD_RETRY_DELAY_SECONDS * 2 ** (retry_round - 1)
+
+    def submit():
+        with _pending_retries_lock:
+            batch = list(_pending_retries.pop(pending_key).values())
+            # Its own scheduler key: the build that scheduled it, or an earlier retry, may still be in flight.
+            key = pending_key[1:] + ("retry", next(_retry_ids))
+        BUILD_SCHEDULER.submit(tenant, key, _run_build, tenant, owner, repo_name, prebuilt, batch, retry_round)
+
+    log.info("Retrying %d failed files of %s/%s in %.0fs (round %d)", len(records), owner, repo_name, delay, retry_round)
+    BUILD_FILE_RETRIES.inc(tenant=tenant.id)
+    timer = threading.Timer(delay, submit)
+    timer.daemon = True
+    timer.start()
+    return True
+
+def schedule_build(repo, tenant, prebuilt: bool = False):
+    """Queue a build on the shared scheduler (joining one already in flight) and return its future."""
+    owner = tenant.resolve_owner(repo.get("owner"))
+    name = prebuilt_manifest_name(repo["name"]) if prebuilt else repo["name"]
+    return BUILD_SCHEDULER.submit(tenant, (owner, name), create_dynamic_assistant_helper, repo, tenant, prebuilt)
+
+def find_dynamic_assistant_id(tenant, owner, repo_name):
+    """
+    Return the id of the repo's dynamic assistant: the one recorded in the
+    tenant's build manifest, else a name lookup in the tenant's account.
+    """
+    manifest = BuildManifest.load(tenant.id, owner, repo_name)
+    if manifest.assistant_id and manifest.data.get("status") in ("complete", "partial"):
+        return manifest.assistant_id
+    cache_key = f"{tenant.id}:{repo_name}"
+    assistant_id = SHARED_CACHE.get("assistant", cache_key)
+    if assistant_id:
+        return assistant_id
+    assistant = find_assistant_by_name(tenant.openai_client(), repo_name)
+    if assistant is None:
+        return None
+    SHARED_CACHE.set("assistant", cache_key, assistant.id, ASSISTANT_LOOKUP_CACHE_SECONDS)
+    return assistant.id
+
+def _build_repo(tenant, owner, repo_name, prebuilt: bool = False, records=None):
+    log.info("Starting %s upload for repo: %s/%s (tenant %s)%s", "pre-built" if prebuilt else "dynamic",
+             owner, repo_name, tenant.id, f", retrying {len(records)} files" if records is not None else "")
+    client = tenant.openai_client()
+    report = BuildReport({"download": DOWNLOAD_WORKERS, "upload": UPLOAD_WORKERS, "attach": UPLOAD_WORKERS})
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    if prebuilt:
+        manifest = BuildManifest.load(tenant.id, owner, prebuilt_manifest_name(repo_name))
+        if manifest.vector_store_id and manifest.vector_store_id != PREBUILT_VECTOR_STORE_ID:
+            # VECTOR_STORE_ID was changed; nothing is attached to the new store yet.
+            manifest.reset()
+        if manifest.vector_store_id != PREBUILT_VECTOR_STORE_ID:
+            manifest.set_resources(vector_store_id=PREBUILT_VECTOR_STORE_ID)
+        reusable_vector_store_id = PREBUILT_VECTOR_STORE_ID
+    else:
+        manifest = BuildManifest.load(tenant.id, owner, repo_name)
+        reusable_vector_store_id = _reusable(client.beta.vector_stores.retrieve, manifest.vector_store_id)
+        if manifest.vector_store_id and not reusable_vector_store_id:
+            # The store expired or was deleted; files attached to it must be redone.
+            manifest.reset()
+    resumed = manifest.data["status"] != "new"
+
+    def create_vector_store():
+        started = time.perf_counter()
+        try:
+            return _create_vector_store()
+        finally:
+            report.timed("vector_store", time.perf_counter() - started)
+
+    def _create_vector_store():
+        if reusable_vector_store_id:
+            log.info("Resuming build with vector store: %s", reusable_vector_store_id)
+            return reusable_vector_store_id
+        try:
+            new_vector_store = client.beta.vector_stores.create(
+                name=f"vs_{repo_name}",
+                expires_after={"anchor": "last_active_at", "days": 1},
+                metadata={MANAGED_METADATA_KEY: f"{owner}/{repo_name}"}
             )
-            return uploaded_file.id, None
         except Exception as e:
-            error_msg = f"Error processing {file_path}: {str(e)}"
-            print(f"[DEBUG] {error_msg}")
-            return None, error_msg
-    
-    max_workers = min(20, len(github_files))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {executor.submit(process_file, file_info): file_info for file_info in github_files}
-        for future in as_completed(future_to_file):
-            file_id, error = future.result()
-            if file_id:
-                attached_file_ids.append(file_id)
+            raise Exception(f"Error creating dynamic vector store: {str(e)}")
+        log.info("Created dynamic vector store with id: %s", new_vector_store.id)
+        manifest.set_resources(vector_store_id=new_vector_store.id)
+        return new_vector_store.id
+
+    def create_assistant():
+        if prebuilt:
+            return None
+        vector_store_id = vector_store_future.result()
+        started = time.perf_counter()
+        try:
+            return _create_assistant(vector_store_id)
+        finally:
+            report.timed("assistant", time.perf_counter() - started)
+
+    def _create_assistant(vector_store_id):
+        assistant_id = _reusable(client.beta.assistants.retrieve, manifest.assistant_id)
+        if assistant_id:
+            client.beta.assistants.update(
+                assistant_id,
+                tool_resources={"file_search": {"vector_store_ids": [vector_store_id]}},
+            )
+            return assistant_id
+        try:
+            new_assistant = client.beta.assistants.create(
+                name=repo_name,
+                instructions="You are an assistant that helps analyze code repositories and generate project outlines.",
+                model="gpt-4-turbo",
+                tools=[{"type": "file_search"}],
+                tool_resources={"file_search": {"vector_store_ids": [vector_store_id]}},
+                metadata={MANAGED_METADATA_KEY: f"{owner}/{repo_name}"},
+            )
+        except Exception as e:
+            raise Exception(f"Error creating dynamic assistant: {str(e)}")
+        log.info("Created dynamic assistant with id: %s", new_assistant.id)
+        manifest.set_resources(assistant_id=new_assistant.id)
+        return new_assistant.id
+
+    # Downloaded bodies wait in the stage buffer for an upload worker; the budget
+    # bounds them by bytes, since a buffer of 64 large files can be most of a gigabyte.
+    budget = ByteBudget(BUILD_INFLIGHT_BYTES)
+    # Set when the build ends early, so the stages feeding a failed one stop too
+    abort = threading.Event()
+    # Vendored copies, near copies and generated files are not uploaded (first copy wins)
+    dedup = Deduplicator()
+    # Decisions made under other dedup settings don't carry over: attached files are read
+    # again (so ones now skipped get detached) and earlier skips are not repeated.
+    settings_changed = manifest.data.get("dedup_settings") != dedup.settings
+    recheck_attached = records is None and dedup.checks_content and settings_changed
+    reused = [0]
+    reused_lock = threading.Lock()
+
+    # Each file's FileResult travels through the stages; files that end early are reported on the spot.
+    def download_stage(file_info):
+        path, sha = file_info.path, file_info.sha
+        earlier = manifest.discovered(path, sha)
+        skip = dedup.claim(path, sha, file_info.size)
+        if not skip and earlier and earlier[0] != DUPLICATE and not settings_changed:
+            # Same blob an earlier build found generated or near-copied; the listing decides exact copies
+            skip = dedup.repeat(earlier[0], path, file_info.size, earlier[1])
+        if skip:
+            manifest.skipped(path, sha, skip, dedup.originals.get(path))
+            report.add(FileResult(file_info, SKIPPED))
+            return None
+        attached = manifest.is_attached(path, sha)
+        if attached and not recheck_attached:
+            report.add(FileResult(file_info, UNCHANGED))
+            return None
+        result = FileResult(file_info)
+        if not attached:
+            if manifest.uploaded_file_id(path, sha):
+                return result, None
+            # The same blob may already be uploaded for another of the tenant's repos (forks, vendored copies)
+            reused_file_id = STORAGE.find_file_id(tenant.id, sha)
+            if reused_file_id:
+                manifest.uploaded(path, reused_file_id)
+                with reused_lock:
+                    reused[0] += 1
+                return result, None
+        budget.acquire(file_info.size)
+        started = time.perf_counter()
+        _, content, error = source.read(file_info)
+        result.timed("download", time.perf_counter() - started)
+        if content is not None:
+            skip = dedup.check(path, content)
+            if skip:
+                manifest.skipped(path, sha, skip, dedup.originals.get(path))
+                content = None
+        if content is None or attached:
+            # An attached file that passes the check again stays as it is
+            budget.release(file_info.size)
+            if content is not None:
+                report.add(FileResult(file_info, UNCHANGED))
+            else:
+                report.add(result.failed("download", error) if error else FileResult(file_info, SKIPPED))
+            return None
+        return result, content
+
+    def discard_download(item):
+        # A downloaded body no upload worker will take
+        result, content = item
+        if content is not None:
+            budget.release(result.record.size)
+
+    def upload_stage(item):
+        result, content = item
+        path, sha = result.record.path, result.record.sha
+        file_id = manifest.uploaded_file_id(path, sha)
+        if file_id is None:
+            started = time.perf_counter()
+            try:
+                file_id, error, result.attempts = upload_content(client, path, content)
+            finally:
+                budget.release(result.record.size)
+                result.timed("upload", time.perf_counter() - started)
             if error:
-                errors.append(error)
-    try:
-        new_assistant = client.beta.assistants.create(
-            name=repo_name,
-            instructions="You are an assistant that helps analyze code repositories and generate project outlines.",
-            model="gpt-4-turbo",
-            tools=[{"type": "file_search"}],
-            tool_resources={"file_search": {"vector_store_ids": [dynamic_vector_store_id]}},
-        )
-        dynamic_assistant_id = new_assistant.id
-        print(f"[DEBUG] Created dynamic assistant with id: {dynamic_assistant_id}")
-    except Exception as e:
-        raise Exception(f"Error creating dynamic assistant: {str(e)}")
-    
+                return result.failed("upload", error)
+            result.bytes_uploaded = len(content)
+            manifest.uploaded(path, file_id)
+        elif content is not None:
+            budget.release(result.record.size)
+        vector_store_id = vector_store_future.result()
+        started = time.perf_counter()
+        error = attach_file(client, vector_store_id, path, file_id)
+        result.timed("attach", time.perf_counter() - started)
+        if error:
+            if content is None:
+                # An id from an earlier attempt or another repo may be gone; upload afresh next time.
+                manifest.uploaded(path, None)
+            return result.failed("attach", error)
+        manifest.attached(path)
+        result.status = ATTACHED
+        return result
+
+    def detach_superseded(vector_store_id) -> int:
+        """
+        Take superseded and pruned uploads out of the store, so retrieval only
+        sees current content. An id still attached for a current file (of this
+        repo, or of another repo sharing the pre-built store) stays. Failures
+        stay queued for the next build.
+        """
+        pending = manifest.pending_detach()
+        if not pending:
+            return 0
+        in_use = set(manifest.attached_file_ids())
+        done, detached = [], 0
+        for file_id in pending:
+            if file_id in in_use or any(
+                (o, r) != manifest.key[1:] and BuildManifest.load(tenant.id, o, r).vector_store_id == vector_store_id
+                for o, r in STORAGE.attached_repos(tenant.id, file_id)
+            ):
+                done.append(file_id)
+            elif detach_file(client, vector_store_id, file_id) is None:
+                done.append(file_id)
+                detached += 1
+        manifest.detached(done)
+        return detached
+
+    source = repo_source(tenant, owner, repo_name)
+    ranking = None
+    pruned = []
+
+    with ThreadPoolExecutor(max_workers=2) as setup, source:
+        vector_store_future = setup.submit(create_vector_store)
+        assistant_future = setup.submit(create_assistant)
+        if records is None:
+            manifest.start()
+        try:
+            if records is not None:
+                # A retry: the files are known, nothing is listed again.
+                discovered = records
+            elif INGEST_TOKEN_BUDGET > 0:
+                # Ranking needs the whole listing, so the crawl finishes before the first download.
+                started = time.perf_counter()
+                discovered, ranking = prioritize(source, INGEST_TOKEN_BUDGET)
+                report.timed("crawl", time.perf_counter() - started)
+            else:
+                discovered = report.timed_iter("crawl", source.iter_files())
+            downloaded = stage(discovered, download_stage, DOWNLOAD_WORKERS, STAGE_BUFFER, stop=abort,
+                               discard=discard_download)
+            for result in stage(downloaded, upload_stage, UPLOAD_WORKERS, STAGE_BUFFER, stop=abort):
+                report.add(result)
+            if records is None and not source.incomplete:
+                # The listing was complete, so files it didn't turn up (or left out) are dropped.
+                pruned = manifest.prune_unseen()
+                if not report.failed():
+                    manifest.checked_with(dedup.settings)
+            dynamic_vector_store_id = vector_store_future.result()
+            dynamic_assistant_id = assistant_future.result()
+        finally:
+            # Wind down workers still downloading (or waiting for budget) if the build ended early
+            abort.set()
+            budget.close()
+            manifest.flush(force=True)
+    detached = detach_superseded(dynamic_vector_store_id)
+    failed = report.failed()
+    errors = [r.error for r in failed]
+    manifest.finish(len(errors))
+    attached_file_ids = manifest.attached_file_ids()
+    summary = report.summary()
+    log.info("Repo %s has %d attached files (%d errors, resumed=%s, reused %d, skipped %s, pruned %d, detached %d, "
+             "peak in-flight %d bytes, bottleneck %s)", repo_name, len(attached_file_ids), len(errors), resumed,
+             reused[0], dedup.skipped or "none", len(pruned), detached, budget.peak, summary["bottleneck"])
+
     return {
         "dynamic_vector_store_id": dynamic_vector_store_id,
         "dynamic_assistant_id": dynamic_assistant_id,
         "attached_file_ids": attached_file_ids,
-        "errors": errors
+        "errors": errors,
+        "deduplicated": dedup.skipped,
+        "ranking": ranking,
+        "resumed": resumed,
+        "reused_uploads": reused[0],
+        "pruned_files": len(pruned),
+        "detached_uploads": detached,
+        "report": summary,
+        "failed_records": [r.record for r in failed],
     }
 
 ###############################################################################
@@ -362,38 +993,720 @@ def create_dynamic_assistant_helper(repo):
 ###############################################################################
 @routes.route("/api/keys", methods=["GET"])
 def check_keys():
+    tenant = tenant_from_request(request)
     return jsonify({
-        "github_api_key": bool(GITHUB_API_KEY),
-        "openai_api_key": bool(OPENAI_API_KEY),
+        "github_api_key": bool(tenant.github_token),
+        "openai_api_key": bool(tenant.openai_api_key),
         "vector_store_id": bool(PREBUILT_VECTOR_STORE_ID),
         "assistant_id": bool(PREBUILT_ASSISTANT_ID),
     })
 
 @routes.route("/api/repos", methods=["GET"])
 def get_github_repos():
-    if not GITHUB_API_KEY:
+    """List repositories for the tenant's owner, or for ?owner= if it is one of the tenant's owners."""
+    import requests
+    tenant = tenant_from_request(request)
+    if not tenant.github_token:
         return jsonify({"error": "GitHub API key not found"}), 403
-    headers = {"Authorization": f"token {GITHUB_API_KEY}"}
-    response = requests.get("https://api.github.com/users/Bykho/repos", headers=headers)
-    if response.status_code != 200:
-        return jsonify({"error": "Failed to fetch repositories"}), response.status_code
-    repos = [{"id": repo["id"], "name": repo["name"], "url": repo["html_url"]} for repo in response.json()]
+    try:
+        repos = list_github_repos(tenant, request.args.get("owner"))
+    except requests.HTTPError as e:
+        return jsonify({"error": "Failed to fetch repositories"}), e.response.status_code
     return jsonify({"repositories": repos})
 
+@routes.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Expose per-stage latency histograms in the Prometheus text format."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@routes.route("/api/builds", methods=["GET"])
+def build_queue():
+    """Queued and running builds per tenant."""
+    return jsonify(BUILD_SCHEDULER.stats())
+
+@routes.route("/api/builds/history", methods=["GET"])
+def build_history():
+    """The tenant's most recent build jobs with their outcome and stats; filter with ?owner= and ?repo=."""
+    tenant = tenant_from_request(request)
+    try:
+        limit = min(int(request.args.get("limit", "20")), 200)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    jobs = STORAGE.list_jobs(tenant.id, request.args.get("owner"), request.args.get("repo"), limit)
+    return jsonify({"jobs": jobs})
+
+@routes.route("/api/admission", methods=["GET"])
+def admission_stats():
+    """Active and queued outline/expand generations against their limits."""
+    return jsonify(ADMISSION.stats())
+
+@routes.route("/api/warmup/run", methods=["POST"])
+def run_warmup():
+    """
+    Run one warm-up cycle for the tenant now, without waiting for the service
+    to be idle. Pass ?dry_run=1 to only list the repos that would be warmed.
+    """
+    tenant = tenant_from_request(request)
+    if not tenant.github_token or not tenant.openai_api_key:
+        return jsonify({"error": "Missing API keys"}), 403
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    return jsonify(WARMER.run([tenant], dry_run=dry_run, require_idle=False))
+
+@routes.route("/api/reaper/run", methods=["POST"])
+def run_reaper():
+    """
+    Run one garbage-collection sweep over orphaned files, vector stores and assistants.
+    Pass ?dry_run=1 to only report what would be deleted.
+    """
+    tenant = tenant_from_request(request)
+    if not tenant.openai_api_key:
+        return jsonify({"error": "Missing API keys"}), 403
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    try:
+        reaper = reaper_for_tenant(tenant, (PREBUILT_VECTOR_STORE_ID, PREBUILT_ASSISTANT_ID),
+                                   load_tenants().values())
+        return jsonify(reaper.run(dry_run=dry_run))
+    except Exception as e:
+        log.error("Reaper sweep failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@routes.route("/api/upload_to_vs", methods=["POST"])
+def upload_to_vs():
+    """
+    Pre-built Build endpoint: uploads the repository's files into the pre-built
+    vector store (VECTOR_STORE_ID). Runs through the same scheduler, pipeline
+    and manifest as dynamic builds, so a repeated upload only sends what changed.
+    """
+    tenant = tenant_from_request(request)
+    if not tenant.github_token or not tenant.openai_api_key or not PREBUILT_VECTOR_STORE_ID:
+        return jsonify({"error": "Missing API keys or IDs"}), 403
+    data = request.get_json()
+    repo = data.get("repo")
+    if not repo or "name" not in repo:
+        return jsonify({"error": "Invalid repository data"}), 400
+
+    try:
+        result = schedule_build(repo, tenant, prebuilt=True).result()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not result["attached_file_ids"] and not result["errors"]:
+        return jsonify({"message": "No supported files uploaded."})
+    return jsonify({
+        "message": "Finished attempting to upload & attach files.",
+        "attached_file_ids": result["attached_file_ids"],
+        "errors": result["errors"],
+        "deduplicated": result["deduplicated"],
+        "ranking": result["ranking"],
+        "report": result["report"],
+        "retry_scheduled": result["retry_scheduled"],
+    })
+
+@routes.route("/api/generate_outline", methods=["POST"])
+def generate_outline():
+    """
+    Pre-built Generate Outline endpoint: streams an outline from the pre-built
+    assistant (ASSISTANT_ID). Same streams, admission control and "mode":
+    "sections" as /api/dynamic_generate_outline.
+    """
+    tenant = tenant_from_request(request)
+    if not tenant.openai_api_key or not PREBUILT_ASSISTANT_ID:
+        return jsonify({"error": "Missing API keys or IDs"}), 403
+    data = request.get_json()
+    repo = data.get("repo")
+    if not repo or "name" not in repo:
+        return jsonify({"error": "Invalid repository data"}), 400
+    repo_name = repo["name"]
+    owner = tenant.resolve_owner(repo.get("owner"))
+
+    ticket = admit_generation(tenant, owner, prebuilt_manifest_name(repo_name))
+    if ticket is None:
+        return busy_response()
+    client = tenant.openai_client()
+    if data.get("mode") == "sections":
+        stream = start_sectioned_outline(
+            client, tenant, ticket, "generate_outline_sections", PREBUILT_ASSISTANT_ID, repo_name,
+            titles_instructions=PREBUILT_OUTLINE_TITLES_INSTRUCTIONS,
+            section_instructions=prebuilt_outline_section_instructions,
+            section_count=PREBUILT_OUTLINE_SECTION_COUNT,
+        )
+    else:
+        stream = start_generation(
+            client, tenant, ticket, "generate_outline", PREBUILT_ASSISTANT_ID,
+            content=outline_prompt(repo_name),
+            instructions=PREBUILT_OUTLINE_INSTRUCTIONS,
+        )
+    return sse_response(stream)
+
+@routes.route("/api/expand_topic", methods=["POST"])
+def expand_topic():
+    """Pre-built Expand Topic endpoint: streams the pre-built assistant's expansion of a topic."""
+    tenant = tenant_from_request(request)
+    if not tenant.openai_api_key or not PREBUILT_ASSISTANT_ID:
+        return jsonify({"error": "Missing API keys or IDs"}), 403
+    data = request.get_json()
+    topic = data.get("topic")
+    if not topic:
+        return jsonify({"error": "No topic provided"}), 400
+    repo = data.get("repo") or {}
+    # The topic alone is enough here; without a repo, concurrent expansions share one admission key.
+    owner = tenant.resolve_owner(repo.get("owner"))
+    admission_key = prebuilt_manifest_name(repo.get("name", ""))
+
+    ticket = admit_generation(tenant, owner, admission_key)
+    if ticket is None:
+        return busy_response()
+    stream = start_generation(
+        tenant.openai_client(), tenant, ticket, "expand_topic", PREBUILT_ASSISTANT_ID,
+        content=f"Expand on the following topic: {topic}",
+        instructions=PREBUILT_EXPAND_INSTRUCTIONS,
+    )
+    return sse_response(stream)
+
 ############# Layer 1 ##############
-class OutlineEventHandler(AssistantEventHandler):    
-    def __init__(self):
-        super().__init__()
-        self.queue = []
-    
-    @override
-    def on_text_created(self, text) -> None:
-        self.queue.append(f"data: {json.dumps({'content': '\\n'})}\n\n")
-          
-    @override
-    def on_text_delta(self, delta, snapshot):
-        if delta.value:
-            self.queue.append(f"data: {json.dumps({'content': delta.value})}\n\n")
+@lru_cache(maxsize=None)
+def outline_handler_class():
+    """
+    The assistant event handler class, defined on first use: subclassing
+    AssistantEventHandler means importing openai, which dominates import time.
+    """
+    from openai import AssistantEventHandler
+    from typing_extensions import override
+
+    class OutlineEventHandler(AssistantEventHandler):
+        def __init__(self, stream, route: str = "", on_cancelled=None):
+            super().__init__()
+            self.stream = stream
+            self.route = route
+            self.started_at = time.perf_counter()
+            self.first_token_at = None
+            # Set by RunGroup.cancel from another thread. The worker keeps reading until
+            # upstream ends the cancelled run, so the response is closed by its own thread.
+            self.cancelled = False
+            self.on_cancelled = on_cancelled
+
+        @override
+        def on_event(self, event) -> None:
+            if self.cancelled and self.on_cancelled is not None:
+                # The run may have been created after the cancel; cancel it now that its id is known.
+                self.on_cancelled(self)
+
+        @override
+        def on_text_created(self, text) -> None:
+            if self.cancelled:
+                return
+            self.stream.publish("\n")
+
+        @override
+        def on_text_delta(self, delta, snapshot):
+            if self.cancelled:
+                return
+            if delta.value:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                    observe("time_to_first_token", self.first_token_at - self.started_at, route=self.route)
+                self.stream.publish(delta.value)
+
+    return OutlineEventHandler
+
+
+OUTLINE_INSTRUCTIONS = """
+Generate a concise, well-structured outline for an engineering portfolio entry based solely on the repository's code.
+The repository's code is in the dynamic vector store attached to you.
+Follow this exact format:
+1. Provide 5 sections, each starting with a header: ---SECTION_TITLE: [Title]
+2. Under each header, list markdown bullet points.
+3. One of the sections should have the title "TL:DR" . in this section, give a super concise description of this project that explainswhy I (the creator of this project) am a fantastic engineer. no bullet points in this section.
+
+Do not include any extra formatting.
+"""
+
+def outline_prompt(repo_name: str) -> str:
+    return f"Generate an outline for the repository: {repo_name} that is in the vector store attached to you"
+
+# The pre-built assistant's store holds many repos, so its outlines are shorter and leave out the TL:DR
+PREBUILT_OUTLINE_INSTRUCTIONS = """
+Generate a concise, well-structured outline for an engineering portfolio entry based solely on the repository's code.
+The vector store attached to you contains all the relevant code of this project.
+Your output MUST follow these exact rules and nothing else:
+1. Provide 4 sections, each starting with a header line in the exact format: ---SECTION_TITLE: [Title]
+2. The section content MUST be in markdown format, written as quick descriptive bullet points.
+
+Do not include any additional text formatting outside of this structure. Do not include the newline escape sequence in your response.
+"""
+
+PREBUILT_EXPAND_INSTRUCTIONS = """
+Expand on the following subtopic as part of a larger project.
+Leverage content from a shared vector store to provide context on how this section relates to the overall project.
+Provide detailed, well-structured content with technical details and clear explanations. Only use bullet points where absolutely necessary.
+Emphasize the connection between this subtopic and the main project goals, using relevant information from the vector store to enrich the discussion.
+"""
+
+
+OUTLINE_SECTION_COUNT = 5
+
+OUTLINE_TITLES_INSTRUCTIONS = f"""
+Plan an outline for an engineering portfolio entry based solely on the repository's code.
+The repository's code is in the dynamic vector store attached to you.
+Only list the section titles: exactly {OUTLINE_SECTION_COUNT} lines, each formatted as ---SECTION_TITLE: [Title]
+One of the sections should have the title "TL:DR".
+Do not write anything else.
+"""
+
+_SECTION_TITLE = re.compile(r"^\s*-*\s*SECTION_TITLE:\s*\[?(.+?)\]?\s*$", re.MULTILINE)
+
+
+def outline_section_instructions(titles, title: str) -> str:
+    """Instructions for writing the body of one section of a planned outline."""
+    if title.strip().upper().replace(" ", "") in ("TL:DR", "TLDR", "TL;DR"):
+        body = ("give a super concise description of this project that explains why I (the creator of this project) "
+                "am a fantastic engineer. no bullet points in this section.")
+    else:
+        body = "list markdown bullet points."
+    return f"""
+Write one section of an outline for an engineering portfolio entry based solely on the repository's code.
+The repository's code is in the dynamic vector store attached to you.
+The outline's sections are: {"; ".join(titles)}.
+Write only the body of the section titled "{title}", without its header: {body}
+
+Do not include any extra formatting.
+"""
+
+
+# The sectioned counterparts of PREBUILT_OUTLINE_INSTRUCTIONS: 4 sections of quick bullet points, no TL:DR
+PREBUILT_OUTLINE_SECTION_COUNT = 4
+
+PREBUILT_OUTLINE_TITLES_INSTRUCTIONS = f"""
+Plan a concise outline for an engineering portfolio entry based solely on the repository's code.
+The vector store attached to you contains all the relevant code of this project.
+Only list the section titles: exactly {PREBUILT_OUTLINE_SECTION_COUNT} lines, each formatted as ---SECTION_TITLE: [Title]
+Do not write anything else.
+"""
+
+
+def prebuilt_outline_section_instructions(titles, title: str) -> str:
+    """Instructions for writing the body of one section of a pre-built assistant's planned outline."""
+    return f"""
+Write one section of a concise outline for an engineering portfolio entry based solely on the repository's code.
+The vector store attached to you contains all the relevant code of this project.
+The outline's sections are: {"; ".join(titles)}.
+Write only the body of the section titled "{title}", without its header, as quick descriptive markdown bullet points.
+
+Do not include any extra formatting.
+"""
+
+
+def parse_section_titles(text: str, count: int = OUTLINE_SECTION_COUNT) -> list:
+    """Up to `count` section titles from a ---SECTION_TITLE: listing, falling back to one title per non-empty line."""
+    titles = [t.strip() for t in _SECTION_TITLE.findall(text) if t.strip()]
+    if not titles:
+        titles = [line.strip(" -*#\t") for line in text.splitlines() if line.strip(" -*#\t")]
+    return titles[:count]
+
+
+def split_outline(text: str) -> list:
+    """(title, body) pairs of a complete ---SECTION_TITLE: outline."""
+    sections = []
+    for block in text.split("---SECTION_TITLE:")[1:]:
+        title, _, body = block.partition("\n")
+        sections.append((title.strip().strip("[]"), body.strip()))
+    return sections
+
+
+def publish_outline_sections(stream, sections) -> None:
+    """Publish a finished outline the way a sectioned generation ends: titles first, then each section done."""
+    stream.publish({"outline_titles": [title for title, _ in sections]})
+    for index, (title, text) in enumerate(sections):
+        stream.publish({"section_done": {"index": index, "title": title, "text": text}})
+
+
+class SectionSink:
+    """
+    Where one section's run writes: every text delta goes out on the outline
+    stream as {"section_delta": {"index", "text"}}, and the section's text is
+    kept for its section_done event.
+    """
+
+    def __init__(self, stream, index: int):
+        self.stream = stream
+        self.index = index
+        self.parts = []
+
+    def publish(self, payload) -> int:
+        self.parts.append(payload)
+        return self.stream.publish({"section_delta": {"index": self.index, "text": payload}})
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+# Longest silence tolerated on a run's event stream; also bounds how long a cancelled run's worker can linger
+RUN_STREAM_READ_TIMEOUT_SECONDS = float(os.getenv("RUN_STREAM_READ_TIMEOUT_SECONDS", "60"))
+
+FINISHED_RUN_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete")
+FAILED_RUN_STATUSES = ("failed", "cancelled", "expired", "incomplete")
+
+
+class RunGroup:
+    """
+    The assistant runs behind one generation stream. Each run gets its own
+    event handler; runs beyond the stream's first can take admission tickets
+    of their own with `admit`. Cancelling the group cancels every run
+    upstream and gives back those tickets.
+    """
+
+    def __init__(self, client, assistant_id: str, route: str):
+        self.client = client
+        self.assistant_id = assistant_id
+        self.route = route
+        self.handlers = []
+        self.tickets = []
+        self._cancelled = False
+        self._cancel_requested = set()
+        self._lock = threading.Lock()
+
+    def admit(self, key):
+        """A ticket for one more run on `key`, given back if the group is cancelled; None if the queue is full."""
+        ticket = ADMISSION.enqueue(key)
+        if ticket is None:
+            return None
+        with self._lock:
+            self.tickets.append(ticket)
+            cancelled = self._cancelled
+        if cancelled:
+            ADMISSION.release(ticket)
+        return ticket
+
+    def run(self, sink, content: str, instructions: str, cancelled) -> None:
+        """Create a thread for `content` and stream one run into `sink` until it finishes."""
+        handler = outline_handler_class()(sink, route=self.route, on_cancelled=self._cancel_upstream)
+        with self._lock:
+            self.handlers.append(handler)
+        with span("thread_creation"):
+            thread = self.client.beta.threads.create()
+            self.client.beta.threads.messages.create(thread_id=thread.id, role="user", content=content)
+        log.debug("Created thread %s for %s", thread.id, self.route)
+        if cancelled():
+            return
+        with self.client.beta.threads.runs.stream(
+            thread_id=thread.id,
+            assistant_id=self.assistant_id,
+            instructions=instructions,
+            event_handler=handler,
+            timeout=RUN_STREAM_READ_TIMEOUT_SECONDS,
+        ) as run_stream:
+            if not cancelled():
+                run_stream.until_done()
+        run = handler.current_run
+        # A run that fails upstream still ends the event stream cleanly; don't pass its partial text off as complete.
+        if run is not None and run.status in FAILED_RUN_STATUSES and not cancelled():
+            error = getattr(run, "last_error", None)
+            raise RuntimeError(f"Assistant run {run.status}: {error.message if error else 'no details'}")
+
+    def cancel(self) -> None:
+        """
+        Cancel every run upstream. Workers stop publishing and read on until
+        upstream ends the stream with the cancelled run, which frees them within
+        a round trip; RUN_STREAM_READ_TIMEOUT_SECONDS bounds the wait if it never does.
+        """
+        with self._lock:
+            self._cancelled = True
+            handlers = list(self.handlers)
+            tickets = list(self.tickets)
+        for ticket in tickets:
+            ADMISSION.release(ticket)
+        for handler in handlers:
+            handler.cancelled = True
+            self._cancel_upstream(handler)
+
+    def _cancel_upstream(self, handler) -> None:
+        run = handler.current_run
+        if run is None or run.status in FINISHED_RUN_STATUSES:
+            return
+        with self._lock:
+            if run.id in self._cancel_requested:
+                return
+            self._cancel_requested.add(run.id)
+        try:
+            self.client.beta.threads.runs.cancel(run.id, thread_id=run.thread_id)
+        except Exception as e:
+            log.debug("Cancelling run %s failed: %s", run.id, e)
+
+
+def launch_generation(stream, ticket, runs: RunGroup, body, notices=()):
+    """
+    Run `body()` in a background thread once the admission `ticket` is
+    granted, publishing the queue position while it waits. `notices` (e.g. a
+    build report) are published first, so they always precede the output. An
+    abandoned stream releases the ticket and cancels every run in `runs`.
+    """
+    route = runs.route
+    for notice in notices:
+        stream.publish(notice)
+
+    def cancel():
+        ADMISSION.release(ticket)
+        runs.cancel()
+
+    stream.on_abandon(cancel)
+    started_at = time.perf_counter()
+
+    def run():
+        try:
+            if not ADMISSION.wait(ticket, on_position=lambda position: stream.publish({"queue_position": position})):
+                if not stream.cancelled:
+                    stream.publish({"error": "Server busy: timed out waiting for a generation slot"})
+                return
+            body()
+        except Exception as e:
+            if stream.cancelled:
+                log.debug("%s stream %s stopped after cancel: %s", route, stream.id, e)
+            else:
+                log.error("Error in %s stream: %s", route, e)
+                stream.publish({"error": str(e)})
+        finally:
+            ADMISSION.release(ticket)
+            observe("stream_total", time.perf_counter() - started_at, route=route)
+            stream.close()
+
+    threading.Thread(target=run, name=f"generation-{stream.id[:8]}", daemon=True).start()
+    return stream
+
+
+def start_generation(client, tenant, ticket, route: str, assistant_id: str, content: str, instructions: str,
+                     notices=()):
+    """
+    Start an assistant run in a background thread, publishing its output to a
+    new GenerationStream. The run waits for its admission `ticket` first,
+    publishing its queue position while it waits. The run is tied to the
+    stream, not to the HTTP response, so it survives a dropped connection and
+    the client can pick it up again from /api/streams/<id>. If nobody
+    reconnects within the grace period the run is cancelled upstream and the
+    thread exits.
+    """
+    stream = STREAMS.create(route=route, tenant_id=tenant.id)
+    runs = RunGroup(client, assistant_id, route)
+    return launch_generation(
+        stream, ticket, runs,
+        lambda: runs.run(stream, content, instructions, lambda: stream.cancelled),
+        notices,
+    )
+
+
+def start_sectioned_outline(client, tenant, ticket, route: str, assistant_id: str, repo_name: str,
+                            titles_instructions: str = OUTLINE_TITLES_INSTRUCTIONS,
+                            section_instructions=outline_section_instructions,
+                            section_count: int = OUTLINE_SECTION_COUNT, notices=()):
+    """
+    Generate an outline section by section. A short first run plans up to
+    `section_count` section titles with `titles_instructions`, published as
+    one {"outline_titles": [...]} event; then every section body is
+    generated by its own run, with `section_instructions(titles, title)`,
+    all concurrently. Each run's text streams as {"section_delta": {"index",
+    "text"}} events (merged per section on the wire, see
+    streams.render_events), and {"section_done": {"index", "title", "text"}} (or
+    "error") follows the moment the section is complete, so the client can
+    start expanding it while the others are still being written. The
+    defaults are the dynamic assistant's prompts.
+
+    Every section run counts against admission: the stream's `ticket` covers
+    the titles run and then the first section, and is given back when that
+    section is done; each other section waits for a ticket of its own on the
+    same repo. The runs share the resumable stream and cancellation of
+    start_generation.
+    """
+    stream = STREAMS.create(route=route, tenant_id=tenant.id)
+    runs = RunGroup(client, assistant_id, route)
+    content = outline_prompt(repo_name)
+
+    def cancelled():
+        return stream.cancelled
+
+    def generate(sink, instructions: str) -> str:
+        runs.run(sink, content, instructions, cancelled)
+        return sink.text().strip()
+
+    def section(index: int, title: str, titles) -> None:
+        section_ticket = ticket if index == 0 else runs.admit(ticket.key)
+        try:
+            if section_ticket is None or not ADMISSION.wait(section_ticket):
+                raise RuntimeError("Server busy: timed out waiting for a generation slot")
+            text = generate(SectionSink(stream, index), section_instructions(titles, title))
+            event = {"index": index, "title": title, "text": text}
+        except Exception as e:
+            if stream.cancelled:
+                return
+            log.error("Error generating outline section %r: %s", title, e)
+            event = {"index": index, "title": title, "error": str(e)}
+        finally:
+            if section_ticket is not None:
+                ADMISSION.release(section_ticket)
+        if not stream.cancelled:
+            stream.publish({"section_done": event})
+
+    def body():
+        with span("outline_titles"):
+            # A private, unregistered buffer: only the parsed titles go out on the stream.
+            titles = parse_section_titles(
+                generate(GenerationStream(f"{stream.id}:titles", route), titles_instructions), section_count)
+        if stream.cancelled:
+            return
+        if not titles:
+            raise RuntimeError("The assistant returned no section titles")
+        stream.publish({"outline_titles": titles})
+        workers = [
+            threading.Thread(target=section, args=(index, title, titles), daemon=True,
+                             name=f"generation-{stream.id[:8]}-{index}")
+            for index, title in enumerate(titles)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    return launch_generation(stream, ticket, runs, body, notices)
+
+
+def admit_generation(tenant, owner, repo_name):
+    """Take an admission ticket for a generation on this repo; None means answer 429."""
+    return ADMISSION.enqueue((tenant.id, owner, repo_name))
+
+
+def busy_response():
+    response = jsonify({"error": "Too many generations in progress, please retry shortly."})
+    response.headers["Retry-After"] = str(ADMISSION_RETRY_AFTER)
+    return response, 429
+
+
+def sse_response(stream, last_event_id: int = 0):
+    """
+    Stream a generation to the client. Framing is negotiated with the
+    X-Stream-Framing header (or ?framing=): "json" (default) or "compact".
+    The body is gzip/brotli compressed when the client's Accept-Encoding allows.
+    """
+    framing = (request.headers.get("X-Stream-Framing") or request.args.get("framing") or FRAMING_JSON).lower()
+    if framing not in (FRAMING_JSON, FRAMING_COMPACT):
+        framing = FRAMING_JSON
+    headers = {
+        "Cache-Control": "no-cache, no-transform",
+        "Content-Type": "text/event-stream",
+        "Connection": "keep-alive",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": "X-Stream-Id, X-Stream-Framing",
+        "X-Stream-Id": stream.id,
+        "X-Stream-Framing": framing,
+        "X-Accel-Buffering": "no",
+    }
+    body = stream.frames(last_event_id, framing=framing)
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding:
+        body = compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return Response(stream_with_context(body), content_type="text/event-stream", headers=headers)
+
+
+def warm_repo(tenant, repo):
+    """
+    Warm-up for one repo: build (or refresh) its vector store and assistant,
+    generate an outline and keep it in the build manifest for the next
+    dynamic_generate_outline request.
+    """
+    owner = tenant.resolve_owner(repo.get("owner"))
+    result = schedule_build(repo, tenant).result()
+    if not result["dynamic_assistant_id"]:
+        raise RuntimeError("build produced no assistant")
+    ticket = admit_generation(tenant, owner, repo["name"])
+    if ticket is None:
+        raise RuntimeError("no generation capacity")
+    stream = start_generation(
+        tenant.openai_client(), tenant, ticket, "warmup_outline", result["dynamic_assistant_id"],
+        content=outline_prompt(repo["name"]),
+        instructions=OUTLINE_INSTRUCTIONS,
+    )
+    stream.wait()
+    if stream.error() or stream.cancelled:
+        raise RuntimeError(stream.error() or "outline run cancelled")
+    with _build_lock((tenant.id, owner, repo["name"])):
+        BuildManifest.load(tenant.id, owner, repo["name"]).record_outline(stream.text(), repo.get("pushed_at"))
+
+
+def take_warm_outline(tenant, owner, repo_name):
+    """Pop the pre-generated outline for a repo, unless a build is rewriting its manifest right now."""
+    lock = _build_lock((tenant.id, owner, repo_name))
+    if not lock.acquire(blocking=False):
+        return None
+    try:
+        return BuildManifest.load(tenant.id, owner, repo_name).take_outline()
+    finally:
+        lock.release()
+
+
+def local_load() -> dict:
+    """Generations and builds in flight in this process."""
+    admission = ADMISSION.stats()
+    builds = BUILD_SCHEDULER.stats().values()
+    return {"generations": admission["active"] + admission["waiting"],
+            "builds": sum(q["queued"] + q["running"] for q in builds)}
+
+def service_idle() -> bool:
+    """Idle when neither this process nor any worker reporting to the shared cache has work in flight."""
+    loads = [local_load()] + SHARED_CACHE.values("load")
+    return not any(load["generations"] or load["builds"] for load in loads)
+
+_load_reporter = None
+
+def start_load_reports(interval: float = LOAD_REPORT_SECONDS):
+    """Publish this process's load to the shared cache every `interval` seconds; a no-op when 0."""
+    global _load_reporter
+    if interval <= 0 or _load_reporter is not None:
+        return None
+
+    def loop():
+        while True:
+            SHARED_CACHE.set("load", str(os.getpid()), local_load(), interval * 3)
+            time.sleep(interval)
+
+    _load_reporter = threading.Thread(target=loop, name="load-report", daemon=True)
+    _load_reporter.start()
+    return _load_reporter
+
+_background_lock = None
+
+def _take_background_lock() -> bool:
+    """Hold an exclusive lock file for the life of the process; False if another process holds it."""
+    global _background_lock
+    if _background_lock is not None:
+        return True
+    import fcntl
+    os.makedirs(BUILD_STATE_DIR, exist_ok=True)
+    fh = open(os.path.join(BUILD_STATE_DIR, "background.lock"), "w")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return False
+    _background_lock = fh
+    return True
+
+def start_background_tasks() -> bool:
+    """
+    Start this process's load reports and, in the one process on the host
+    that holds the background lock, the reaper, warm-up and shared cache
+    purge loops. The lock is released when its process exits, so a
+    replacement worker takes the loops over. Returns whether they run here.
+    """
+    start_load_reports()
+    if not _take_background_lock():
+        return False
+    tenants = lambda: list(load_tenants().values())
+    start_reaper(tenants, (PREBUILT_VECTOR_STORE_ID, PREBUILT_ASSISTANT_ID))
+    start_warmup(WARMER, tenants)
+    start_cache_purge(SHARED_CACHE)
+    log.info("Background loops run in process %d", os.getpid())
+    return True
+
+
+WARMER = Warmer(list_github_repos, warm_repo, service_idle)
 
 
 ###############################################################################
@@ -407,8 +1720,12 @@ def dynamic_upload_to_vs():
     - Uploads the repository's files into that new vector store.
     - Creates a new assistant linked to the new vector store.
     The assistant is named after the repository so that later lookups are simple.
+    Builds are queued per tenant on the shared build scheduler. The answer
+    includes the build's report: file outcomes, time per stage and the files
+    that failed, which are retried in the background.
     """
-    if not GITHUB_API_KEY or not OPENAI_API_KEY:
+    tenant = tenant_from_request(request)
+    if not tenant.github_token or not tenant.openai_api_key:
         return jsonify({"error": "Missing API keys"}), 403
     data = request.get_json()
     repo = data.get("repo")
@@ -416,13 +1733,18 @@ def dynamic_upload_to_vs():
         return jsonify({"error": "Invalid repository data"}), 400
     
     try:
-        result = create_dynamic_assistant_helper(repo)
+        result = schedule_build(repo, tenant).result()
         return jsonify({
             "message": "Dynamic upload complete.",
             "dynamic_vector_store_id": result["dynamic_vector_store_id"],
             "dynamic_assistant_id": result["dynamic_assistant_id"],
             "attached_file_ids": result["attached_file_ids"],
-            "errors": result["errors"]
+            "errors": result["errors"],
+            "deduplicated": result["deduplicated"],
+            "ranking": result["ranking"],
+            "pruned_files": result["pruned_files"],
+            "report": result["report"],
+            "retry_scheduled": result["retry_scheduled"],
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -433,211 +1755,166 @@ def dynamic_generate_outline():
     Dynamic Generate Outline endpoint:
     - Looks up the dynamic assistant by repository name.
     - If not found, automatically creates a new vector store and assistant.
-    - Streams an outline generated by the dynamic assistant.
+    - Streams an outline generated by the dynamic assistant. Events carry SSE ids;
+      a dropped client can resume from /api/streams/<stream_id>.
+    - If the warm-up already generated an outline for this repo, it is streamed
+      straight from the build manifest (once); pass "fresh": true to skip it.
+    - "mode": "sections" plans the section titles first and streams each section
+      as soon as it is written (see start_sectioned_outline).
+    - A build started here that indexed only part of the repo is served anyway;
+      a {"build": ...} event says how many files are missing while they are
+      retried. A build that indexed nothing is an error.
     """
-    if not OPENAI_API_KEY:
+    tenant = tenant_from_request(request)
+    if not tenant.openai_api_key:
         return jsonify({"error": "Missing API keys"}), 403
     data = request.get_json()
     repo = data.get("repo")
     if not repo or "name" not in repo:
         return jsonify({"error": "Invalid repository data"}), 400
     repo_name = repo["name"]
-    print(f"[DEBUG] Starting dynamic outline generation for repo: {repo_name}")
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    dynamic_assistant = find_assistant_by_name(client, repo_name)
-    if not dynamic_assistant:
-        print(f"[DEBUG] Dynamic assistant not found for repo: {repo_name}. Creating one...")
+    owner = tenant.resolve_owner(repo.get("owner"))
+    sectioned = data.get("mode") == "sections"
+    log.info("Starting dynamic outline generation for repo: %s/%s", owner, repo_name)
+    if not data.get("fresh"):
+        outline = take_warm_outline(tenant, owner, repo_name)
+        if outline:
+            OUTLINE_CACHE.inc(result="hit")
+            stream = STREAMS.create(route="dynamic_generate_outline", tenant_id=tenant.id)
+            sections = split_outline(outline) if sectioned else None
+            if sections:
+                publish_outline_sections(stream, sections)
+            else:
+                stream.publish(outline)
+            stream.close()
+            return sse_response(stream)
+    OUTLINE_CACHE.inc(result="miss")
+    client = tenant.openai_client()
+    build_notice = None
+    dynamic_assistant_id = find_dynamic_assistant_id(tenant, owner, repo_name)
+    if not dynamic_assistant_id:
+        log.info("Dynamic assistant not found for repo: %s. Creating one...", repo_name)
         try:
-            create_dynamic_assistant_helper(repo)
+            result = schedule_build(repo, tenant).result()
         except Exception as e:
             return jsonify({"error": str(e)}), 500
-        dynamic_assistant = find_assistant_by_name(client, repo_name)
-        if not dynamic_assistant:
+        dynamic_assistant_id = result["dynamic_assistant_id"]
+        if not dynamic_assistant_id:
             return jsonify({"error": "Failed to create dynamic assistant."}), 500
-    dynamic_assistant_id = dynamic_assistant.id
-    print(f"[DEBUG] Retrieved dynamic assistant with id: {dynamic_assistant_id}")
+        if not result["attached_file_ids"] and result["errors"]:
+            return jsonify({"error": "No files of the repository could be indexed.",
+                            "report": result["report"]}), 500
+        if result["errors"]:
+            build_notice = {
+                "files_attached": len(result["attached_file_ids"]),
+                "files_failed": len(result["errors"]),
+                "retry_scheduled": result["retry_scheduled"],
+            }
+    log.debug("Retrieved dynamic assistant with id: %s", dynamic_assistant_id)
 
-    def event_stream():
-        try:
-            thread = client.beta.threads.create()
-            print(f"[DEBUG] Created thread: {thread.id}")
-            client.beta.threads.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=f"Generate an outline for the repository: {repo_name} that is in the vector store attached to you"
-            )
-            handler = OutlineEventHandler()
-            print("[DEBUG] Handler created for dynamic outline")
-            stream_done = False
-            def process_stream():
-                nonlocal stream_done
-                try:
-                    with client.beta.threads.runs.stream(
-                        thread_id=thread.id,
-                        assistant_id=dynamic_assistant_id,
-                        instructions="""
-                        Generate a concise, well-structured outline for an engineering portfolio entry based solely on the repository's code.
-                        The repository's code is in the dynamic vector store attached to you.
-                        Follow this exact format:
-                        1. Provide 5 sections, each starting with a header: ---SECTION_TITLE: [Title]
-                        2. Under each header, list markdown bullet points.
-                        3. One of the sections should have the title "TL:DR" . in this section, give a super concise description of this project that explainswhy I (the creator of this project) am a fantastic engineer. no bullet points in this section.
-
-                        Do not include any extra formatting.
-                        """,
-                        event_handler=handler
-                    ) as stream:
-                        print("[DEBUG] Dynamic stream started")
-                        stream.until_done()
-                        print("[DEBUG] Dynamic stream completed")
-                except Exception as e:
-                    handler.queue.append(f"data: {json.dumps({'error': str(e)})}\n\n")
-                finally:
-                    stream_done = True
-            import threading
-            stream_thread = threading.Thread(target=process_stream)
-            stream_thread.start()
-            while True:
-                if handler.queue:
-                    yield handler.queue.pop(0)
-                elif stream_done:
-                    break
-                else:
-                    time.sleep(0.1)
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    return Response(
-        stream_with_context(event_stream()),
-        content_type='text/event-stream',
-        headers={
-            'Cache-Control': 'no-cache',
-            'Content-Type': 'text/event-stream',
-            'Connection': 'keep-alive',
-            'Access-Control-Allow-Origin': '*'
-        }
-    )
+    ticket = admit_generation(tenant, owner, repo_name)
+    if ticket is None:
+        return busy_response()
+    notices = [{"build": build_notice}] if build_notice else []
+    if sectioned:
+        stream = start_sectioned_outline(
+            client, tenant, ticket, "dynamic_generate_outline_sections", dynamic_assistant_id, repo_name,
+            notices=notices,
+        )
+    else:
+        stream = start_generation(
+            client, tenant, ticket, "dynamic_generate_outline", dynamic_assistant_id,
+            content=outline_prompt(repo_name),
+            instructions=OUTLINE_INSTRUCTIONS,
+            notices=notices,
+        )
+    return sse_response(stream)
 
 @routes.route("/api/dynamic_expand_topic", methods=["POST"])
 def dynamic_expand_topic():
     """
     Dynamic Expand Topic endpoint:
     - Uses the dynamic assistant (looked up by repository name) to expand on a given topic.
-    - Streams the expanded content back to the client.
+    - Streams the expanded content back to the client (resumable like the outline).
     """
-    if not OPENAI_API_KEY:
+    tenant = tenant_from_request(request)
+    if not tenant.openai_api_key:
         return jsonify({"error": "Missing API keys"}), 403
     
-    # Log request data
-    print(f"[DEBUG] Received request to /api/dynamic_expand_topic")
-    
     try:
         data = request.get_json()
-        print(f"[DEBUG] Request data: {data}")
+        log.debug("Request data: %s", data)
         
         topic = data.get("topic")
         repo = data.get("repo")
         
         # Validate request data with detailed logging
         if not topic:
-            print(f"[ERROR] Missing topic in request data")
+            log.warning("Missing topic in request data")
             return jsonify({"error": "Missing topic in request data"}), 400
         if not repo:
-            print(f"[ERROR] Missing repo in request data")
+            log.warning("Missing repo in request data")
             return jsonify({"error": "Missing repo in request data"}), 400
         if "name" not in repo:
-            print(f"[ERROR] Missing repo name in request data. Repo data: {repo}")
+            log.warning("Missing repo name in request data. Repo data: %s", repo)
             return jsonify({"error": "Missing repo name in request data"}), 400
         
         repo_name = repo["name"]
-        print(f"[DEBUG] Starting dynamic expand topic for repo: {repo_name} and topic: {topic}")
+        owner = tenant.resolve_owner(repo.get("owner"))
+        log.info("Starting dynamic expand topic for repo: %s/%s", owner, repo_name)
         
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        client = tenant.openai_client()
         try:
-            dynamic_assistant = find_assistant_by_name(client, repo_name)
-            if not dynamic_assistant:
-                print(f"[ERROR] Dynamic assistant not found for repo: {repo_name}")
+            dynamic_assistant_id = find_dynamic_assistant_id(tenant, owner, repo_name)
+            if not dynamic_assistant_id:
+                log.warning("Dynamic assistant not found for repo: %s", repo_name)
                 return jsonify({"error": "Dynamic assistant not found. Please build the entry first."}), 404
             
-            dynamic_assistant_id = dynamic_assistant.id
-            print(f"[DEBUG] Retrieved dynamic assistant with id: {dynamic_assistant_id}")
+            log.debug("Retrieved dynamic assistant with id: %s", dynamic_assistant_id)
         except Exception as e:
-            print(f"[ERROR] Failed to retrieve dynamic assistant: {str(e)}")
+            log.error("Failed to retrieve dynamic assistant: %s", e)
             return jsonify({"error": "Failed to retrieve dynamic assistant.", "details": str(e)}), 500
         
-        def event_stream():
-            try:
-                thread = client.beta.threads.create()
-                print(f"[DEBUG] Created thread: {thread.id}")
-                
-                # Log message creation
-                print(f"[DEBUG] Creating message with topic: {topic}")
-                client.beta.threads.messages.create(
-                    thread_id=thread.id,
-                    role="user",
-                    content=f"Expand on the following topic: {topic}"
-                )
-                print(f"[DEBUG] Message created successfully")
-                
-                handler = OutlineEventHandler()
-                stream_done = False
-                
-                def process_stream():
-                    nonlocal stream_done
-                    try:
-                        print(f"[DEBUG] Starting stream with thread_id: {thread.id}, assistant_id: {dynamic_assistant_id}")
-                        with client.beta.threads.runs.stream(
-                            thread_id=thread.id,
-                            assistant_id=dynamic_assistant_id,
-                            instructions="""
+        ticket = admit_generation(tenant, owner, repo_name)
+        if ticket is None:
+            return busy_response()
+        stream = start_generation(
+            client, tenant, ticket, "dynamic_expand_topic", dynamic_assistant_id,
+            content=f"Expand on the following topic: {topic}",
+            instructions="""
                             Expand on the given subtopic as part of a larger project.
                             Provide detailed, well-structured content with technical details and clear explanations.
                             Do not use bullet points.
                             Emphasize the connection between this subtopic and the overall project.
                             Keep it short.
                             """,
-                            event_handler=handler
-                        ) as stream:
-                            print(f"[DEBUG] Stream created successfully, waiting for completion")
-                            stream.until_done()
-                            print(f"[DEBUG] Stream completed successfully")
-                    except Exception as e:
-                        print(f"[ERROR] Error in stream processing: {str(e)}")
-                        handler.queue.append(f"data: {json.dumps({'error': str(e)})}\n\n")
-                    finally:
-                        stream_done = True
-                        print(f"[DEBUG] Stream processing finished")
-                
-                import threading
-                stream_thread = threading.Thread(target=process_stream)
-                stream_thread.start()
-                print(f"[DEBUG] Stream thread started")
-                
-                while True:
-                    if handler.queue:
-                        data = handler.queue.pop(0)
-                        print(f"[DEBUG] Yielding data: {data[:100]}...")  # Log first 100 chars
-                        yield data
-                    elif stream_done:
-                        print(f"[DEBUG] Stream done, breaking loop")
-                        break
-                    else:
-                        time.sleep(0.1)
-            except Exception as e:
-                error_msg = f"data: {json.dumps({'error': str(e)})}\n\n"
-                print(f"[ERROR] Exception in event_stream: {str(e)}")
-                yield error_msg
-        
-        print(f"[DEBUG] Returning streaming response")
-        return Response(
-            stream_with_context(event_stream()),
-            content_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Content-Type": "text/event-stream",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*"
-            }
         )
+        return sse_response(stream)
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
     except Exception as e:
-        print(f"[ERROR] Unhandled exception in dynamic_expand_topic: {str(e)}")
+        log.error("Unhandled exception in dynamic_expand_topic: %s", e)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@routes.route("/api/streams", methods=["GET"])
+def stream_stats():
+    """Generation streams held by this process and the size of their replay buffers."""
+    return jsonify(STREAMS.stats())
+
+@routes.route("/api/streams/<stream_id>", methods=["GET"])
+def resume_stream(stream_id):
+    """
+    Reconnect to an outline/expand generation after a dropped connection.
+    Replays every event after Last-Event-ID (header, or ?last_event_id=) and
+    then continues live until the generation finishes.
+    """
+    tenant = tenant_from_request(request)
+    stream = STREAMS.get(stream_id, tenant_id=tenant.id)
+    if stream is None:
+        return jsonify({"error": "Unknown or expired stream"}), 404
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or "0"
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+    return sse_response(stream, last_event_id)
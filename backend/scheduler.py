@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from observability import Counter, get_logger, observe, register
+
+log = get_logger("scheduler")
+
+# Repo builds running at once across all tenants
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "4"))
+
+BUILDS_SCHEDULED = register(Counter(
+    "silo_builds_scheduled_total",
+    "Builds submitted to the scheduler, by tenant and whether they joined an existing build.",
+))
+
+
+class _Job:
+    def __init__(self, key, fn, args, kwargs):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted_at = None
+
+
+class BuildScheduler:
+    """
+    Runs repo builds on a fixed pool of BUILD_WORKERS threads, sharing it fairly
+    between tenants.
+
+    Each tenant has its own FIFO queue and may have at most
+    `tenant.max_concurrent_builds` builds running. Free workers take the next job
+    round-robin across tenants, so a tenant with a long backlog gets one turn per
+    round like everyone else. Submitting a build for a repo that is already
+    queued or running returns the existing future instead of starting another.
+    """
+
+    def __init__(self, workers: int = BUILD_WORKERS):
+        self.workers = max(1, workers)
+        self._queues = OrderedDict()   # tenant id -> deque of jobs, in round-robin order
+        self._running = {}             # tenant id -> running build count
+        self._limits = {}
+        self._inflight = {}            # (tenant id, key) -> job
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"build-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, tenant, key, fn, *args, **kwargs) -> Future:
+        with self._cond:
+            self._ensure_started()
+            existing = self._inflight.get((tenant.id, key))
+            if existing is not None:
+                BUILDS_SCHEDULED.inc(tenant=tenant.id, joined="true")
+                return existing.future
+            job = _Job(key, fn, args, kwargs)
+            job.submitted_at = time.perf_counter()
+            self._inflight[(tenant.id, key)] = job
+            self._limits[tenant.id] = tenant.max_concurrent_builds
+            self._queues.setdefault(tenant.id, deque()).append(job)
+            BUILDS_SCHEDULED.inc(tenant=tenant.id, joined="false")
+            self._cond.notify()
+            return job.future
+
+    def _next_job(self):
+        """Pop the next runnable job round-robin across tenants; caller holds the lock."""
+        for tenant_id in list(self._queues):
+            queue = self._queues[tenant_id]
+            if not queue or self._running.get(tenant_id, 0) >= self._limits[tenant_id]:
+                continue
+            # Move this tenant to the back so the next pick starts with someone else.
+            self._queues.move_to_end(tenant_id)
+            self._running[tenant_id] = self._running.get(tenant_id, 0) + 1
+            return tenant_id, queue.popleft()
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                tenant_id, job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    tenant_id, job = self._next_job()
+            observe("build_queue_wait", time.perf_counter() - job.submitted_at, tenant=tenant_id)
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    log.warning("Build %s for tenant %s failed: %s", job.key, tenant_id, e)
+                    job.future.set_exception(e)
+            with self._cond:
+                self._running[tenant_id] -= 1
+                self._inflight.pop((tenant_id, job.key), None)
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                tenant_id: {"queued": len(q), "running": self._running.get(tenant_id, 0)}
+                for tenant_id, q in self._queues.items()
+            }
+
+
+BUILD_SCHEDULER = BuildScheduler()
+
+# Worker threads don't survive a fork: a forked worker starts with an empty scheduler of its own.
+os.register_at_fork(after_in_child=lambda: BUILD_SCHEDULER.__init__(BUILD_SCHEDULER.workers))
@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from observability import Counter, get_logger, register
+
+log = get_logger("sharedcache")
+
+# SQLite file shared by every worker process on the host; empty disables the cache
+SHARED_CACHE_PATH = os.getenv(
+    "SHARED_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "shared.sqlite3")
+)
+
+# Seconds between sweeps that delete expired entries from the cache file; 0 never sweeps
+SHARED_CACHE_PURGE_SECONDS = float(os.getenv("SHARED_CACHE_PURGE_SECONDS", "3600"))
+
+CACHE_LOOKUPS = register(Counter(
+    "silo_shared_cache_total",
+    "Shared cache lookups, by namespace and result (hit, miss).",
+))
+
+
+class SharedCache:
+    """
+    Small TTL key/value store in a local SQLite file, so gunicorn workers on
+    one host share GitHub listings and lookups instead of each warming its
+    own. Values are JSON. Each thread keeps its own connection (SQLite
+    connections can't cross threads or a fork); WAL mode lets readers
+    proceed while another process writes.
+
+    Cache errors are logged and treated as misses: the cache must never take
+    a request down.
+    """
+
+    def __init__(self, path: str = SHARED_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._pid == os.getpid():
+            return conn
+        self._pid = os.getpid()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        if not self.path:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (f"{namespace}:{key}", time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("Shared cache read failed: %s", e)
+            return None
+        CACHE_LOOKUPS.inc(namespace=namespace, result="hit" if row else "miss")
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value, ttl: float) -> None:
+        if not self.path:
+            return
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (f"{namespace}:{key}", json.dumps(value), time.time() + ttl),
+            )
+        except sqlite3.Error as e:
+            log.warning("Shared cache write failed: %s", e)
+
+    def delete(self, namespace: str, key: str) -> None:
+        if not self.path:
+            return
+        try:
+            self._conn().execute("DELETE FROM cache WHERE key = ?", (f"{namespace}:{key}",))
+        except sqlite3.Error as e:
+            log.warning("Shared cache delete failed: %s", e)
+
+    def values(self, namespace: str) -> list:
+        """Every unexpired value in `namespace`, e.g. one per worker process."""
+        if not self.path:
+            return []
+        try:
+            rows = self._conn().execute(
+                "SELECT value FROM cache WHERE key >= ? AND key < ? AND expires_at > ?",
+                (f"{namespace}:", f"{namespace};", time.time()),
+            ).fetchall()
+        except sqlite3.Error as e:
+            log.warning("Shared cache read failed: %s", e)
+            return []
+        return [json.loads(row[0]) for row in rows]
+
+    def purge_expired(self) -> int:
+        if not self.path:
+            return 0
+        try:
+            return self._conn().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        except sqlite3.Error as e:
+            log.warning("Shared cache purge failed: %s", e)
+            return 0
+
+
+SHARED_CACHE = SharedCache()
+
+
+_purge_thread = None
+
+
+def start_cache_purge(cache: SharedCache, interval: float = SHARED_CACHE_PURGE_SECONDS):
+    """Start the background purge thread once per process; a no-op when interval is 0."""
+    global _purge_thread
+    if interval <= 0 or _purge_thread is not None:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            purged = cache.purge_expired()
+            if purged:
+                log.info("Purged %d expired shared cache entries", purged)
+
+    _purge_thread = threading.Thread(target=loop, name="cache-purge", daemon=True)
+    _purge_thread.start()
+    return _purge_thread
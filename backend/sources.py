@@ -0,0 +1,351 @@
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+
+from observability import get_logger, span
+from pipeline import FileRecord
+
+log = get_logger("sources")
+
+# Same cap as the GitHub crawler: files in directories deeper than this are not ingested
+MAX_DEPTH = 8
+
+
+def usable_content(path: str, content: bytes) -> bool:
+    """Only non-empty UTF-8 text is worth uploading."""
+    if len(content) == 0:
+        log.debug("Skipping empty file: %s", path)
+        return False
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        log.debug("Skipping non-UTF-8 file: %s", path)
+        return False
+    return True
+
+
+def git_blob_sha(content: bytes) -> str:
+    """The sha git (and the GitHub API) give a file with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class Source:
+    """
+    Where a build gets its files from. `iter_files()` yields a FileRecord for
+    every file that passes the path filters, lazily; `read(record)` returns
+    (record, content, error) like the download stage always has, with content
+    None for files that turn out to be empty or binary.
+
+    Record shas are git blob shas for every source, so a build manifest stays
+    valid when a repo moves between the API and a local copy.
+    """
+
+    name = "source"
+    # Whether reading every file twice (to rank, then to upload) is affordable
+    cheap_reads = False
+    # Set when part of the listing could not be read, so a missing file may still exist
+    incomplete = False
+
+    def iter_files(self):
+        raise NotImplementedError
+
+    def recency(self) -> dict:
+        """Path -> unix time it last changed, for the paths the source knows about."""
+        return {}
+
+    def read(self, record: FileRecord):
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _PathFilter:
+    """Applies the build's skip_directory/skip_file to paths listed in one go."""
+
+    def __init__(self, skip_dir=None, skip_file=None, max_depth: int = MAX_DEPTH):
+        self.skip_dir = skip_dir
+        self.skip_file = skip_file
+        self.max_depth = max_depth
+        self._dirs = {}
+
+    def dir_skipped(self, dir_path: str) -> bool:
+        # The filters search the whole path, so checking a file's parent covers its ancestors too.
+        if not dir_path:
+            return False
+        if dir_path not in self._dirs:
+            too_deep = dir_path.count("/") + 1 > self.max_depth
+            self._dirs[dir_path] = too_deep or bool(self.skip_dir and self.skip_dir(dir_path))
+        return self._dirs[dir_path]
+
+    def accepts(self, record: FileRecord) -> bool:
+        if self.dir_skipped(os.path.dirname(record.path)):
+            return False
+        with span("filter"):
+            return not (self.skip_file and self.skip_file(record))
+
+###############################################################################
+# Git object database (local mirror or clone)
+###############################################################################
+
+
+class GitSource(Source):
+    """
+    Files of one revision of a local git repository (bare or not), read
+    straight from the object database: `git ls-tree` lists paths, sizes and
+    blob shas, and a single long-lived `git cat-file --batch` process serves
+    every blob. No working tree is needed. `paths` limits the listing to
+    those directories, as a sparse checkout would.
+    """
+
+    name = "git"
+    cheap_reads = True
+    # Commits scanned for recently changed paths
+    RECENCY_COMMITS = 500
+
+    def __init__(self, repo_dir: str, rev: str = "HEAD", paths=(), skip_dir=None, skip_file=None,
+                 max_depth: int = MAX_DEPTH):
+        self.repo_dir = repo_dir
+        self.rev = rev
+        self.paths = list(paths or ())
+        self.filter = _PathFilter(skip_dir, skip_file, max_depth)
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def _git(self, *args):
+        return ["git", "-C", self.repo_dir, *args]
+
+    def iter_files(self):
+        proc = subprocess.Popen(self._git("ls-tree", "-r", "-l", "-z", self.rev, "--", *self.paths),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        listed = False
+        try:
+            for entry in _split_nul(proc.stdout):
+                meta, _, path = entry.partition(b"\t")
+                mode, kind, sha, size = meta.split()
+                if kind != b"blob" or mode == b"120000":   # submodules and symlinks
+                    continue
+                record = FileRecord(path.decode("utf-8", errors="replace"), int(size), sha.decode())
+                if self.filter.accepts(record):
+                    yield record
+            listed = True
+        finally:
+            proc.stdout.close()
+            if not listed:
+                # Closed early or failed mid-listing: the rest isn't wanted, and raising here
+                # would replace the GeneratorExit (or the original error)
+                proc.terminate()
+            stderr = proc.stderr.read().decode(errors="replace").strip()
+            proc.stderr.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"git ls-tree {self.rev} failed in {self.repo_dir}: {stderr}")
+
+    def recency(self) -> dict:
+        """Last change of each path within the newest RECENCY_COMMITS commits (one commit in a shallow clone)."""
+        proc = subprocess.run(
+            self._git("log", f"-n{self.RECENCY_COMMITS}", "--format=%x00%ct", "--name-only", self.rev,
+                      "--", *self.paths),
+            capture_output=True,
+        )
+        changed = {}
+        if proc.returncode != 0:
+            return changed
+        for commit in proc.stdout.split(b"\0")[1:]:
+            lines = commit.decode("utf-8", errors="replace").splitlines()
+            if not lines:
+                continue
+            when = float(lines[0])
+            for path in lines[1:]:
+                if path:
+                    changed.setdefault(path, when)
+        return changed
+
+    def _cat_file(self, sha: str) -> bytes:
+        with self._lock:
+            if self._batch is None:
+                self._batch = subprocess.Popen(self._git("cat-file", "--batch"),
+                                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._batch.stdin.write(sha.encode() + b"\n")
+            self._batch.stdin.flush()
+            header = self._batch.stdout.readline().split()
+            if len(header) != 3:
+                raise KeyError(f"object {sha} missing")
+            content = self._batch.stdout.read(int(header[2]))
+            self._batch.stdout.read(1)   # trailing newline
+            return content
+
+    def read(self, record: FileRecord):
+        try:
+            with span("download", source=self.name):
+                content = self._cat_file(record.sha)
+        except Exception as e:
+            error_msg = f"Error processing {record.path}: {str(e)}"
+            log.warning(error_msg)
+            return record, None, error_msg
+        if not usable_content(record.path, content):
+            return record, None, None
+        return record, content, None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._batch is not None:
+                self._batch.stdin.close()
+                self._batch.wait()
+                self._batch.stdout.close()
+                self._batch = None
+
+
+def _split_nul(stream, chunk_size: int = 65536):
+    buffer = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        *entries, buffer = buffer.split(b"\0")
+        yield from entries
+    if buffer:
+        yield buffer
+
+###############################################################################
+# Plain directory
+###############################################################################
+
+
+class WorkTreeSource(Source):
+    """Files under a directory on disk, e.g. a checked-out working tree. `.git` is never descended into."""
+
+    name = "worktree"
+    cheap_reads = True
+
+    def __init__(self, root: str, skip_dir=None, skip_file=None, max_depth: int = MAX_DEPTH):
+        self.root = root
+        self.filter = _PathFilter(skip_dir, skip_file, max_depth)
+
+    def iter_files(self):
+        for dirpath, dirnames, filenames in os.walk(self.root, onerror=self._listing_failed):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            rel_dir = "" if rel_dir == "." else rel_dir
+            dirnames[:] = sorted(
+                d for d in dirnames
+                if d != ".git" and not self.filter.dir_skipped(f"{rel_dir}/{d}" if rel_dir else d)
+            )
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                if os.path.islink(full):
+                    continue
+                path = f"{rel_dir}/{name}" if rel_dir else name
+                record = FileRecord(path, os.path.getsize(full))
+                if not self.filter.accepts(record):
+                    continue
+                with open(full, "rb") as fh:
+                    record.sha = git_blob_sha(fh.read())
+                yield record
+
+    def _listing_failed(self, error: OSError) -> None:
+        log.warning("Can't list %s: %s", error.filename, error)
+        self.incomplete = True
+
+    def recency(self) -> dict:
+        changed = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d != ".git"]
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                changed[os.path.relpath(full, self.root).replace(os.sep, "/")] = os.path.getmtime(full)
+        return changed
+
+    def read(self, record: FileRecord):
+        try:
+            with span("download", source=self.name):
+                with open(os.path.join(self.root, record.path), "rb") as fh:
+                    content = fh.read()
+        except OSError as e:
+            error_msg = f"Error processing {record.path}: {str(e)}"
+            log.warning(error_msg)
+            return record, None, error_msg
+        if not usable_content(record.path, content):
+            return record, None, None
+        return record, content, None
+
+###############################################################################
+# Mirrors and shallow clones
+###############################################################################
+
+
+def find_mirror(mirror_dir: str, owner: str, repo: str):
+    """`<mirror_dir>/<owner>/<repo>.git` or `<mirror_dir>/<owner>/<repo>`, whichever is a git repo."""
+    if not mirror_dir:
+        return None
+    for candidate in (os.path.join(mirror_dir, owner, f"{repo}.git"), os.path.join(mirror_dir, owner, repo)):
+        if os.path.isdir(candidate) and (os.path.exists(os.path.join(candidate, "HEAD"))
+                                         or os.path.isdir(os.path.join(candidate, ".git"))):
+            return candidate
+    return None
+
+
+def find_checkout(mirror_dir: str, owner: str, repo: str):
+    """`<mirror_dir>/<owner>/<repo>` when it is a plain directory of files rather than a git repo."""
+    if not mirror_dir:
+        return None
+    candidate = os.path.join(mirror_dir, owner, repo)
+    if os.path.isdir(candidate) and find_mirror(mirror_dir, owner, repo) != candidate:
+        return candidate
+    return None
+
+
+def _auth_env(token: str = None) -> dict:
+    # Passed as config through the environment so the token is neither in argv nor in .git/config.
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    if token:
+        basic = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update({"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "http.extraHeader",
+                    "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}"})
+    return env
+
+
+def shallow_clone(url: str, dest: str, sparse_paths=(), token: str = None, timeout: float = 300) -> str:
+    """
+    Fetch the tip of `url`'s default branch (what the GitHub API crawler
+    reads too) into `dest` with history depth 1 and return the revision to
+    read. An existing clone is updated in place.
+
+    Without `sparse_paths` nothing is checked out: GitSource reads the blobs
+    from the pack. With them, the clone is blobless and sparse, and the
+    checkout fetches only those directories' blobs, in one batch.
+    """
+    env = _auth_env(token)
+
+    def git(*args, cwd=None):
+        subprocess.run(["git", *args], cwd=cwd, env=env, check=True, timeout=timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    sparse_paths = list(sparse_paths or ())
+    with span("clone"):
+        if not os.path.isdir(os.path.join(dest, ".git")):
+            shutil.rmtree(dest, ignore_errors=True)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            args = ["clone", "--depth", "1", "--no-tags"]
+            if sparse_paths:
+                args += ["--filter=blob:none", "--sparse"]
+            else:
+                args += ["--no-checkout"]
+            git(*args, url, dest)
+            if sparse_paths:
+                git("sparse-checkout", "set", *sparse_paths, cwd=dest)
+            return "HEAD"
+        git("fetch", "--depth", "1", "--no-tags", url, "HEAD", cwd=dest)
+        if sparse_paths:
+            git("sparse-checkout", "set", *sparse_paths, cwd=dest)
+            git("checkout", "--detach", "FETCH_HEAD", cwd=dest)
+        return "FETCH_HEAD"
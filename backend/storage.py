@@ -0,0 +1,411 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from observability import get_logger
+
+log = get_logger("storage")
+
+# Where build state is kept between attempts (the SQLite database, legacy JSON manifests, clones)
+BUILD_STATE_DIR = os.getenv(
+    "BUILD_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".build_state")
+)
+# "sqlite" (a local file, the default) or "mongo" (shared by every host, needs pymongo and MONGO_URI)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+# SQLite database file for the sqlite backend
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", os.path.join(BUILD_STATE_DIR, "state.sqlite3"))
+# Connection string and database for the mongo backend
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DATABASE = os.getenv("MONGO_DATABASE", "silo")
+
+
+class Storage:
+    """
+    Persistent build state, keyed by (tenant, owner, repo):
+
+    - repos: one document per repo build (status, vector store, assistant,
+      superseded file ids, warm-up bookkeeping);
+    - files: one row per discovered file (blob sha, uploaded file id,
+      attached), indexed by repo and by blob sha;
+    - jobs: one row per build attempt with its outcome and stats;
+    - outlines: pre-generated outlines waiting to be served once.
+
+    BuildManifest (checkpoint.py) is the only writer of repos and files.
+    """
+
+    name = "storage"
+
+    # -- repos and files ----------------------------------------------------
+
+    def load_repo(self, tenant: str, owner: str, repo: str):
+        """The repo's fields, or None if it was never built."""
+        raise NotImplementedError
+
+    def list_repos(self, tenant: str) -> list:
+        raise NotImplementedError
+
+    def load_files(self, tenant: str, owner: str, repo: str) -> dict:
+        """Path -> {"sha", "file_id", "attached"} for every file recorded for the repo."""
+        raise NotImplementedError
+
+    def save_manifest(self, tenant: str, owner: str, repo: str, fields: dict, files: dict,
+                      clear_files: bool = False, removed=()) -> None:
+        """
+        Write the repo's fields, upsert `files` and forget the `removed` paths in
+        one transaction, first forgetting all files if `clear_files`.
+        """
+        raise NotImplementedError
+
+    def find_file_id(self, tenant: str, sha: str):
+        """A file id already uploaded and attached for blob `sha` by any of the tenant's repos, or None."""
+        raise NotImplementedError
+
+    def attached_repos(self, tenant: str, file_id: str) -> list:
+        """(owner, repo) of every one of the tenant's repos with a file attached as `file_id`."""
+        raise NotImplementedError
+
+    # -- build jobs ----------------------------------------------------------
+
+    def start_job(self, tenant: str, owner: str, repo: str) -> str:
+        raise NotImplementedError
+
+    def finish_job(self, job_id: str, status: str, stats: dict) -> None:
+        raise NotImplementedError
+
+    def list_jobs(self, tenant: str, owner: str = None, repo: str = None, limit: int = 20) -> list:
+        """The tenant's most recent build jobs, newest first."""
+        raise NotImplementedError
+
+    # -- outlines ------------------------------------------------------------
+
+    def add_outline(self, tenant: str, owner: str, repo: str, text: str, pushed_at: str = None) -> None:
+        raise NotImplementedError
+
+    def take_outline(self, tenant: str, owner: str, repo: str):
+        """Mark the newest unserved outline served and return its text; None if there is none."""
+        raise NotImplementedError
+
+    def purge_outlines(self, tenant: str, generated_before: float) -> int:
+        """Delete the tenant's served outlines and any generated before `generated_before`; return how many."""
+        raise NotImplementedError
+
+
+def _new_job_id() -> str:
+    return secrets.token_hex(8)
+
+###############################################################################
+# SQLite
+###############################################################################
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    tenant TEXT NOT NULL, owner TEXT NOT NULL, repo TEXT NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (tenant, owner, repo)
+);
+CREATE TABLE IF NOT EXISTS files (
+    tenant TEXT NOT NULL, owner TEXT NOT NULL, repo TEXT NOT NULL, path TEXT NOT NULL,
+    sha TEXT, file_id TEXT, attached INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant, owner, repo, path)
+);
+CREATE INDEX IF NOT EXISTS files_by_sha ON files (tenant, sha);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, tenant TEXT NOT NULL, owner TEXT NOT NULL, repo TEXT NOT NULL,
+    status TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL, stats TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_repo ON jobs (tenant, owner, repo, started_at);
+CREATE INDEX IF NOT EXISTS jobs_by_tenant ON jobs (tenant, started_at);
+CREATE TABLE IF NOT EXISTS outlines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, tenant TEXT NOT NULL, owner TEXT NOT NULL, repo TEXT NOT NULL,
+    text TEXT NOT NULL, pushed_at TEXT, generated_at REAL NOT NULL, served_at REAL
+);
+CREATE INDEX IF NOT EXISTS outlines_by_repo ON outlines (tenant, owner, repo, served_at, generated_at);
+"""
+
+
+class SQLiteStorage(Storage):
+    """
+    Build state in a local SQLite file (WAL mode), shared by the gunicorn
+    workers on one host. Like the shared cache, each thread keeps its own
+    connection and a forked worker opens new ones.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._pid == os.getpid():
+            return conn
+        self._pid = os.getpid()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def load_repo(self, tenant, owner, repo):
+        row = self._conn().execute(
+            "SELECT data FROM repos WHERE tenant = ? AND owner = ? AND repo = ?", (tenant, owner, repo)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_repos(self, tenant):
+        rows = self._conn().execute("SELECT data FROM repos WHERE tenant = ? ORDER BY owner, repo", (tenant,))
+        return [json.loads(data) for data, in rows]
+
+    def load_files(self, tenant, owner, repo):
+        rows = self._conn().execute(
+            "SELECT path, sha, file_id, attached FROM files WHERE tenant = ? AND owner = ? AND repo = ?",
+            (tenant, owner, repo),
+        )
+        return {path: {"sha": sha, "file_id": file_id, "attached": bool(attached)}
+                for path, sha, file_id, attached in rows}
+
+    def save_manifest(self, tenant, owner, repo, fields, files, clear_files=False, removed=()):
+        with self._transaction() as conn:
+            if clear_files:
+                conn.execute("DELETE FROM files WHERE tenant = ? AND owner = ? AND repo = ?", (tenant, owner, repo))
+            conn.executemany(
+                "DELETE FROM files WHERE tenant = ? AND owner = ? AND repo = ? AND path = ?",
+                [(tenant, owner, repo, path) for path in removed],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO repos (tenant, owner, repo, data) VALUES (?, ?, ?, ?)",
+                (tenant, owner, repo, json.dumps(fields)),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (tenant, owner, repo, path, sha, file_id, attached) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(tenant, owner, repo, path, e.get("sha"), e.get("file_id"), int(bool(e.get("attached"))))
+                 for path, e in files.items()],
+            )
+
+    def find_file_id(self, tenant, sha):
+        if not sha:
+            return None
+        row = self._conn().execute(
+            "SELECT file_id FROM files WHERE tenant = ? AND sha = ? AND attached = 1 AND file_id IS NOT NULL LIMIT 1",
+            (tenant, sha),
+        ).fetchone()
+        return row[0] if row else None
+
+    def attached_repos(self, tenant, file_id):
+        rows = self._conn().execute(
+            "SELECT DISTINCT owner, repo FROM files WHERE tenant = ? AND file_id = ? AND attached = 1",
+            (tenant, file_id),
+        )
+        return [(owner, repo) for owner, repo in rows]
+
+    def start_job(self, tenant, owner, repo):
+        job_id = _new_job_id()
+        self._conn().execute(
+            "INSERT INTO jobs (id, tenant, owner, repo, status, started_at) VALUES (?, ?, ?, ?, 'running', ?)",
+            (job_id, tenant, owner, repo, time.time()),
+        )
+        return job_id
+
+    def finish_job(self, job_id, status, stats):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, stats = ? WHERE id = ?",
+            (status, time.time(), json.dumps(stats), job_id),
+        )
+
+    def list_jobs(self, tenant, owner=None, repo=None, limit=20):
+        query, args = "SELECT id, owner, repo, status, started_at, finished_at, stats FROM jobs WHERE tenant = ?", [tenant]
+        if owner:
+            query += " AND owner = ?"
+            args.append(owner)
+        if repo:
+            query += " AND repo = ?"
+            args.append(repo)
+        query += " ORDER BY started_at DESC LIMIT ?"
+        args.append(limit)
+        return [
+            {"id": job_id, "tenant": tenant, "owner": o, "repo": r, "status": status, "started_at": started_at,
+             "finished_at": finished_at, "stats": json.loads(stats) if stats else None}
+            for job_id, o, r, status, started_at, finished_at, stats in self._conn().execute(query, args)
+        ]
+
+    def add_outline(self, tenant, owner, repo, text, pushed_at=None):
+        self._conn().execute(
+            "INSERT INTO outlines (tenant, owner, repo, text, pushed_at, generated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (tenant, owner, repo, text, pushed_at, time.time()),
+        )
+
+    def take_outline(self, tenant, owner, repo):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, text FROM outlines WHERE tenant = ? AND owner = ? AND repo = ? AND served_at IS NULL "
+                "ORDER BY generated_at DESC LIMIT 1",
+                (tenant, owner, repo),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE outlines SET served_at = ? WHERE id = ?", (time.time(), row[0]))
+        return row[1]
+
+    def purge_outlines(self, tenant, generated_before):
+        return self._conn().execute(
+            "DELETE FROM outlines WHERE tenant = ? AND (served_at IS NOT NULL OR generated_at < ?)",
+            (tenant, generated_before),
+        ).rowcount
+
+###############################################################################
+# MongoDB
+###############################################################################
+
+
+class MongoStorage(Storage):
+    """
+    Build state in MongoDB, for deployments where builds run on more than
+    one host. The client is created on first use (pymongo is imported then)
+    and again in each forked worker: MongoClient is not fork-safe.
+    """
+
+    name = "mongo"
+
+    def __init__(self, uri: str = MONGO_URI, database: str = MONGO_DATABASE):
+        self.uri = uri
+        self.database = database
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _collections(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                return self._db
+            try:
+                import pymongo
+            except ImportError as e:
+                raise RuntimeError("STORAGE_BACKEND=mongo needs the pymongo package") from e
+            db = pymongo.MongoClient(self.uri)[self.database]
+            db.repos.create_index([("tenant", 1), ("owner", 1), ("repo", 1)], unique=True)
+            db.files.create_index([("tenant", 1), ("owner", 1), ("repo", 1), ("path", 1)], unique=True)
+            db.files.create_index([("tenant", 1), ("sha", 1)])
+            db.jobs.create_index([("tenant", 1), ("owner", 1), ("repo", 1), ("started_at", -1)])
+            db.jobs.create_index([("tenant", 1), ("started_at", -1)])
+            db.outlines.create_index([("tenant", 1), ("owner", 1), ("repo", 1), ("served_at", 1), ("generated_at", -1)])
+            self._db, self._pid = db, os.getpid()
+            return db
+
+    def load_repo(self, tenant, owner, repo):
+        doc = self._collections().repos.find_one({"tenant": tenant, "owner": owner, "repo": repo}, {"_id": 0})
+        return doc.get("data") if doc else None
+
+    def list_repos(self, tenant):
+        cursor = self._collections().repos.find({"tenant": tenant}, {"_id": 0, "data": 1}).sort([("owner", 1), ("repo", 1)])
+        return [doc["data"] for doc in cursor]
+
+    def load_files(self, tenant, owner, repo):
+        cursor = self._collections().files.find({"tenant": tenant, "owner": owner, "repo": repo}, {"_id": 0})
+        return {doc["path"]: {"sha": doc.get("sha"), "file_id": doc.get("file_id"), "attached": bool(doc.get("attached"))}
+                for doc in cursor}
+
+    def save_manifest(self, tenant, owner, repo, fields, files, clear_files=False, removed=()):
+        from pymongo import UpdateOne
+
+        db = self._collections()
+        key = {"tenant": tenant, "owner": owner, "repo": repo}
+        # Not one transaction (that needs a replica set); the repo document goes last, so a
+        # crash in between leaves file progress ahead of the status, which a retry redoes.
+        if clear_files:
+            db.files.delete_many(key)
+        if removed:
+            db.files.delete_many(dict(key, path={"$in": list(removed)}))
+        if files:
+            db.files.bulk_write([
+                UpdateOne(dict(key, path=path),
+                          {"$set": {"sha": e.get("sha"), "file_id": e.get("file_id"),
+                                    "attached": bool(e.get("attached"))}},
+                          upsert=True)
+                for path, e in files.items()
+            ], ordered=False)
+        db.repos.update_one(key, {"$set": {"data": fields}}, upsert=True)
+
+    def find_file_id(self, tenant, sha):
+        if not sha:
+            return None
+        doc = self._collections().files.find_one(
+            {"tenant": tenant, "sha": sha, "attached": True, "file_id": {"$ne": None}}, {"file_id": 1}
+        )
+        return doc["file_id"] if doc else None
+
+    def attached_repos(self, tenant, file_id):
+        cursor = self._collections().files.find({"tenant": tenant, "file_id": file_id, "attached": True},
+                                                {"_id": 0, "owner": 1, "repo": 1})
+        return sorted({(doc["owner"], doc["repo"]) for doc in cursor})
+
+    def start_job(self, tenant, owner, repo):
+        job_id = _new_job_id()
+        self._collections().jobs.insert_one({
+            "_id": job_id, "tenant": tenant, "owner": owner, "repo": repo,
+            "status": "running", "started_at": time.time(), "finished_at": None, "stats": None,
+        })
+        return job_id
+
+    def finish_job(self, job_id, status, stats):
+        self._collections().jobs.update_one(
+            {"_id": job_id}, {"$set": {"status": status, "finished_at": time.time(), "stats": stats}}
+        )
+
+    def list_jobs(self, tenant, owner=None, repo=None, limit=20):
+        query = {"tenant": tenant}
+        if owner:
+            query["owner"] = owner
+        if repo:
+            query["repo"] = repo
+        cursor = self._collections().jobs.find(query).sort("started_at", -1).limit(limit)
+        return [dict(doc, id=doc.pop("_id")) for doc in cursor]
+
+    def add_outline(self, tenant, owner, repo, text, pushed_at=None):
+        self._collections().outlines.insert_one({
+            "tenant": tenant, "owner": owner, "repo": repo, "text": text, "pushed_at": pushed_at,
+            "generated_at": time.time(), "served_at": None,
+        })
+
+    def take_outline(self, tenant, owner, repo):
+        doc = self._collections().outlines.find_one_and_update(
+            {"tenant": tenant, "owner": owner, "repo": repo, "served_at": None},
+            {"$set": {"served_at": time.time()}},
+            sort=[("generated_at", -1)],
+        )
+        return doc["text"] if doc else None
+
+    def purge_outlines(self, tenant, generated_before):
+        return self._collections().outlines.delete_many({
+            "tenant": tenant, "$or": [{"served_at": {"$ne": None}}, {"generated_at": {"$lt": generated_before}}],
+        }).deleted_count
+
+
+def open_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    """The configured storage backend."""
+    if backend == "mongo":
+        return MongoStorage()
+    if backend != "sqlite":
+        log.warning("Unknown STORAGE_BACKEND %r, using sqlite", backend)
+    return SQLiteStorage()
+
+
+STORAGE = open_storage()
@@ -0,0 +1,324 @@
+import json
+import os
+import secrets
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; streams fall back to gzip without it
+    brotli = None
+
+from observability import Counter, get_logger, register
+
+log = get_logger("streams")
+
+# How long a finished generation stays buffered so a dropped client can reconnect and replay it
+STREAM_TTL_SECONDS = float(os.getenv("STREAM_TTL_SECONDS", "300"))
+# Comment frame sent while a subscriber waits, so proxies don't close an idle connection
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+# Deltas published within this window go out as one write (and one frame per run of text)
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "20"))
+# Content-Encodings offered on event streams, in order of preference; empty disables compression
+STREAM_COMPRESSION = [e.strip() for e in os.getenv("STREAM_COMPRESSION", "br,gzip").split(",") if e.strip()]
+# How long a generation may run with nobody listening before its upstream run is cancelled
+STREAM_RECONNECT_GRACE_SECONDS = float(os.getenv("STREAM_RECONNECT_GRACE_SECONDS", "10"))
+
+STREAMS_CANCELLED = register(Counter(
+    "silo_streams_cancelled_total",
+    "Generations cancelled because every client disconnected and none came back, by route.",
+))
+
+
+FRAMING_JSON = "json"
+FRAMING_COMPACT = "compact"
+
+
+def render_events(events, first_id: int, framing: str = FRAMING_JSON) -> str:
+    """
+    Render consecutive events as SSE frames. Runs of text deltas are merged
+    into a single frame carrying the id of the last delta in the run.
+
+    - json: `data: {"content": "..."}`, what the frontend has always parsed.
+    - compact: `event: t` with the raw text as `data:` lines (newlines become
+      extra data lines, per the SSE spec), so clients skip JSON.parse per delta.
+
+    Runs of {"section_delta"} events are merged the same way, per section:
+    sections are written concurrently, so their deltas interleave. A run that
+    touched one section stays a {"section_delta"} frame; one that touched
+    several becomes {"section_deltas": [{"index", "text"}, ...]}, in the order
+    the sections first appeared. Other events (errors, queue positions) are
+    JSON `data:` frames in both modes.
+    """
+    frames = []
+    text = []
+    sections = {}               # section index -> deltas, while in a run of section deltas
+    run_id = None
+
+    def flush_run():
+        if text:
+            frames.append(_text_frame("".join(text), run_id, framing))
+            text.clear()
+        elif sections:
+            deltas = [{"index": index, "text": "".join(pieces)} for index, pieces in sections.items()]
+            payload = {"section_delta": deltas[0]} if len(deltas) == 1 else {"section_deltas": deltas}
+            frames.append(f"id: {run_id}\ndata: {json.dumps(payload)}\n\n")
+            sections.clear()
+
+    for offset, event in enumerate(events):
+        event_id = first_id + offset
+        delta = event.get("section_delta") if isinstance(event, dict) else None
+        if isinstance(event, str):
+            if sections:
+                flush_run()
+            text.append(event)
+        elif delta is not None:
+            if text:
+                flush_run()
+            sections.setdefault(delta.get("index"), []).append(delta.get("text", ""))
+        else:
+            flush_run()
+            frames.append(f"id: {event_id}\ndata: {json.dumps(event)}\n\n")
+            continue
+        run_id = event_id
+    flush_run()
+    return "".join(frames)
+
+
+def _text_frame(text: str, event_id: int, framing: str) -> str:
+    if framing == FRAMING_COMPACT:
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return f"id: {event_id}\nevent: t\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+    return f"id: {event_id}\ndata: {json.dumps({'content': text})}\n\n"
+
+
+def choose_encoding(accept_encoding: str):
+    """Pick the preferred STREAM_COMPRESSION encoding the client accepts, or None."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in STREAM_COMPRESSION:
+        if encoding == "br" and brotli is None:
+            continue
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress an iterator of str chunks, flushing after each so every event reaches the client at once."""
+    if encoding == "br":
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+        for chunk in chunks:
+            yield compressor.process(chunk.encode()) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        for chunk in chunks:
+            yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class GenerationStream:
+    """
+    Server-side buffer of one generation's SSE events.
+
+    The assistant run publishes into the stream from its own thread and keeps
+    going when a client drops. Every event gets a monotonically
+    increasing id, so a client that reconnects with Last-Event-ID receives the
+    events it missed and then continues live.
+
+    If every subscriber leaves and nobody reconnects within the grace period,
+    the registry calls `cancel()`, which runs the canceller registered with
+    `on_abandon` (cancelling the upstream run) and ends the stream.
+    """
+
+    def __init__(self, stream_id: str, route: str = "", tenant_id: str = None):
+        self.id = stream_id
+        self.route = route
+        self.tenant_id = tenant_id
+        self.events = []          # event i has id i + 1; str for a text delta, dict otherwise
+        self.buffered_chars = 0   # text held in `events`, for the registry's memory stats
+        self.done = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self.subscribers = 0
+        self.abandoned_since = None   # monotonic time the last subscriber left
+        self.cancelled = False
+        self._canceller = None
+        self._cond = threading.Condition()
+
+    def on_abandon(self, canceller) -> None:
+        self._canceller = canceller
+
+    def publish(self, payload) -> int:
+        """Append an event: a str text delta, or a dict sent as a JSON frame."""
+        with self._cond:
+            if self.done:
+                return len(self.events)
+            self.events.append(payload)
+            if isinstance(payload, str):
+                self.buffered_chars += len(payload)
+            self._cond.notify_all()
+            return len(self.events)
+
+    def close(self) -> None:
+        with self._cond:
+            if self.done:
+                return
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the generation finishes; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def text(self) -> str:
+        """Everything the assistant has written so far."""
+        with self._cond:
+            return "".join(e for e in self.events if isinstance(e, str))
+
+    def error(self):
+        with self._cond:
+            return next((e["error"] for e in self.events if isinstance(e, dict) and "error" in e), None)
+
+    def cancel(self) -> None:
+        """Stop the generation: cancel the upstream run and close the stream."""
+        with self._cond:
+            if self.done or self.cancelled:
+                return
+            self.cancelled = True
+        if self._canceller is not None:
+            try:
+                self._canceller()
+            except Exception as e:
+                log.warning("Cancelling stream %s failed: %s", self.id, e)
+        STREAMS_CANCELLED.inc(route=self.route)
+        self.close()
+
+    def frames(self, last_event_id: int = 0, framing: str = FRAMING_JSON,
+               keepalive: float = STREAM_KEEPALIVE_SECONDS, coalesce_ms: float = None):
+        """
+        Yield SSE frames for every event after `last_event_id`, waiting for new
+        ones until the generation finishes. The first frame names the stream so
+        the client knows where to reconnect. Writes are at least `coalesce_ms`
+        apart, so a burst of deltas goes out as one frame instead of dozens.
+        """
+        yield f"event: stream\ndata: {json.dumps({'stream_id': self.id})}\n\n"
+        sent = max(0, int(last_event_id or 0))
+        coalesce = (STREAM_COALESCE_MS if coalesce_ms is None else coalesce_ms) / 1000.0
+        last_write = 0.0
+        with self._cond:
+            self.subscribers += 1
+            self.abandoned_since = None
+        try:
+            while True:
+                with self._cond:
+                    if sent >= len(self.events) and not self.done:
+                        self._cond.wait(keepalive)
+                    while sent < len(self.events) and not self.done:
+                        remaining = last_write + coalesce - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    pending = self.events[sent:]
+                    done = self.done
+                if pending:
+                    chunk = render_events(pending, sent + 1, framing)
+                    sent += len(pending)
+                    last_write = time.monotonic()
+                    yield chunk
+                elif done:
+                    return
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                if not self.subscribers and not self.done:
+                    self.abandoned_since = time.monotonic()
+
+
+class StreamRegistry:
+    """
+    Live and recently finished generation streams, by id. A single monitor
+    thread cancels generations whose clients have all gone for longer than
+    the reconnect grace period.
+    """
+
+    def __init__(self, ttl: float = STREAM_TTL_SECONDS, grace: float = STREAM_RECONNECT_GRACE_SECONDS):
+        self.ttl = ttl
+        self.grace = grace
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    def create(self, route: str = "", tenant_id: str = None) -> GenerationStream:
+        stream = GenerationStream(secrets.token_urlsafe(16), route, tenant_id)
+        with self._lock:
+            self._evict()
+            self._streams[stream.id] = stream
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._watch, name="stream-monitor", daemon=True)
+                self._monitor.start()
+        return stream
+
+    def _watch(self):
+        interval = min(max(self.grace / 4, 0.05), 1.0)
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                abandoned = [
+                    s for s in self._streams.values()
+                    if not s.done and s.abandoned_since is not None and now - s.abandoned_since >= self.grace
+                ]
+            for stream in abandoned:
+                log.info("Cancelling %s stream %s: no client for %.1fs", stream.route, stream.id, self.grace)
+                stream.cancel()
+
+    def get(self, stream_id: str, tenant_id: str = None):
+        """Return the stream, or None if it is unknown, expired or belongs to another tenant."""
+        with self._lock:
+            self._evict()
+            stream = self._streams.get(stream_id)
+        if stream is None or stream.tenant_id != tenant_id:
+            return None
+        return stream
+
+    def _evict(self) -> None:
+        """Drop finished streams older than the TTL; caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        expired = [sid for sid, s in self._streams.items() if s.done and s.finished_at < cutoff]
+        for sid in expired:
+            del self._streams[sid]
+        if expired:
+            log.debug("Evicted %d finished streams", len(expired))
+
+    def stats(self) -> dict:
+        """Streams held (live and finished-but-resumable) and what their buffers hold."""
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            "streams": len(streams),
+            "live": sum(1 for s in streams if not s.done),
+            "subscribers": sum(s.subscribers for s in streams),
+            "buffered_events": sum(len(s.events) for s in streams),
+            "buffered_chars": sum(s.buffered_chars for s in streams),
+        }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._streams)
+
+
+STREAMS = StreamRegistry()
+
+# Streams and their monitor thread belong to the process that created them.
+os.register_at_fork(after_in_child=lambda: STREAMS.__init__(STREAMS.ttl, STREAMS.grace))
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+from observability import get_logger
+
+log = get_logger("tenants")
+
+# JSON file describing every tenant; without it a single "default" tenant is built from the environment
+TENANTS_FILE = os.getenv("TENANTS_FILE")
+DEFAULT_TENANT_ID = "default"
+DEFAULT_GITHUB_OWNER = os.getenv("GITHUB_OWNER", "Bykho")
+DEFAULT_GITHUB_OWNER_TYPE = os.getenv("GITHUB_OWNER_TYPE", "users")  # "users" or "orgs"
+DEFAULT_MAX_CONCURRENT_BUILDS = int(os.getenv("TENANT_MAX_CONCURRENT_BUILDS", "2"))
+
+
+class UnknownTenant(Exception):
+    pass
+
+
+class Tenant:
+    """
+    One team or engineer using the service: the GitHub owners it may ingest,
+    the credentials used for them, and its share of build capacity.
+    """
+
+    def __init__(self, tenant_id: str, owner: str, github_token: str = None, openai_api_key: str = None,
+                 owner_type: str = "users", owners=None, max_concurrent_builds: int = DEFAULT_MAX_CONCURRENT_BUILDS):
+        self.id = tenant_id
+        self.owner = owner
+        self.owner_type = owner_type
+        self.owners = list(owners or [owner])
+        if owner not in self.owners:
+            self.owners.insert(0, owner)
+        self.github_token = github_token
+        self.openai_api_key = openai_api_key
+        self.max_concurrent_builds = max(1, max_concurrent_builds)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, entry: dict) -> "Tenant":
+        """
+        Build a tenant from a TENANTS_FILE entry. Secrets may be given inline or,
+        preferably, as the name of an environment variable (`*_env` keys).
+        """
+        def secret(key):
+            if entry.get(f"{key}_env"):
+                return os.getenv(entry[f"{key}_env"])
+            return entry.get(key)
+
+        return cls(
+            tenant_id=entry["id"],
+            owner=entry["owner"],
+            owner_type=entry.get("owner_type", "users"),
+            owners=entry.get("owners"),
+            github_token=secret("github_token"),
+            openai_api_key=secret("openai_api_key"),
+            max_concurrent_builds=entry.get("max_concurrent_builds", DEFAULT_MAX_CONCURRENT_BUILDS),
+        )
+
+    def github_headers(self) -> dict:
+        return {"Authorization": f"token {self.github_token}"}
+
+    def openai_client(self):
+        """One OpenAI client per tenant, shared by every request and build for it."""
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self.openai_api_key)
+            return self._client
+
+    def resolve_owner(self, owner: str = None) -> str:
+        """Return the GitHub owner to use, refusing owners this tenant isn't configured for."""
+        if not owner:
+            return self.owner
+        if owner not in self.owners:
+            raise PermissionError(f"Owner '{owner}' is not configured for tenant '{self.id}'")
+        return owner
+
+
+_tenants = None
+_tenants_lock = threading.Lock()
+
+
+def load_tenants() -> dict:
+    global _tenants
+    with _tenants_lock:
+        if _tenants is not None:
+            return _tenants
+        tenants = {}
+        if TENANTS_FILE:
+            with open(TENANTS_FILE) as fh:
+                for entry in json.load(fh).get("tenants", []):
+                    tenant = Tenant.from_config(entry)
+                    tenants[tenant.id] = tenant
+            log.info("Loaded %d tenants from %s", len(tenants), TENANTS_FILE)
+        if DEFAULT_TENANT_ID not in tenants:
+            tenants[DEFAULT_TENANT_ID] = Tenant(
+                DEFAULT_TENANT_ID,
+                owner=DEFAULT_GITHUB_OWNER,
+                owner_type=DEFAULT_GITHUB_OWNER_TYPE,
+                github_token=os.getenv("GITHUB_API_KEY"),
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+            )
+        _tenants = tenants
+        return tenants
+
+
+def _reset_after_fork():
+    # Keep the (preloaded) registry but give each worker its own OpenAI clients:
+    # an httpx connection pool must not be shared across processes.
+    global _tenants_lock
+    _tenants_lock = threading.Lock()
+    for tenant in (_tenants or {}).values():
+        tenant._client = None
+        tenant._client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_tenant(tenant_id: str = None) -> Tenant:
+    tenants = load_tenants()
+    tenant = tenants.get(tenant_id or DEFAULT_TENANT_ID)
+    if tenant is None:
+        raise UnknownTenant(f"Unknown tenant: {tenant_id}")
+    return tenant
+
+
+def tenant_from_request(request) -> Tenant:
+    """Resolve the tenant from the X-Tenant-Id header, ?tenant= or a "tenant" JSON field."""
+    tenant_id = request.headers.get("X-Tenant-Id") or request.args.get("tenant")
+    if not tenant_id and request.is_json:
+        tenant_id = (request.get_json(silent=True) or {}).get("tenant")
+    return get_tenant(tenant_id)
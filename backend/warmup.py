@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from checkpoint import BuildManifest
+from observability import Counter, get_logger, register, span
+
+log = get_logger("warmup")
+
+# Seconds between warm-up cycles; 0 leaves warm-up to the /api/warmup/run endpoint
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL_SECONDS", "0"))
+# Only repos pushed within this many hours are warmed
+WARMUP_RECENT_HOURS = float(os.getenv("WARMUP_RECENT_HOURS", "72"))
+# Repos warmed per cycle, across all tenants
+WARMUP_MAX_PER_CYCLE = int(os.getenv("WARMUP_MAX_PER_CYCLE", "2"))
+# Repos warmed per rolling 24 hours, across all tenants (each costs a build and an outline run)
+WARMUP_DAILY_BUDGET = int(os.getenv("WARMUP_DAILY_BUDGET", "20"))
+
+WARMED = register(Counter(
+    "silo_warmup_total",
+    "Repos built and outlined ahead of user requests, by tenant and outcome.",
+))
+OUTLINE_CACHE = register(Counter(
+    "silo_outline_cache_total",
+    "Outline requests answered from a pre-generated outline (hit) or by a new run (miss).",
+))
+
+
+def _pushed_at_epoch(pushed_at: str) -> float:
+    """GitHub timestamps look like 2025-02-01T12:00:00Z."""
+    try:
+        return datetime.fromisoformat(pushed_at.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+class Warmer:
+    """
+    Rebuilds recently pushed repos and pre-generates their outlines while the
+    service is idle, so the first user to open one gets the outline from the
+    build manifest instead of waiting for a build and a run.
+
+    A repo is a candidate when it was pushed within `recent_hours` and the
+    manifest doesn't already hold a warm-up for that pushed_at. Newest pushes
+    go first. A cycle stops as soon as the service is busy (`is_idle()` is
+    false), after `max_per_cycle` repos, or when the 24-hour budget is spent.
+
+    Every owner the tenant is configured for is considered.
+    `list_repos(tenant, owner)` returns the owner's GitHub repo dicts (with
+    pushed_at) and `warm_repo(tenant, repo)` builds one repo and records its
+    outline.
+    """
+
+    def __init__(self, list_repos, warm_repo, is_idle, recent_hours: float = WARMUP_RECENT_HOURS,
+                 max_per_cycle: int = WARMUP_MAX_PER_CYCLE, daily_budget: int = WARMUP_DAILY_BUDGET):
+        self.list_repos = list_repos
+        self.warm_repo = warm_repo
+        self.is_idle = is_idle
+        self.recent_hours = recent_hours
+        self.max_per_cycle = max_per_cycle
+        self.daily_budget = daily_budget
+        self._spent = deque()   # monotonic times of warm-ups in the last 24 hours
+        self._lock = threading.Lock()
+
+    def candidates(self, tenant) -> list:
+        cutoff = time.time() - self.recent_hours * 3600
+        recent = []
+        for owner in tenant.owners:
+            try:
+                repos = self.list_repos(tenant, owner)
+            except Exception as e:
+                log.warning("Warm-up could not list repos of %s for tenant %s: %s", owner, tenant.id, e)
+                continue
+            recent.extend(dict(r, owner=r.get("owner") or owner) for r in repos
+                          if _pushed_at_epoch(r.get("pushed_at")) >= cutoff)
+        recent.sort(key=lambda r: _pushed_at_epoch(r.get("pushed_at")), reverse=True)
+        pending = []
+        for repo in recent:
+            owner = repo["owner"]
+            manifest = BuildManifest.load(tenant.id, owner, repo["name"])
+            if manifest.warm_pushed_at != repo.get("pushed_at"):
+                pending.append(repo)
+        return pending
+
+    def budget_left(self) -> int:
+        now = time.monotonic()
+        while self._spent and now - self._spent[0] > 86400:
+            self._spent.popleft()
+        return self.daily_budget - len(self._spent)
+
+    def run(self, tenants, dry_run: bool = False, require_idle: bool = True) -> dict:
+        """Run one warm-up cycle over `tenants` and report what was (or would be) warmed."""
+        report = {"dry_run": dry_run, "warmed": [], "failed": [], "candidates": [], "stopped": None}
+        with self._lock, span("warmup_cycle"):
+            for tenant in tenants:
+                if not tenant.github_token or not tenant.openai_api_key:
+                    continue
+                try:
+                    candidates = self.candidates(tenant)
+                except Exception as e:
+                    log.warning("Warm-up could not list repos for tenant %s: %s", tenant.id, e)
+                    continue
+                report["candidates"].extend(f"{tenant.id}:{r['owner']}/{r['name']}" for r in candidates)
+                if dry_run:
+                    continue
+                for repo in candidates:
+                    if len(report["warmed"]) + len(report["failed"]) >= self.max_per_cycle:
+                        report["stopped"] = "cycle_limit"
+                        return report
+                    if self.budget_left() <= 0:
+                        report["stopped"] = "daily_budget"
+                        return report
+                    if require_idle and not self.is_idle():
+                        report["stopped"] = "busy"
+                        return report
+                    self._spent.append(time.monotonic())
+                    name = f"{tenant.id}:{repo['owner']}/{repo['name']}"
+                    try:
+                        self.warm_repo(tenant, repo)
+                    except Exception as e:
+                        log.warning("Warm-up failed for %s: %s", name, e)
+                        WARMED.inc(tenant=tenant.id, outcome="failed")
+                        report["failed"].append(name)
+                        continue
+                    log.info("Warmed %s (pushed %s)", name, repo.get("pushed_at"))
+                    WARMED.inc(tenant=tenant.id, outcome="warmed")
+                    report["warmed"].append(name)
+        return report
+
+
+_warmup_thread = None
+
+
+def start_warmup(warmer, tenants, interval: float = WARMUP_INTERVAL):
+    """
+    Start the background warm-up thread once per process; a no-op when interval is 0.
+    `tenants` is a callable returning the tenants to warm.
+    """
+    global _warmup_thread
+    if interval <= 0 or _warmup_thread is not None:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                warmer.run(tenants())
+            except Exception as e:
+                log.error("Warm-up cycle failed: %s", e)
+
+    _warmup_thread = threading.Thread(target=loop, name="warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
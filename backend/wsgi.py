@@ -0,0 +1,11 @@
+"""WSGI entry point for gunicorn (see gunicorn.conf.py)."""
+from app import app
+from routes import preload_client_libs
+from tenants import load_tenants
+
+# Everything loaded here happens once in the master and is shared by the forked
+# workers: the tenant registry and the openai/requests/tenacity imports.
+load_tenants()
+preload_client_libs()
+
+application = app
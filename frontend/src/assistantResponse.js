@@ -5,6 +5,7 @@ import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css'; 
 import "./vsBackendResponse.css";
 import ParallelModal from "./parallelModal";
+import { readEventStream, STREAM_HEADERS } from "./eventStream";
 
 const AssistantResponse = ({ repo, onClose }) => {
   const [text, setText] = useState("");
@@ -12,6 +13,9 @@ const AssistantResponse = ({ repo, onClose }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [showParallelModal, setShowParallelModal] = useState(false);
+  // Sections finished while the rest of the outline is still being written, each expandable on its own
+  const [doneSections, setDoneSections] = useState([]);
+  const [expandText, setExpandText] = useState(null);
   const [isEditing, setIsEditing] = useState(false);
   const scrollableRef = useRef(null);
   const initialRenderRef = useRef(true);
@@ -24,56 +28,95 @@ const AssistantResponse = ({ repo, onClose }) => {
     // Always use the dynamic endpoint
     const endpoint = "http://127.0.0.1:5000/api/dynamic_generate_outline";
 
-    async function fetchStream() {
-      try {
-        const response = await fetch(endpoint, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ repo }),
-          signal: controller.signal
-        });
-
-        if (!response.ok) {
-          throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
-        }
+    // Set from the stream's first frame and its `id:` lines, so a dropped
+    // connection can resume the same generation instead of starting a new run.
+    let streamId = null;
+    let lastEventId = 0;
+    const maxReconnects = 3;
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
+    // Sections stream concurrently, their deltas tagged with the section's
+    // index; the text is rebuilt in outline order in the "---SECTION_TITLE:"
+    // format ParallelModal splits on.
+    let sections = [];
+    const renderSections = () => sections
+      .map(({ title, text }) => `---SECTION_TITLE: ${title}\n${text ? text.trim() : "_Writing..._"}`)
+      .join("\n");
 
-        console.log("Stream connected, processing...");
+    async function readStream(response) {
+      console.log("Stream connected, processing...");
 
-        let buffer = '';
+      await readEventStream(response, {
+        onId: (id) => { lastEventId = id || lastEventId; },
+        onText: (content) => {
+          setText(prev => prev + content);
+          if (scrollableRef.current) {
+            scrollableRef.current.scrollTop = scrollableRef.current.scrollHeight;
+          }
+        },
+        onData: (data) => {
+          if (data.stream_id) {
+            streamId = data.stream_id;
+          } else if (data.outline_titles) {
+            sections = data.outline_titles.map(title => ({ title, text: null }));
+            setText(renderSections());
+          } else if (data.section_delta || data.section_deltas) {
+            // Deltas of sections written at once arrive merged, one entry per section
+            for (const { index, text } of data.section_deltas || [data.section_delta]) {
+              if (sections[index]) {
+                sections[index].text = (sections[index].text ?? "") + text;
+              }
+            }
+            setText(renderSections());
+          } else if (data.section_done) {
+            const { index, title, text, error } = data.section_done;
+            sections[index] = { title, text: error ? "" : text };
+            if (error) {
+              setError(`Section "${title}" failed: ${error}`);
+            } else {
+              setDoneSections(prev => [...prev.filter(s => s.index !== index), { index, title, text }]
+                .sort((a, b) => a.index - b.index));
+            }
+            setText(renderSections());
+          } else if (data.error) {
+            setError(data.error);
+          }
+        }
+      });
+
+      console.log("Stream complete");
+    }
 
+    async function fetchStream() {
+      let attempt = 0;
+      try {
         while (true) {
-          const { value, done } = await reader.read();
-          if (done) {
-            console.log("Stream complete");
+          try {
+            const response = streamId
+              ? await fetch(`http://127.0.0.1:5000/api/streams/${streamId}`, {
+                  headers: { ...STREAM_HEADERS, "Last-Event-ID": String(lastEventId) },
+                  signal: controller.signal
+                })
+              : await fetch(endpoint, {
+                  method: "POST",
+                  headers: { ...STREAM_HEADERS, "Content-Type": "application/json" },
+                  body: JSON.stringify({ repo, mode: "sections" }),
+                  signal: controller.signal
+                });
+
+            if (!response.ok) {
+              throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
+            }
+
+            await readStream(response);
             break;
-          }
-          
-          const chunk = decoder.decode(value, { stream: true });
-          buffer += chunk;
-          const lines = buffer.split('\n');
-          buffer = lines.pop() || '';
-          
-          for (const line of lines) {
-            if (line.startsWith('data: ')) {
-              try {
-                const content = line.slice(6);
-                const data = JSON.parse(content);
-                
-                if (data.error) {
-                  setError(data.error);
-                } else if (data.content !== undefined) {
-                  setText(prev => prev + data.content);
-                  if (scrollableRef.current) {
-                    scrollableRef.current.scrollTop = scrollableRef.current.scrollHeight;
-                  }
-                }
-              } catch (e) {
-                console.error('Error parsing JSON:', e, 'Line:', line);
-              }
+          } catch (error) {
+            // Network drop mid-generation: reconnect and replay what we missed.
+            if (error.name === 'AbortError' || !streamId || attempt >= maxReconnects) {
+              throw error;
             }
+            attempt += 1;
+            console.log(`Connection lost, resuming stream ${streamId} after event ${lastEventId}`);
+            await new Promise(resolve => setTimeout(resolve, 500 * attempt));
           }
         }
         
@@ -124,10 +167,16 @@ const AssistantResponse = ({ repo, onClose }) => {
   const handleKeyDown = (e) => {
     if ((e.ctrlKey || e.metaKey) && e.key === 'Enter' && !loading && text) {
       e.preventDefault();
-      setShowParallelModal(true);
+      openParallelModal(null);
     }
   };
 
+  // null expands the whole (edited) outline; a section's text expands just that section
+  const openParallelModal = (sectionText) => {
+    setExpandText(sectionText);
+    setShowParallelModal(true);
+  };
+
   return (
     <div className="modal-overlay">
       <div className="modal-content">
@@ -136,6 +185,20 @@ const AssistantResponse = ({ repo, onClose }) => {
         
         <div className="scrollable-content" ref={scrollableRef}>
           {loading && <div className="loading-spinner">Generating outline...</div>}
+          {loading && doneSections.length > 0 && (
+            <div className="section-expand-list">
+              {doneSections.map(({ index, title, text }) => (
+                <button
+                  key={index}
+                  className="section-expand-button"
+                  onClick={() => openParallelModal(`---SECTION_TITLE: ${title}\n${text}`)}
+                  title="Expand this section while the rest of the outline is written"
+                >
+                  Expand "{title}"
+                </button>
+              ))}
+            </div>
+          )}
           {error && <p className="error-message">{error}</p>}
           
           {!loading && isEditing ? (
@@ -171,7 +234,7 @@ const AssistantResponse = ({ repo, onClose }) => {
         
         <button 
           className="parallelize-button" 
-          onClick={() => setShowParallelModal(true)}
+          onClick={() => openParallelModal(null)}
           disabled={loading || !text}
           title="Process each section in parallel (Ctrl+Enter)"
         >
@@ -181,7 +244,7 @@ const AssistantResponse = ({ repo, onClose }) => {
       
       {showParallelModal && (
         <ParallelModal 
-          text={editableText} 
+          text={expandText ?? editableText} 
           repoName={repo.name} // Pass the repo name here
           onClose={() => setShowParallelModal(false)} 
         />
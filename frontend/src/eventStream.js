@@ -0,0 +1,58 @@
+// Shared reader for the backend's text/event-stream responses.
+//
+// Asking for compact framing makes the server send text deltas as raw
+// `event: t` frames (no JSON to parse) and merge bursts of deltas into one
+// frame. JSON `data: {...}` frames are still understood, so this also works
+// against a server that ignores the header.
+export const STREAM_HEADERS = { "X-Stream-Framing": "compact" };
+
+export async function readEventStream(response, { onText, onData, onId }) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let event = null;
+  let data = [];
+
+  const dispatch = () => {
+    if (data.length) {
+      const payload = data.join("\n");
+      if (event === "t") {
+        onText(payload);
+      } else {
+        try {
+          const parsed = JSON.parse(payload);
+          if (parsed.content !== undefined) {
+            onText(parsed.content);
+          } else if (onData) {
+            onData(parsed);
+          }
+        } catch (e) {
+          console.error("Error parsing JSON:", e, "Data:", payload);
+        }
+      }
+    }
+    event = null;
+    data = [];
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() || "";
+
+    for (const line of lines) {
+      if (line === "") {
+        dispatch();
+      } else if (line.startsWith("id:")) {
+        if (onId) onId(parseInt(line.slice(3), 10));
+      } else if (line.startsWith("event:")) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith("data:")) {
+        data.push(line.startsWith("data: ") ? line.slice(6) : line.slice(5));
+      }
+    }
+  }
+  dispatch();
+}
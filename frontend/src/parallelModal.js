@@ -4,6 +4,7 @@ import remarkMath from 'remark-math';
 import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css';
 import "./parallelModal.css";
+import { readEventStream, STREAM_HEADERS } from "./eventStream";
 
 // Component styling to ensure all text is left-aligned
 const textStyles = {
@@ -30,7 +31,7 @@ const ParallelCard = ({ topic, index, repoName }) => {
       try {
         const response = await fetch("http://127.0.0.1:5000/api/dynamic_expand_topic", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { ...STREAM_HEADERS, "Content-Type": "application/json" },
           body: JSON.stringify({ 
             topic,
             repo: { name: repoName } // Include the repository name here
@@ -42,34 +43,14 @@ const ParallelCard = ({ topic, index, repoName }) => {
           throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
         }
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = "";
-
-        while (true) {
-          const { value, done } = await reader.read();
-          if (done) break;
-          const chunk = decoder.decode(value, { stream: true });
-          buffer += chunk;
-          const lines = buffer.split("\n");
-          buffer = lines.pop() || "";
-
-          for (const line of lines) {
-            if (line.startsWith("data: ")) {
-              try {
-                const content = line.slice(6); // Remove 'data: ' prefix
-                const data = JSON.parse(content);
-                if (data.error) {
-                  setError(data.error);
-                } else if (data.content !== undefined) {
-                  setCardText(prev => prev + data.content);
-                }
-              } catch (e) {
-                console.error("Error parsing JSON:", e, "Line:", line);
-              }
+        await readEventStream(response, {
+          onText: (content) => setCardText(prev => prev + content),
+          onData: (data) => {
+            if (data.error) {
+              setError(data.error);
             }
           }
-        }
+        });
       } catch (error) {
         if (error.name === "AbortError") {
           console.log("Fetch aborted for topic:", topic);